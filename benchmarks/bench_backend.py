@@ -0,0 +1,33 @@
+"""
+Simulator backend and process isolation shared by the benchmarks. A benchmark
+selects the backend before anything imports isaacgym or torch and runs every
+simulator it builds in a process of its own:
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from bench_backend import run_in_process, select_backend
+
+    backend = select_backend(args.backend)
+    result = run_in_process(bench_point, cfg, args)
+"""
+import importlib.util
+import os
+import sys
+
+FAKE_GYM_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_gym")
+
+
+def select_backend(backend: str) -> str:
+    """Put the stand-in isaacgym on the path if needed, before anything imports isaacgym or torch."""
+    if backend == "auto":
+        backend = "isaacgym" if importlib.util.find_spec("isaacgym") is not None else "fake"
+    if backend == "fake":
+        sys.path.insert(0, FAKE_GYM_PATH)
+    return backend
+
+
+def run_in_process(fn, *args):
+    """fn(*args) in a fresh process, which also measures memory and startup from scratch."""
+    from mppiisaac.planner.isaacgym_wrapper import sim_process_context
+
+    with sim_process_context().Pool(1) as pool:
+        return pool.apply(fn, args)
@@ -0,0 +1,197 @@
+"""
+Memory footprint and step time of IsaacGymWrapper scenes over num_envs, and a
+capacity model fitted to them. Every point builds the scene of a scenario in a
+fresh process and records the peak host RSS, the device memory in use, the
+sizes of the root, dof, rigid body and contact tensors, the startup time and the
+time of a simulator step. Memory and step time are fitted linearly in num_envs,
+which gives the largest num_samples within a memory and latency budget, with a
+command taking `horizon` steps. Run from the repository root:
+
+    python benchmarks/capacity/profile_capacity.py examples/panda_pick/panda_pick.yaml \
+        --num-envs 64 256 1024 4096 --memory-budget-mb 8000 --latency-budget-ms 50
+
+Without isaacgym the CPU stand-in in benchmarks/fake_gym is used, see --backend.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bench_backend import run_in_process, select_backend  # noqa: E402
+
+
+def load_scenarios(args):
+    """name, actors, initial positions, isaacgym config and horizon of every scenario."""
+    from omegaconf import OmegaConf
+
+    if args.actors:
+        return [("actors", args.actors, None, {}, args.horizon)]
+
+    from mppiisaac.utils.scenario_runner import load_example
+
+    scenarios = []
+    for path in args.configs:
+        cfg = load_example(path)
+        scenarios.append(
+            (
+                os.path.splitext(os.path.basename(path))[0],
+                list(cfg.actors),
+                OmegaConf.to_container(cfg.initial_actor_positions),
+                OmegaConf.to_container(cfg.isaacgym),
+                args.horizon or cfg.mppi.horizon,
+            )
+        )
+    return scenarios
+
+
+def measure(actors, init_positions, isaacgym, num_envs: int, device: str, steps: int) -> dict:
+    """Build a scene of num_envs envs in this process and measure it, run in a fresh process per point."""
+    from mppiisaac.planner.isaacgym_wrapper import IsaacGymConfig, IsaacGymWrapper
+    import torch
+
+    cuda = "cuda" in device
+    if cuda:
+        torch.cuda.init()
+        free_before, _ = torch.cuda.mem_get_info(device)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    t = time.perf_counter()
+    sim = IsaacGymWrapper(
+        IsaacGymConfig(**isaacgym),
+        actors=actors,
+        obs_actors=[],
+        init_positions=init_positions,
+        num_envs=num_envs,
+        device=device,
+        interactive_goal=False,
+    )
+    startup = time.perf_counter() - t
+
+    u = torch.zeros((num_envs, sim._dof_state.size(1) // 2), device=device)
+    for _ in range(3):
+        sim.apply_robot_cmd(u)
+        sim.step()
+    if cuda:
+        torch.cuda.synchronize(device)
+    t = time.perf_counter()
+    for _ in range(steps):
+        sim.apply_robot_cmd(u)
+        sim.step()
+    if cuda:
+        torch.cuda.synchronize(device)
+    step_time = (time.perf_counter() - t) / steps
+
+    buffers = {
+        "root": sim._root_state,
+        "dof": sim._dof_state,
+        "rigid_body": sim._rigid_body_state,
+        "contact": sim._net_contact_force,
+    }
+    # Note: ru_maxrss is in kB on linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "num_envs": num_envs,
+        "startup_s": startup,
+        "step_ms": step_time * 1e3,
+        "host_rss_mb": rss / 1024,
+        "host_rss_delta_mb": (rss - rss_before) / 1024,
+        "device_mb": (free_before - torch.cuda.mem_get_info(device)[0]) / 2**20 if cuda else 0.0,
+        "buffers_mb": {k: b.numel() * b.element_size() / 2**20 for k, b in buffers.items()},
+    }
+
+
+def fit_line(xs, ys):
+    """Least squares intercept and slope."""
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    var = sum((x - mx) ** 2 for x in xs)
+    slope = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var if var > 0 else 0.0
+    return my - slope * mx, slope
+
+
+def max_within(model, budget: float) -> int:
+    """Largest n with intercept + slope * n within budget, -1 if there is no limit."""
+    intercept, slope = model
+    if slope <= 0:
+        return -1 if intercept <= budget else 0
+    return max(int((budget - intercept) / slope), 0)
+
+
+def capacity(points, horizon: int, memory_budget_mb: float, latency_budget_ms: float, memory_key: str) -> dict:
+    xs = [p["num_envs"] for p in points]
+    memory = fit_line(xs, [p[memory_key] for p in points])
+    # Note: a command runs horizon steps of all sample envs, objective and mppi update are not included
+    command = fit_line(xs, [p["step_ms"] * horizon for p in points])
+    limits = {}
+    if memory_budget_mb:
+        limits["memory"] = max_within(memory, memory_budget_mb)
+    if latency_budget_ms:
+        limits["latency"] = max_within(command, latency_budget_ms)
+    bounded = [n for n in limits.values() if n >= 0]
+    return {
+        "memory_model_mb": {"intercept": memory[0], "per_env": memory[1], "of": memory_key},
+        "command_model_ms": {"intercept": command[0], "per_env": command[1], "horizon": horizon},
+        "max_num_samples": {**limits, "feasible": min(bounded) if bounded else None},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("configs", nargs="*", help="example config files, their actors make up the scenes")
+    parser.add_argument("--actors", nargs="+", default=None, help="actor list of a single scenario instead of configs")
+    parser.add_argument("--backend", default="auto", choices=["auto", "isaacgym", "fake"])
+    parser.add_argument("--device", default=None, help="defaults to cuda:0 with isaacgym and cpu with the stand-in")
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[16, 64, 256, 1024])
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--horizon", type=int, default=None, help="steps per command, defaults to the config's")
+    parser.add_argument("--memory-budget-mb", type=float, default=0.0, help="device memory, host RSS on cpu")
+    parser.add_argument("--latency-budget-ms", type=float, default=0.0, help="simulation time per command")
+    parser.add_argument("--output", default=None, help="optional json file for the results")
+    args = parser.parse_args()
+    if not args.configs and not args.actors:
+        parser.error("Give example configs or --actors")
+    if args.actors and not args.horizon:
+        args.horizon = 20
+
+    backend = select_backend(args.backend)
+    device = args.device or ("cpu" if backend == "fake" else "cuda:0")
+    memory_key = "host_rss_mb" if device == "cpu" else "device_mb"
+
+    results = {"backend": backend, "device": device, "scenarios": []}
+    for name, actors, init_positions, isaacgym, horizon in load_scenarios(args):
+        points = []
+        for num_envs in sorted(args.num_envs):
+            try:
+                p = run_in_process(measure, actors, init_positions, isaacgym, num_envs, device, args.steps)
+            except Exception as e:
+                # Note: e.g. out of device memory, larger scenes are not tried
+                print(f"{name:>20} {num_envs:>7} envs: {type(e).__name__}: {e}")
+                break
+            points.append(p)
+            print(
+                f"{name:>20} {num_envs:>7} envs: startup {p['startup_s']:6.2f} s, step {p['step_ms']:7.2f} ms, "
+                f"rss {p['host_rss_mb']:8.1f} MB, device {p['device_mb']:8.1f} MB, "
+                f"buffers {sum(p['buffers_mb'].values()):7.2f} MB"
+            )
+
+        scenario = {"scenario": name, "actors": actors, "points": points}
+        if len(points) >= 2:
+            scenario["capacity"] = capacity(points, horizon, args.memory_budget_mb, args.latency_budget_ms, memory_key)
+            m, c = scenario["capacity"]["memory_model_mb"], scenario["capacity"]["command_model_ms"]
+            print(
+                f"{name:>20}: {memory_key} {m['intercept']:.1f} + {m['per_env']:.4f} * n MB, "
+                f"command {c['intercept']:.2f} + {c['per_env']:.5f} * n ms, "
+                f"max num_samples {scenario['capacity']['max_num_samples']}"
+            )
+        results["scenarios"].append(scenario)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+CPU stand-in for the parts of isaacgym that mppiisaac uses, for benchmarks on
+machines without a GPU or an isaacgym install. It is put on the path instead of
+isaacgym, see benchmarks/fake_gym/README.md.
+
+Tensors have the layout of isaacgym's and are updated by a kinematic integrator
+(dof velocity targets or efforts, root velocities), so timings cover the python
+and tensor work of mppiisaac and not physics.
+"""
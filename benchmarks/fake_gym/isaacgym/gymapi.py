@@ -0,0 +1,343 @@
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import List
+import numpy as np
+import os
+import torch
+import xml.etree.ElementTree as ET
+
+SIM_PHYSX = 1
+SIM_FLEX = 0
+UP_AXIS_Y = 0
+UP_AXIS_Z = 1
+DOF_MODE_NONE = 0
+DOF_MODE_POS = 1
+DOF_MODE_VEL = 2
+DOF_MODE_EFFORT = 3
+MESH_NONE = 0
+MESH_COLLISION = 1
+MESH_VISUAL = 2
+MESH_VISUAL_AND_COLLISION = 3
+STATE_NONE = 0
+STATE_POS = 1
+STATE_VEL = 2
+STATE_ALL = 3
+DOMAIN_ACTOR = 0
+DOMAIN_ENV = 1
+DOMAIN_SIM = 2
+KEY_A, KEY_D, KEY_E, KEY_Q, KEY_R, KEY_S, KEY_W = "A", "D", "E", "Q", "R", "S", "W"
+
+
+class IndexDomain(object):
+    DOMAIN_ACTOR = DOMAIN_ACTOR
+    DOMAIN_ENV = DOMAIN_ENV
+    DOMAIN_SIM = DOMAIN_SIM
+
+
+class Vec3(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+
+class Quat(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+        self.x, self.y, self.z, self.w = x, y, z, w
+
+
+class Transform(object):
+    def __init__(self, p=None, r=None):
+        self.p = p or Vec3()
+        self.r = r or Quat()
+
+
+class SimParams(SimpleNamespace):
+    def __init__(self):
+        super().__init__(dt=1 / 60, substeps=2, use_gpu_pipeline=False, physx=SimpleNamespace(), flex=SimpleNamespace())
+
+
+class AssetOptions(SimpleNamespace):
+    def __init__(self):
+        super().__init__(fix_base_link=False, flip_visual_attachments=False, disable_gravity=False)
+
+
+class PlaneParams(SimpleNamespace):
+    pass
+
+
+class CameraProperties(SimpleNamespace):
+    pass
+
+
+DOF_PROPERTIES = np.dtype(
+    [
+        ("hasLimits", bool),
+        ("lower", np.float32),
+        ("upper", np.float32),
+        ("driveMode", np.int32),
+        ("velocity", np.float32),
+        ("effort", np.float32),
+        ("stiffness", np.float32),
+        ("damping", np.float32),
+        ("friction", np.float32),
+        ("armature", np.float32),
+    ]
+)
+
+
+@dataclass
+class Asset:
+    bodies: List[str]
+    dofs: List[str]
+    fixed: bool = False
+
+
+@dataclass
+class Actor:
+    asset: Asset
+    pose: Transform
+    name: str
+    drive_modes: List[int] = field(default_factory=list)
+
+
+@dataclass
+class Env:
+    index: int
+    actors: List[Actor] = field(default_factory=list)
+
+
+class Sim(object):
+    def __init__(self, params: SimParams):
+        self.dt = params.dt
+        self.device = "cuda:0" if params.use_gpu_pipeline and torch.cuda.is_available() else "cpu"
+        self.envs: List[Env] = []
+
+
+def _parse_urdf(path: str) -> Asset:
+    root = ET.parse(path).getroot()
+    bodies = [link.get("name") for link in root.findall("link")]
+    dofs = [j.get("name") for j in root.findall("joint") if j.get("type") in ["revolute", "prismatic", "continuous"]]
+    return Asset(bodies, dofs)
+
+
+class Gym(object):
+    """Kinematic stand-in of the isaacgym Gym, every env is expected to hold the same number of actors."""
+
+    def create_sim(self, compute_device=0, graphics_device=0, type=SIM_PHYSX, params=None):
+        return Sim(params or SimParams())
+
+    def add_ground(self, sim, params):
+        pass
+
+    def create_viewer(self, sim, props):
+        return SimpleNamespace()
+
+    def load_asset(self, sim, rootpath, filename, options=None):
+        asset = _parse_urdf(os.path.join(rootpath, filename))
+        asset.fixed = bool(getattr(options, "fix_base_link", False))
+        return asset
+
+    def create_box(self, sim, width, height, depth, options=None):
+        return Asset(["box"], [], bool(getattr(options, "fix_base_link", False)))
+
+    def create_sphere(self, sim, radius, options=None):
+        return Asset(["sphere"], [], bool(getattr(options, "fix_base_link", False)))
+
+    def create_env(self, sim, lower, upper, num_per_row):
+        env = Env(len(sim.envs))
+        sim.envs.append(env)
+        return env
+
+    def create_actor(self, env, asset, pose, name=None, group=0, filter=0, segmentation_id=0):
+        env.actors.append(Actor(asset, pose, name, [DOF_MODE_NONE] * len(asset.dofs)))
+        return len(env.actors) - 1
+
+    # Properties
+    def set_rigid_body_color(self, env, handle, body, mesh_type, color):
+        pass
+
+    def get_actor_rigid_body_properties(self, env, handle):
+        return [SimpleNamespace(mass=1.0) for _ in env.actors[handle].asset.bodies]
+
+    def set_actor_rigid_body_properties(self, env, handle, props, recompute_inertia=False):
+        return True
+
+    def get_actor_rigid_body_names(self, env, handle):
+        return list(env.actors[handle].asset.bodies)
+
+    def get_actor_rigid_body_shape_indices(self, env, handle):
+        return [SimpleNamespace(start=i, count=1) for i in range(len(env.actors[handle].asset.bodies))]
+
+    def get_actor_rigid_shape_properties(self, env, handle):
+        return [SimpleNamespace(friction=1.0, torsion_friction=0.0, rolling_friction=0.0) for _ in env.actors[handle].asset.bodies]
+
+    def set_actor_rigid_shape_properties(self, env, handle, props):
+        return True
+
+    def get_asset_dof_properties(self, asset):
+        return np.zeros(len(asset.dofs), dtype=DOF_PROPERTIES)
+
+    def set_actor_dof_properties(self, env, handle, props):
+        env.actors[handle].drive_modes = [int(m) for m in props["driveMode"]]
+        return True
+
+    # Indices
+    def get_actor_dof_count(self, env, handle):
+        return len(env.actors[handle].asset.dofs)
+
+    def get_actor_dof_dict(self, env, handle):
+        return {name: i for i, name in enumerate(env.actors[handle].asset.dofs)}
+
+    def get_actor_dof_index(self, env, handle, dof, domain=DOMAIN_ENV):
+        offset = sum(len(a.asset.dofs) for a in env.actors[:handle])
+        return dof + offset if domain == DOMAIN_ENV else dof
+
+    def find_actor_rigid_body_index(self, env, handle, name, domain=DOMAIN_ENV):
+        bodies = env.actors[handle].asset.bodies
+        if name not in bodies:
+            return -1
+        offset = sum(len(a.asset.bodies) for a in env.actors[:handle])
+        return bodies.index(name) + (offset if domain == DOMAIN_ENV else 0)
+
+    # Tensors
+    def prepare_sim(self, sim):
+        envs = sim.envs
+        device = sim.device
+        actors = [a for env in envs for a in env.actors]
+        sim.num_actors = len(envs[0].actors) if envs else 0
+
+        root = torch.zeros((len(actors), 13), device=device)
+        for i, a in enumerate(actors):
+            root[i] = torch.tensor(
+                [a.pose.p.x, a.pose.p.y, a.pose.p.z, a.pose.r.x, a.pose.r.y, a.pose.r.z, a.pose.r.w] + [0.0] * 6
+            )
+        sim.root_state = root
+        sim.free_actors = torch.tensor([not a.asset.fixed for a in actors], device=device)
+
+        # Note: the dofs and rigid bodies of actor i in the global (sim) domain
+        dof_counts = [len(a.asset.dofs) for a in actors]
+        dof_starts = np.cumsum([0] + dof_counts)
+        sim.actor_dofs = [torch.arange(s, s + n, device=device) for s, n in zip(dof_starts, dof_counts)]
+        sim.dof_state = torch.zeros((int(dof_starts[-1]), 2), device=device)
+        modes = [m for a in actors for m in a.drive_modes]
+        sim.drive_modes = torch.tensor(modes, dtype=torch.int32, device=device)
+        sim.dof_targets = torch.zeros(len(modes), device=device)
+
+        sim.body_actor = torch.tensor(
+            [i for i, a in enumerate(actors) for _ in a.asset.bodies], dtype=torch.long, device=device
+        )
+        sim.rigid_body_state = root[sim.body_actor].clone()
+        sim.net_contact_force = torch.zeros((len(sim.body_actor), 3), device=device)
+        return True
+
+    def acquire_actor_root_state_tensor(self, sim):
+        return sim.root_state
+
+    def acquire_dof_state_tensor(self, sim):
+        return sim.dof_state
+
+    def acquire_rigid_body_state_tensor(self, sim):
+        return sim.rigid_body_state
+
+    def acquire_net_contact_force_tensor(self, sim):
+        return sim.net_contact_force
+
+    def refresh_actor_root_state_tensor(self, sim):
+        return True
+
+    def refresh_dof_state_tensor(self, sim):
+        return True
+
+    def refresh_rigid_body_state_tensor(self, sim):
+        # Note: no kinematics, every body of an actor is at the actor's root
+        torch.index_select(sim.root_state, 0, sim.body_actor, out=sim.rigid_body_state)
+        return True
+
+    def refresh_net_contact_force_tensor(self, sim):
+        return True
+
+    def set_actor_root_state_tensor(self, sim, tensor):
+        if tensor.data_ptr() != sim.root_state.data_ptr():
+            sim.root_state.copy_(tensor.reshape(-1, 13))
+        return True
+
+    def set_actor_root_state_tensor_indexed(self, sim, tensor, indices, count):
+        ids = indices[:count].long()
+        sim.root_state[ids] = tensor.reshape(-1, 13)[ids]
+        return True
+
+    def set_dof_state_tensor(self, sim, tensor):
+        if tensor.numel() == sim.dof_state.numel():
+            if tensor.data_ptr() != sim.dof_state.data_ptr():
+                sim.dof_state.copy_(tensor.reshape(-1, 2))
+        else:
+            # Note: position mode robots pass dof positions only
+            sim.dof_state[:, 0] = tensor.reshape(-1)
+        return True
+
+    def set_dof_state_tensor_indexed(self, sim, tensor, indices, count):
+        dofs = torch.cat([sim.actor_dofs[i] for i in indices[:count].tolist()])
+        sim.dof_state[dofs] = tensor.reshape(-1, 2)[dofs]
+        return True
+
+    def set_dof_velocity_target_tensor(self, sim, tensor):
+        sim.dof_targets.copy_(tensor.reshape(-1))
+        return True
+
+    def set_dof_position_target_tensor(self, sim, tensor):
+        sim.dof_targets.copy_(tensor.reshape(-1))
+        return True
+
+    def set_dof_actuation_force_tensor(self, sim, tensor):
+        sim.dof_targets.copy_(tensor.reshape(-1))
+        return True
+
+    def set_rigid_body_state_tensor(self, sim, tensor):
+        return True
+
+    # Stepping
+    def simulate(self, sim):
+        vel = sim.dof_state[:, 1]
+        vel.copy_(torch.where(sim.drive_modes == DOF_MODE_VEL, sim.dof_targets, vel))
+        vel.add_(torch.where(sim.drive_modes == DOF_MODE_EFFORT, sim.dof_targets * sim.dt, torch.zeros_like(vel)))
+        sim.dof_state[:, 0].add_(vel * sim.dt)
+        moved = sim.root_state[:, 0:3] + sim.root_state[:, 7:10] * sim.dt
+        sim.root_state[:, 0:3] = torch.where(sim.free_actors.unsqueeze(1), moved, sim.root_state[:, 0:3])
+
+    def fetch_results(self, sim, wait=True):
+        pass
+
+    # Viewer
+    def subscribe_viewer_keyboard_event(self, viewer, key, action):
+        pass
+
+    def query_viewer_action_events(self, viewer):
+        return []
+
+    def viewer_camera_look_at(self, viewer, env, position, target):
+        pass
+
+    def step_graphics(self, sim):
+        pass
+
+    def draw_viewer(self, viewer, sim, render_collision=False):
+        pass
+
+    def add_lines(self, viewer, env, num_lines, vertices, colors):
+        pass
+
+    def clear_lines(self, viewer):
+        pass
+
+    # Teardown
+    def destroy_viewer(self, viewer):
+        pass
+
+    def destroy_env(self, env):
+        pass
+
+    def destroy_sim(self, sim):
+        pass
+
+
+def acquire_gym() -> Gym:
+    return Gym()
@@ -0,0 +1,7 @@
+# Note: the stand-in simulator holds torch tensors, so wrapping and unwrapping is the identity
+def wrap_tensor(tensor):
+    return tensor
+
+
+def unwrap_tensor(tensor):
+    return tensor
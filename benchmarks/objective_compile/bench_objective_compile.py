@@ -0,0 +1,106 @@
+"""
+Compare eager and compiled execution of the shipped declarative objectives.
+
+The objectives in conf/cost/*.yaml are evaluated on synthetic observations, so no
+simulator is needed. Run from the repository root:
+
+    python benchmarks/objective_compile/bench_objective_compile.py --device cuda:0
+"""
+from mppiisaac.planner.cost_terms import CostConfig, CostTermObjective
+from mppiisaac.planner.objective_compile import CompiledObjective
+from omegaconf import OmegaConf
+import argparse
+import glob
+import json
+import os
+import time
+import torch
+
+CONF_PATH = os.path.join(os.path.dirname(__file__), "../../conf/cost")
+
+
+def load_cost_config(path: str):
+    cfg = OmegaConf.load(path)
+    cfg.pop("defaults", None)
+    return OmegaConf.merge(OmegaConf.structured(CostConfig), cfg)
+
+
+def synthetic_observations(objective, num_envs: int, device: str):
+    num_dofs = max(
+        [t.cfg.dofs[1] for t in objective.terms if t.cfg.dofs is not None] + [1]
+    )
+    obs = {}
+    for o in objective.observation_spec:
+        if o.type == "dof":
+            obs[o.name] = torch.randn((num_envs, num_dofs, 2), device=device)
+        elif o.type == "contact":
+            obs[o.name] = torch.randn((num_envs, 3), device=device)
+        else:
+            state = torch.randn((num_envs, 13), device=device)
+            state[:, 3:7] /= torch.linalg.norm(state[:, 3:7], axis=1, keepdim=True)
+            obs[o.name] = state
+    return obs
+
+
+def timeit(fn, n_iters: int, device: str) -> float:
+    for _ in range(3):
+        fn()
+    if "cuda" in device:
+        torch.cuda.synchronize()
+    t = time.perf_counter()
+    for _ in range(n_iters):
+        fn()
+    if "cuda" in device:
+        torch.cuda.synchronize()
+    return (time.perf_counter() - t) / n_iters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--num-samples", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--backend", default="compile", choices=["compile", "trace"])
+    parser.add_argument("--iters", type=int, default=200)
+    parser.add_argument("--output", default=None, help="optional json file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for path in sorted(glob.glob(f"{CONF_PATH}/*.yaml")):
+        name = os.path.splitext(os.path.basename(path))[0]
+        objective = CostTermObjective(load_cost_config(path), device=args.device)
+        compiled = CompiledObjective(objective, backend=args.backend)
+
+        for num_samples in args.num_samples:
+            obs = synthetic_observations(objective, num_samples, args.device)
+            weights = objective.weight_tensor
+
+            t = time.perf_counter()
+            compiled.cost_from_observations(obs, weights)
+            compile_time = time.perf_counter() - t
+
+            eager = timeit(lambda: objective.cost_from_observations(obs, weights), args.iters, args.device)
+            fast = timeit(lambda: compiled.cost_from_observations(obs, weights), args.iters, args.device)
+            results.append(
+                {
+                    "objective": name,
+                    "num_samples": num_samples,
+                    "backend": compiled.used_backend[num_samples],
+                    "compile_time_s": compile_time,
+                    "eager_ms": eager * 1e3,
+                    "compiled_ms": fast * 1e3,
+                    "speedup": eager / fast,
+                }
+            )
+            print(
+                f"{name:>18} K={num_samples:<6} {results[-1]['backend']:>8}: "
+                f"eager {eager * 1e3:.3f} ms, compiled {fast * 1e3:.3f} ms "
+                f"(x{eager / fast:.2f}, compile {compile_time:.1f} s)"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
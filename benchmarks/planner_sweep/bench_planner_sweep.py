@@ -0,0 +1,240 @@
+"""
+Latency and throughput of the planner over num_samples, horizon and mppi_mode,
+for every scenario in conf/mppi that an example config uses. For each point the
+distribution of command() latencies, the env steps per second and the time per
+phase of a command (apply_robot_cmd, sim step, objective and the remaining mppi
+sampling and update) are measured. Results can be compared against a stored
+baseline, regressions beyond the thresholds give a non-zero exit code. Run from
+the repository root:
+
+    python benchmarks/planner_sweep/bench_planner_sweep.py --output sweep.json
+    python benchmarks/planner_sweep/bench_planner_sweep.py --baseline sweep.json
+
+Without isaacgym the CPU stand-in in benchmarks/fake_gym is used, see --backend.
+"""
+from collections import defaultdict
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bench_backend import run_in_process, select_backend  # noqa: E402
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "../../examples")
+CONF_PATH = os.path.join(os.path.dirname(__file__), "../../conf/mppi")
+
+
+def scenarios(names=None):
+    """(mppi config, example dir, example config name) for the conf/mppi scenarios that an example uses."""
+    from omegaconf import OmegaConf
+
+    examples = {}
+    for path in sorted(glob.glob(f"{EXAMPLES_PATH}/*/*.yaml")):
+        defaults = OmegaConf.to_container(OmegaConf.load(path)).get("defaults", [])
+        for d in defaults:
+            if isinstance(d, dict) and "mppi" in d:
+                examples.setdefault(d["mppi"], (os.path.dirname(path), os.path.splitext(os.path.basename(path))[0]))
+
+    found = []
+    for path in sorted(glob.glob(f"{CONF_PATH}/*.yaml")):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if names and name not in names:
+            continue
+        if name not in examples:
+            print(f"{name:>18}: skipped, no example config uses it")
+            continue
+        found.append((name, *examples[name]))
+    return found
+
+
+class DofObjective(object):
+    """Quadratic cost on the dof state, a scenario independent stand-in for the example objectives."""
+
+    def reset(self):
+        pass
+
+    def compute_cost(self, sim):
+        import torch
+
+        return torch.sum(sim._dof_state**2, dim=1)
+
+
+class PhaseTimer(object):
+    """Accumulated wall time of wrapped functions by phase, synchronizing cuda around every call."""
+
+    def __init__(self, device: str):
+        self.sync = "cuda" in device
+        self.totals = defaultdict(float)
+
+    def wrap(self, fn, phase: str):
+        import torch
+
+        def timed(*args, **kwargs):
+            if self.sync:
+                torch.cuda.synchronize()
+            t = time.perf_counter()
+            out = fn(*args, **kwargs)
+            if self.sync:
+                torch.cuda.synchronize()
+            self.totals[phase] += time.perf_counter() - t
+            return out
+
+        return timed
+
+
+def bench_point(cfg, objective, args):
+    from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+    from mppiisaac.utils.latency import distribution
+    import torch
+
+    t = time.perf_counter()
+    planner = MPPIisaacPlanner(cfg, objective)
+    startup = time.perf_counter() - t
+    device = cfg.mppi.device
+    dof_state, root_state = planner.sim._dof_state.clone(), planner.sim._root_state.clone()
+
+    def command():
+        # Note: every command starts from the same world state, resetting it is not timed
+        planner.objective.reset()
+        planner.set_world_state(dof_state, root_state)
+        if "cuda" in device:
+            torch.cuda.synchronize()
+        t = time.perf_counter()
+        planner.command()
+        return time.perf_counter() - t
+
+    for _ in range(args.warmup):
+        command()
+    latencies = [command() for _ in range(args.iters)]
+
+    # Note: a separate pass, the synchronization of the phase timers would distort the latencies
+    timer = PhaseTimer(device)
+    planner.sim.apply_robot_cmd = timer.wrap(planner.sim.apply_robot_cmd, "apply_cmd")
+    planner.sim.step = timer.wrap(planner.sim.step, "sim_step")
+    planner.objective.compute_cost = timer.wrap(planner.objective.compute_cost, "cost")
+    total = sum(command() for _ in range(args.phase_iters))
+    phases = {k: v / args.phase_iters * 1e3 for k, v in timer.totals.items()}
+    phases["mppi"] = total / args.phase_iters * 1e3 - sum(phases.values())
+
+    latency = distribution(latencies, 1e3)
+    env_steps = cfg.mppi.num_samples * cfg.mppi.horizon
+    return {
+        "startup_s": startup,
+        "latency_ms": latency,
+        "env_steps_per_s": env_steps / (latency["mean"] * 1e-3),
+        "sim_steps_per_s": cfg.mppi.horizon / (latency["mean"] * 1e-3),
+        "phases_ms": phases,
+    }
+
+
+def run_point(example_dir: str, config_name: str, overrides, args) -> dict:
+    """Benchmark a point of the sweep, run in a fresh process per point."""
+    from mppiisaac.utils.scenario_runner import example_objective, load_example
+
+    cfg = load_example(os.path.join(example_dir, f"{config_name}.yaml"), overrides)
+    objective = example_objective(cfg, example_dir) if args.example_objective else DofObjective()
+    return bench_point(cfg, objective, args)
+
+
+def point_key(r) -> str:
+    return f"{r['scenario']}/{r['mppi_mode']}/K{r['num_samples']}/H{r['horizon']}"
+
+
+def compare(results, baseline, threshold: float, tail_threshold: float):
+    """Annotate results with their ratio to the baseline and return the regressions."""
+    if baseline.get("backend") != results["backend"] or baseline.get("device") != results["device"]:
+        print("Warning: the baseline was measured with another backend or device")
+    base = {point_key(r): r for r in baseline["results"] if "latency_ms" in r}
+    regressions = []
+    for r in results["results"]:
+        b = base.get(point_key(r))
+        if b is None or "latency_ms" not in r:
+            continue
+        r["baseline"] = {}
+        for stat, limit in [("p50", threshold), ("p99", tail_threshold)]:
+            ratio = r["latency_ms"][stat] / b["latency_ms"][stat]
+            r["baseline"][f"{stat}_ratio"] = ratio
+            if ratio > 1 + limit:
+                regressions.append(f"{point_key(r)}: {stat} {b['latency_ms'][stat]:.2f} -> {r['latency_ms'][stat]:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="auto", choices=["auto", "isaacgym", "fake"])
+    parser.add_argument("--device", default=None, help="defaults to the config's device, cpu for the fake backend")
+    parser.add_argument("--scenarios", nargs="+", default=None, help="conf/mppi names, all by default")
+    parser.add_argument("--num-samples", type=int, nargs="+", default=[100, 400, 1000])
+    parser.add_argument("--horizons", type=int, nargs="+", default=[12, 24])
+    parser.add_argument("--modes", nargs="+", default=["halton-spline", "simple"])
+    parser.add_argument("--example-objective", action="store_true", help="use the example's Objective instead of a dof cost")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--iters", type=int, default=30)
+    parser.add_argument("--phase-iters", type=int, default=5)
+    parser.add_argument("--output", default=None, help="optional json file for the results")
+    parser.add_argument("--baseline", default=None, help="json results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative increase of the p50 latency")
+    parser.add_argument("--tail-threshold", type=float, default=0.3, help="allowed relative increase of the p99 latency")
+    args = parser.parse_args()
+
+    backend = select_backend(args.backend)
+    device = args.device or ("cpu" if backend == "fake" else None)
+    import torch
+
+    results = {
+        "backend": backend,
+        "device": device or "config",
+        "torch": torch.__version__,
+        "host": platform.node(),
+        "results": [],
+    }
+    for name, example_dir, config_name in scenarios(args.scenarios):
+        for mode in args.modes:
+            for horizon in args.horizons:
+                for num_samples in args.num_samples:
+                    overrides = [
+                        f"mppi.num_samples={num_samples}",
+                        f"mppi.horizon={horizon}",
+                        f"mppi.mppi_mode={mode}",
+                        "isaacgym.viewer=false",
+                    ]
+                    if device:
+                        overrides.append(f"mppi.device={device}")
+                    point = {"scenario": name, "mppi_mode": mode, "num_samples": num_samples, "horizon": horizon}
+                    try:
+                        point.update(run_in_process(run_point, example_dir, config_name, overrides, args))
+                    except Exception as e:
+                        # Note: e.g. halton sampling needs a horizon of at least 12, the sweep goes on
+                        point["error"] = f"{type(e).__name__}: {e}"
+                        print(f"{point_key(point):>40}: {point['error']}")
+                        results["results"].append(point)
+                        continue
+                    results["results"].append(point)
+                    lat, phases = point["latency_ms"], point["phases_ms"]
+                    print(
+                        f"{point_key(point):>40}: p50 {lat['p50']:8.2f} ms, p99 {lat['p99']:8.2f} ms, "
+                        f"{point['env_steps_per_s']:10.0f} env steps/s | "
+                        + ", ".join(f"{k} {v:.2f}" for k, v in sorted(phases.items()))
+                    )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.tail_threshold)
+        results["regressions"] = regressions
+        for r in regressions:
+            print(f"Regression {r}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
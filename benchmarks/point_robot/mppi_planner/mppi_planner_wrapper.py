@@ -1,8 +1,11 @@
 from omegaconf import OmegaConf
 from plannerbenchmark.generic.planner import Planner
 from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper
-from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
-
+from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner, load_mppi_state, mppi_state
+from mppiisaac.utils.latency import distribution
+import json
+import numpy as np
+import time
 import torch
 
 class Objective(object):
@@ -13,9 +16,12 @@ class Objective(object):
         self.w_obs = 1.
         self.w_coll = 0.0 # 0.01 
 
+    def reset(self):
+        pass
+
     def compute_cost(self, sim: IsaacGymWrapper):
         
-        dof_state = sim.dof_state
+        dof_state = sim._dof_state
         pos = torch.cat((dof_state[:, 0].unsqueeze(1), dof_state[:, 2].unsqueeze(1)), 1)
         obs_positions = sim.obstacle_positions
 
@@ -28,8 +34,7 @@ class Objective(object):
         )
 
         # Collision avoidance with contact forces
-        xy_contatcs = torch.sum(torch.abs(torch.cat((sim.net_cf[:, 0].unsqueeze(1), sim.net_cf[:, 1].unsqueeze(1)), 1)),1)
-        coll = torch.sum(xy_contatcs.reshape([sim.num_envs, int(xy_contatcs.size(dim=0)/sim.num_envs)])[:, 1:sim.num_bodies], 1) # skip the first, it is the robot
+        coll = torch.sum(torch.abs(sim._net_contact_force[:, 1:, 0:2]), dim=(1, 2)) # skip the first, it is the robot
 
         return nav_cost * self.w_nav + coll * self.w_coll + obs_cost * self.w_obs
 
@@ -41,8 +46,17 @@ class MPPIPlanner(Planner):
         initial_actor_position = exp.initState()[0].tolist() 
         initial_actor_position[2] += 0.05
         self.cfg['initial_actor_positions'] = [initial_actor_position]
+        self.cfg.setdefault('obs_actors', [])
+        # Note: commands run before the first action, so startup costs are not part of the solver time
+        self._warmup_calls = self.cfg.get('warmup_calls', 3)
         self._config = OmegaConf.create(kwargs)
 
+        self._obstacle_layout = None
+        self._calls = 0
+        self._warmup_times = []
+        self._steady_times = []
+        self._restarts = []
+
         self.reset()
 
     def setJointLimits(self, limits):
@@ -58,7 +72,6 @@ class MPPIPlanner(Planner):
         else:
             self._planner.update_objective(objective)
 
-
     def setSelfCollisionAvoidance(self, r_body):
         pass
 
@@ -66,22 +79,85 @@ class MPPIPlanner(Planner):
         pass
 
     def concretize(self):
-        pass
+        sim = self._planner.sim
+        self._warm_up(sim._dof_state[0:1].clone(), sim._root_state[0:1].clone())
+
+    def _warm_up(self, dof_state, root_state):
+        """Run the warm-up commands from the given world state, then restore the warm start of mppi."""
+        # Note: phases of the warm-up are left out of the profile
+        profile_phases, self._planner.profile_phases = self._planner.profile_phases, False
+        # Note: only the warm start is restored, the world state of a checkpoint may predate a restart
+        warm_start = {k: v.clone() for k, v in mppi_state(self._planner.mppi).items()}
+        for _ in range(self._warmup_calls):
+            t = time.perf_counter()
+            self._planner.compute_action_from_tensors(dof_state, root_state).cpu()
+            self._warmup_times.append(time.perf_counter() - t)
+        load_mppi_state(self._planner.mppi, warm_start)
+        self._planner.profile_phases = profile_phases
+
+    def _update_obstacles(self, obst):
+        """
+        Creates the obstacle actors if names or sizes changed, which restarts the
+        simulator, and caches the world state the observations are written into.
+        """
+        layout = [(name, tuple(o['size'])) for name, o in obst.items()]
+        if layout == self._obstacle_layout:
+            return False
+        sim = self._planner.sim
+        restarted = sim.restarted
+        sim.update_root_state_tensor_by_obstacles(obst)
+        self._obstacle_layout = layout
+
+        # Note: update_root_state_tensor_by_obstacles names the i-th obstacle sphere{i}
+        names = [a.name for a in sim.env_cfg]
+        self._obstacle_ids = torch.tensor([names.index(f"sphere{i}") for i in range(len(obst))], device=sim.device)
+        self._root_state = sim._root_state[0:1].clone()
+        return sim.restarted != restarted
 
     def save(self, folderPath):
         file_name = folderPath + "/planner.yaml"
         OmegaConf.save(config=self._config, f=file_name)
+        with open(folderPath + "/mppi_profile.json", "w") as f:
+            json.dump(self.profile(), f, indent=2)
+
+    def profile(self) -> dict:
+        """Warm-up, steady state and restart timings of computeAction, and the command phases if profiled."""
+        return {
+            "calls": self._calls,
+            "warmup_ms": distribution(self._warmup_times, 1e3),
+            "steady_ms": distribution(self._steady_times, 1e3),
+            "restarts": self._restarts,
+            "phases_ms": {k: distribution(v, 1e3) for k, v in self._planner.latency.samples.items()},
+        }
 
     def computeAction(self, **kwargs):
         ob = kwargs
         obst = ob["FullSensor"]["obstacles"]
-        for o in obst.values():
-            o['type'] = 'sphere'
-
-        action = self._planner.compute_action(
-            q=ob["joint_state"]["position"],
-            qdot=ob["joint_state"]["velocity"],
-            obst=obst,
-        )
-        return action.numpy()
-
+        t = time.perf_counter()
+        restarted = self._update_obstacles(obst)
+        restart_time = time.perf_counter() - t
+
+        device = self._planner.sim.device
+        if obst:
+            states = torch.tensor(
+                [[*o['position'], *o['velocity']] for o in obst.values()], dtype=torch.float32, device=device
+            )
+            self._root_state[0, self._obstacle_ids, 0:3] = states[:, 0:3]
+            self._root_state[0, self._obstacle_ids, 7:10] = states[:, 3:6]
+        q, qdot = ob["joint_state"]["position"], ob["joint_state"]["velocity"]
+        dof_state = torch.tensor(np.stack([q, qdot], axis=1), dtype=torch.float32, device=device).reshape(1, -1)
+        if restarted:
+            # Note: the restarted simulator pays its startup costs in the warm-up, not in the timed command
+            self._warm_up(dof_state, self._root_state)
+            t = time.perf_counter()
+
+        action = self._planner.compute_action_from_tensors(dof_state, self._root_state).cpu().numpy()
+        duration = time.perf_counter() - t
+        self._calls += 1
+        if restarted:
+            self._restarts.append(
+                {"call": self._calls, "restart_ms": restart_time * 1e3, "ms": duration * 1e3, "obstacles": len(obst)}
+            )
+        else:
+            self._steady_times.append(duration)
+        return action
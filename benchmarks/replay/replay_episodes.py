@@ -0,0 +1,59 @@
+"""
+Replay recorded episodes, see mppiisaac.utils.replay, and check them for
+behavior and latency regressions against the recordings. Record episodes with
+benchmarks/scenarios/run_scenarios.py --record, then after a planner change run
+from the repository root:
+
+    python benchmarks/replay/replay_episodes.py records/panda_pick_seed0 --output replay.json
+
+The exit code is 1 if an action differs by more than --atol or the p50 or p99
+planning time grew by more than the thresholds.
+"""
+from mppiisaac.utils.replay import replay
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("episodes", nargs="+", help="recorded episode directories")
+    parser.add_argument("--start", type=int, default=0, help="first step to compare, earlier steps are replayed untimed")
+    parser.add_argument("--stop", type=int, default=None)
+    parser.add_argument("--atol", type=float, default=1e-4, help="allowed absolute difference of the actions")
+    parser.add_argument("--override", nargs="*", default=[], help="hydra overrides on top of the recorded config")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative increase of the p50 latency")
+    parser.add_argument("--tail-threshold", type=float, default=0.3, help="allowed relative increase of the p99 latency")
+    parser.add_argument("--output", default=None, help="optional json file for the reports")
+    args = parser.parse_args()
+
+    reports, regressions = [], []
+    for path in args.episodes:
+        report = replay(path, args.override, args.start, args.stop, args.atol)
+        reports.append(report)
+
+        action, latency = report["action"], report["latency_ms"]
+        print(
+            f"{path}: steps {report['start']}-{report['stop']}, action max diff {action['max_abs_diff']:.2e}, "
+            f"{action['diverged_steps']} diverged, planning p50 {latency['recorded']['p50']:.2f} -> "
+            f"{latency['replay']['p50']:.2f} ms, p99 {latency['recorded']['p99']:.2f} -> "
+            f"{latency['replay']['p99']:.2f} ms"
+        )
+        # Note: with overrides the planner differs from the recorded one, only its timing is compared
+        if action["diverged_steps"] and not args.override:
+            regressions.append(f"{path}: actions diverge from step {action['first_divergence']}")
+        for stat, limit in [("p50", args.threshold), ("p99", args.tail_threshold)]:
+            if latency[f"{stat}_ratio"] > 1 + limit:
+                regressions.append(f"{path}: {stat} planning time x{latency[f'{stat}_ratio']:.2f}")
+
+    for r in regressions:
+        print(f"Regression {r}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"reports": reports, "regressions": regressions}, f, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
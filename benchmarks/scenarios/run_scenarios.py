@@ -0,0 +1,54 @@
+"""
+Headless closed-loop episodes of example configs with task metrics, see
+mppiisaac.utils.scenario_runner. Run from the repository root:
+
+    python benchmarks/scenarios/run_scenarios.py examples/panda_pick/panda_pick.yaml \
+        examples/omni_panda_pick/omni_panda_pick.yaml --seeds 0 1 2 --workers 3 --output report.json
+"""
+from mppiisaac.utils.scenario_runner import run_scenarios
+import argparse
+import json
+
+
+def fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("configs", nargs="+", help="example config files")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=None, help="overrides scenario.max_steps")
+    parser.add_argument("--override", nargs="*", default=[], help="hydra overrides, e.g. mppi.num_samples=200")
+    parser.add_argument("--output", default=None, help="optional json file for the episodes and summary")
+    parser.add_argument("--record", default=None, help="directory to record every episode step by step in")
+    parser.add_argument("--record-top-k", type=int, default=0, help="number of rollouts to record per step")
+    args = parser.parse_args()
+
+    overrides = list(args.override)
+    if args.max_steps is not None:
+        overrides.append(f"++scenario.max_steps={args.max_steps}")
+    report = run_scenarios(args.configs, args.seeds, args.workers, overrides, args.record, args.record_top_k)
+
+    for e in report["episodes"]:
+        if "error" in e:
+            print(f"{e['scenario']:>20} seed {e['seed']:<4}: {e['error']}")
+    for name, s in report["summary"].items():
+        if not s["episodes"]:
+            print(f"{name:>20}: all {s['errors']} episodes failed")
+            continue
+        print(
+            f"{name:>20}: {s['episodes']} episodes, success {fmt(s['success_rate'], '.0%')}, "
+            f"time to goal {fmt(s['time_to_goal_median'], '.2f')} s, path {s['path_length_mean']:.2f} m, "
+            f"impulse {s['collision_impulse_mean']:.2f} Ns, planning p50 {s['latency_ms']['p50']:.1f} ms "
+            f"p99 {s['latency_ms']['p99']:.1f} ms, x{s['realtime_factor_mean']:.1f} real time"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Round-trip overhead of the tensor codec in mppiisaac.utils.transport compared to
+the previous torch.save/torch.load based serialization, for the tensors that are
+exchanged every control step. Run from the repository root:
+
+    python benchmarks/transport/bench_transport.py
+"""
+from mppiisaac.utils.transport import bytes_to_torch, torch_to_bytes
+import argparse
+import io
+import json
+import time
+import torch
+
+
+def pickle_to_bytes(t: torch.Tensor) -> bytes:
+    buff = io.BytesIO()
+    torch.save(t, buff)
+    buff.seek(0)
+    return buff.read()
+
+
+def pickle_to_torch(b: bytes) -> torch.Tensor:
+    return torch.load(io.BytesIO(b))
+
+
+def payloads(device: str):
+    # Note: the shapes of a panda pick step; dof and root state of the world, the action and rollouts
+    return {
+        "dof_state": torch.randn((1, 18), device=device),
+        "root_state": torch.randn((1, 4, 13), device=device),
+        "action": torch.randn((1, 7), device=device),
+        "rollouts": torch.randn((20, 300, 3), device=device),
+    }
+
+
+def timeit(fn, n_iters: int) -> float:
+    for _ in range(10):
+        fn()
+    t = time.perf_counter()
+    for _ in range(n_iters):
+        fn()
+    return (time.perf_counter() - t) / n_iters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--iters", type=int, default=2000)
+    parser.add_argument("--output", default=None, help="optional json file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for name, t in payloads(args.device).items():
+        pickled = timeit(lambda: pickle_to_torch(pickle_to_bytes(t)), args.iters)
+        raw = timeit(lambda: bytes_to_torch(torch_to_bytes(t)), args.iters)
+        results.append(
+            {
+                "tensor": name,
+                "shape": list(t.shape),
+                "pickle_us": pickled * 1e6,
+                "codec_us": raw * 1e6,
+                "pickle_bytes": len(pickle_to_bytes(t)),
+                "codec_bytes": len(torch_to_bytes(t)),
+                "speedup": pickled / raw,
+            }
+        )
+        r = results[-1]
+        print(
+            f"{name:>12} {str(tuple(t.shape)):>14}: pickle {r['pickle_us']:8.1f} us "
+            f"({r['pickle_bytes']} B), codec {r['codec_us']:8.1f} us ({r['codec_bytes']} B), x{r['speedup']:.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
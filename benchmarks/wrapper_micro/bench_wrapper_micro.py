@@ -0,0 +1,181 @@
+"""
+Micro-benchmarks of the functions that run every step or every call: the
+IsaacGymWrapper command, state and getter paths, the tensor codec, the segment
+building of draw_lines, quaternion_to_yaw and make_spheres. Every case runs for
+each number of envs and actors, a scene holds a panda, a goal and spheres up to
+the actor count and is measured in a fresh process. Run from the repository root:
+
+    python benchmarks/wrapper_micro/bench_wrapper_micro.py --output before.json
+    python benchmarks/wrapper_micro/bench_wrapper_micro.py --baseline before.json
+
+Without isaacgym the CPU stand-in in benchmarks/fake_gym is used, see --backend.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bench_backend import run_in_process, select_backend  # noqa: E402
+
+BASE_ACTORS = ["panda", "goal"]
+
+
+def make_scene(num_envs: int, num_actors: int, device: str):
+    from mppiisaac.planner.isaacgym_wrapper import ActorWrapper, IsaacGymConfig, IsaacGymWrapper
+
+    sim = IsaacGymWrapper(IsaacGymConfig(), BASE_ACTORS, [], num_envs=num_envs, device=device, interactive_goal=False)
+    num_spheres = max(num_actors - len(BASE_ACTORS), 0)
+    if num_spheres:
+        # Note: named like the obstacles of update_root_state_tensor_by_obstacles, so they are found without a restart
+        for i in range(num_spheres):
+            sim.env_cfg.append(
+                ActorWrapper(type="sphere", name=f"sphere{i}", size=[0.1], fixed=True, init_pos=[i, 0.0, 0.1])
+            )
+        sim.start_sim()
+    return sim, num_spheres
+
+
+def cases(sim, num_spheres: int, device: str):
+    from mppiisaac.planner.isaacgym_wrapper import line_segments
+    from mppiisaac.utils.conversions import quaternion_to_yaw
+    from mppiisaac.utils.transport import bytes_to_torch, torch_to_bytes
+    import numpy as np
+    import torch
+
+    num_envs = sim.num_envs
+    num_dofs = sim._dof_state.size(1) // 2
+    u = torch.randn((num_envs, num_dofs), device=device)
+    q, qdot = np.random.randn(num_dofs), np.random.randn(num_dofs)
+    obstacles = {
+        str(i): {"position": [float(i), 0.0, 0.1], "velocity": [0.0, 0.0, 0.0], "size": [0.1]}
+        for i in range(num_spheres)
+    }
+    state = {"dof_state": sim._dof_state.clone(), "root_state": sim._root_state.clone()}
+    encoded = torch_to_bytes(state)
+    lines = torch.randn((20, num_envs, 3), device=device)
+    quat = torch.nn.functional.normalize(torch.randn((num_envs * sim._root_state.size(1), 4), device=device), dim=1)
+    link = sim.env_cfg[0].visualize_link
+    sim.save_root_state()
+
+    c = {
+        "apply_robot_cmd": lambda: sim.apply_robot_cmd(u),
+        "reset_robot_state": lambda: sim.reset_robot_state(q, qdot),
+        "get_actor_position_by_name": lambda: sim.get_actor_position_by_name("goal"),
+        "get_actor_velocity_by_name": lambda: sim.get_actor_velocity_by_name("goal"),
+        "get_actor_orientation_by_name": lambda: sim.get_actor_orientation_by_name("goal"),
+        "get_actor_link_by_name": lambda: sim.get_actor_link_by_name("panda", link),
+        "get_actor_contact_forces_by_name": lambda: sim.get_actor_contact_forces_by_name("panda", link),
+        "update_root_state_tensor_by_obstacles": lambda: sim.update_root_state_tensor_by_obstacles(obstacles),
+        "save_root_state": sim.save_root_state,
+        "reset_root_state": sim.reset_root_state,
+        "torch_to_bytes": lambda: torch_to_bytes(state),
+        "bytes_to_torch": lambda: bytes_to_torch(encoded),
+        # Note: the segment building of draw_lines, without a viewer to draw into
+        "line_segments": lambda: line_segments(lines),
+        "quaternion_to_yaw": lambda: quaternion_to_yaw(quat),
+    }
+
+    # Note: SO pulls in zonopy and urchin, without them make_spheres is left out
+    if importlib.util.find_spec("zonopy") is not None:
+        from mppiisaac.planner.SO import make_spheres
+
+        n = quat.size(0)
+        centers_1, centers_2 = torch.randn((n, 3), device=device), torch.randn((n, 3), device=device)
+        radii_1, radii_2 = torch.rand(n, device=device), torch.rand(n, device=device)
+        c["make_spheres"] = lambda: make_spheres(centers_1, centers_2, radii_1, radii_2)
+    return c
+
+
+def timeit(fn, n_iters: int, n_repeats: int, device: str) -> float:
+    """Median over the repeats of the mean time per call."""
+    import torch
+
+    for _ in range(10):
+        fn()
+    times = []
+    for _ in range(n_repeats):
+        if "cuda" in device:
+            torch.cuda.synchronize()
+        t = time.perf_counter()
+        for _ in range(n_iters):
+            fn()
+        if "cuda" in device:
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - t) / n_iters)
+    return sorted(times)[len(times) // 2]
+
+
+def bench_scene(num_envs: int, num_actors: int, device: str, args) -> list:
+    """Time the cases on a scene, run in a fresh process per scene."""
+    sim, num_spheres = make_scene(num_envs, num_actors, device)
+    results = []
+    for name, fn in cases(sim, num_spheres, device).items():
+        if args.cases and name not in args.cases:
+            continue
+        results.append(
+            {
+                "case": name,
+                "num_envs": num_envs,
+                "num_actors": sim._root_state.size(1),
+                "us": timeit(fn, args.iters, args.repeats, device) * 1e6,
+            }
+        )
+    return results
+
+
+def case_key(r) -> str:
+    return f"{r['case']}/envs{r['num_envs']}/actors{r['num_actors']}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="auto", choices=["auto", "isaacgym", "fake"])
+    parser.add_argument("--device", default=None, help="defaults to cuda:0 with isaacgym and cpu with the stand-in")
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--num-actors", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--cases", nargs="+", default=None, help="names of the cases to run, all by default")
+    parser.add_argument("--iters", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None, help="optional json file for the results")
+    parser.add_argument("--baseline", default=None, help="json results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative increase of the time per call")
+    args = parser.parse_args()
+
+    backend = select_backend(args.backend)
+    device = args.device or ("cpu" if backend == "fake" else "cuda:0")
+
+    results = []
+    for num_envs in args.num_envs:
+        for num_actors in args.num_actors:
+            results += run_in_process(bench_scene, num_envs, num_actors, device, args)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {case_key(r): r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        line = f"{case_key(r):>60}: {r['us']:10.1f} us"
+        b = baseline.get(case_key(r))
+        if b is not None:
+            r["speedup"] = b["us"] / r["us"]
+            line += f", before {b['us']:10.1f} us, x{r['speedup']:.2f}"
+            if r["us"] > b["us"] * (1 + args.threshold):
+                regressions.append(case_key(r))
+        print(line)
+    for r in regressions:
+        print(f"Regression {r}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"backend": backend, "device": device, "results": results}, f, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from mppiisaac.utils.config_store import ExampleConfig
 import hydra
 import torch
 import pytorch3d.transforms
-import zerorpc
+from mppiisaac.utils.shm_transport import bind_address, serve_planner
 
 
 class Objective(object):
@@ -42,9 +42,8 @@ class Objective(object):
 @hydra.main(version_base=None, config_path=".", config_name="config_albert")
 def run_albert_robot(cfg: ExampleConfig):
     objective = Objective(cfg)
-    planner = zerorpc.Server(MPPIisaacPlanner(cfg, objective, prior=None))
-    planner.bind("tcp://0.0.0.0:4242")
-    planner.run()
+    planner = MPPIisaacPlanner(cfg, objective, prior=None)
+    serve_planner(planner, bind_address(cfg.planner_address))
 
 
 if __name__ == "__main__":
@@ -1,9 +1,8 @@
 from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper
 from isaacgym import gymapi
 import hydra
-import zerorpc
 from mppiisaac.utils.config_store import ExampleConfig
-from mppiisaac.utils.transport import torch_to_bytes, bytes_to_torch
+from mppiisaac.utils.shm_transport import connect_planner
 import time
 
 
@@ -18,8 +17,7 @@ def run_heijn_robot(cfg: ExampleConfig):
         viewer=True,
     )
 
-    planner = zerorpc.Client()
-    planner.connect("tcp://127.0.0.1:4242")
+    planner = connect_planner(cfg.planner_address)
     print("Mppi server found!")
 
     sim._gym.viewer_camera_look_at(
@@ -32,11 +30,7 @@ def run_heijn_robot(cfg: ExampleConfig):
     t = time.time()
     for _ in range(cfg.n_steps):
         # Compute action
-        action = bytes_to_torch(
-            planner.compute_action_tensor(
-                torch_to_bytes(sim._dof_state), torch_to_bytes(sim._root_state)
-            )
-        )
+        action = planner.compute_action_from_tensors(sim._dof_state, sim._root_state)
 
         # Apply action
         sim.set_dof_velocity_target_tensor(action)
@@ -45,7 +39,7 @@ def run_heijn_robot(cfg: ExampleConfig):
         sim.step()
 
         # Visualize samples
-        # rollouts = bytes_to_torch(planner.get_rollouts())
+        # rollouts = planner.get_rollouts_tensor()
         # sim._gym.clear_lines(sim.viewer)
         # sim.draw_lines(rollouts)
 
@@ -3,7 +3,7 @@ from mppiisaac.utils.config_store import ExampleConfig
 from mppiisaac.utils.conversions import quaternion_to_yaw
 import hydra
 import torch
-import zerorpc
+from mppiisaac.utils.shm_transport import bind_address, serve_planner
 
 
 class Objective(object):
@@ -70,9 +70,8 @@ class Objective(object):
 @hydra.main(version_base=None, config_path=".", config_name="config_boxer_push")
 def run_boxer_robot(cfg: ExampleConfig):
     objective = Objective(cfg)
-    planner = zerorpc.Server(MPPIisaacPlanner(cfg, objective, prior=None))
-    planner.bind("tcp://0.0.0.0:4242")
-    planner.run()
+    planner = MPPIisaacPlanner(cfg, objective, prior=None)
+    serve_planner(planner, bind_address(cfg.planner_address))
 
 
 if __name__ == "__main__":
@@ -1,8 +1,8 @@
 from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper
 import hydra
-import zerorpc
 from mppiisaac.utils.config_store import ExampleConfig
-from mppiisaac.utils.transport import torch_to_bytes, bytes_to_torch
+from mppiisaac.utils.shm_transport import connect_planner
+from mppiisaac.planner.state_sync import negotiate_state_sync
 import time
 from isaacgym import gymapi
 
@@ -22,18 +22,17 @@ def run_heijn_robot(cfg: ExampleConfig):
         sim.viewer, None, gymapi.Vec3(1.5, 2, 3), gymapi.Vec3(1.5, 0, 0)
     )
 
-    planner = zerorpc.Client()
-    planner.connect("tcp://127.0.0.1:4242")
+    planner = connect_planner(cfg.planner_address)
+    # Note: only the actors and dofs that can move are sent every step
+    state_sync = negotiate_state_sync(planner, sim)
     print("Mppi server found!")
 
     t = time.time()
     while True:
-        # Compute action
-        action = bytes_to_torch(
-            planner.compute_action_tensor(
-                torch_to_bytes(sim._dof_state), torch_to_bytes(sim._root_state)
-            )
-        )
+        # Compute action, and the rollouts for visualization, in a single round trip
+        result = planner.step_from_message(state_sync.message(sim), want_rollouts=True)
+        state_sync.ack()
+        action = result["action"]
 
         # Apply action
         sim.apply_robot_cmd(action)
@@ -41,10 +40,10 @@ def run_heijn_robot(cfg: ExampleConfig):
         # Step simulator
         sim.step()
 
-        # Visualize samples
-        rollouts = bytes_to_torch(planner.get_rollouts())
-        sim._gym.clear_lines(sim.viewer)
-        sim.draw_lines(rollouts)
+        # Visualize samples, replies without rollouts keep the previous ones
+        if "rollouts" in result:
+            sim._gym.clear_lines(sim.viewer)
+            sim.draw_lines(result["rollouts"])
 
         # Timekeeping
         actual_dt = time.time() - t
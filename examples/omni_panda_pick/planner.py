@@ -1,9 +1,10 @@
 from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
 from mppiisaac.utils.config_store import ExampleConfig
+from mppiisaac.planner.cost_terms import CostTermObjective
 import hydra
 import torch
 import pytorch3d.transforms
-import zerorpc
+from mppiisaac.utils.shm_transport import bind_address, serve_planner
 
 
 class Objective(object):
@@ -91,10 +92,13 @@ class Objective(object):
 
 @hydra.main(version_base=None, config_path=".", config_name="omni_panda_pick")
 def run_heijn_robot(cfg: ExampleConfig):
-    objective = Objective(cfg)
-    planner = zerorpc.Server(MPPIisaacPlanner(cfg, objective, prior=None))
-    planner.bind("tcp://0.0.0.0:4242")
-    planner.run()
+    # Note: run with `+cost=omni_panda_pick` to use the declarative objective from conf/cost
+    if "cost" in cfg:
+        objective = CostTermObjective(cfg.cost, cfg.mppi.device)
+    else:
+        objective = Objective(cfg)
+    planner = MPPIisaacPlanner(cfg, objective, prior=None)
+    serve_planner(planner, bind_address(cfg.planner_address))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+from mppiisaac.planner.closed_loop import ClosedLoopPlanner
+from mppiisaac.planner.cost_terms import CostTermObjective
+from mppiisaac.utils.config_store import ExampleConfig
+from planner import Objective
+import hydra
+import time
+
+
+# Note: planner and world in one process, the world is an extra env of the planner's simulator
+@hydra.main(version_base=None, config_path=".", config_name="panda_pick")
+def run_heijn_robot(cfg: ExampleConfig):
+    if "cost" in cfg:
+        objective = CostTermObjective(cfg.cost, cfg.mppi.device)
+    else:
+        objective = Objective(cfg)
+    planner = ClosedLoopPlanner(cfg, objective, prior=None)
+
+    t = time.time()
+    for _ in range(cfg.n_steps):
+        # Plan from the world env and step it with the action, no serialization in between
+        planner.step_closed_loop()
+
+        # Timekeeping
+        actual_dt = time.time() - t
+        print(f"FPS: {1/actual_dt}, RT={cfg.isaacgym.dt / actual_dt}")
+        t = time.time()
+
+        block_pos = planner.sim.get_actor_position_by_name("panda_pick_block")[planner.world_env]
+        goal_pos = planner.sim.get_actor_position_by_name("goal")[planner.world_env]
+        print(f"Block to goal: {float((block_pos[0:3] - goal_pos[0:3]).norm())}")
+
+
+if __name__ == "__main__":
+    res = run_heijn_robot()
@@ -1,12 +1,26 @@
 from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+from mppiisaac.planner.isaacgym_wrapper import Observation
 from mppiisaac.utils.config_store import ExampleConfig
+from mppiisaac.planner.cost_terms import CostTermObjective
 import hydra
 import torch
 import pytorch3d.transforms
-import zerorpc
+from mppiisaac.utils.shm_transport import bind_address, serve_planner
+from mppiisaac.utils.stream_transport import serve_planner_stream
 
 
 class Objective(object):
+    # Gathered by the simulator after every step, read in compute_cost without lookups
+    observation_spec = [
+        Observation(name="ee", type="link", actor="panda", link="panda_ee"),
+        Observation(name="block", type="actor", actor="panda_pick_block"),
+        Observation(name="goal", type="actor", actor="goal"),
+        Observation(name="table_forces", type="contact", actor="table", link="box"),
+    ]
+
+    # Order of the cost terms returned by compute_cost_terms
+    names = ["robot_to_block", "block_to_goal", "collision", "robot_ori"]
+
     def __init__(self, cfg):
         # Tuning of the weights for box
         self.weights = {
@@ -21,11 +35,11 @@ class Objective(object):
         self.prev_block_to_goal_dist = 1
         self.prev_robot_to_block_dist = 1
 
-    def compute_cost(self, sim):
-        r_pos = sim.get_actor_link_by_name("panda", "panda_ee")
-        block_pos = sim.get_actor_position_by_name("panda_pick_block")
-        goal_pos = sim.get_actor_position_by_name("goal")
-        table_forces = sim.get_actor_contact_forces_by_name("table", "box")
+    def compute_cost_terms(self, sim):
+        r_pos = sim.observations["ee"]
+        block_pos = sim.observations["block"]
+        goal_pos = sim.observations["goal"]
+        table_forces = sim.observations["table_forces"]
 
         robot_to_block = r_pos[:, 0:3] - block_pos[:, 0:3]
         block_to_goal = block_pos[:, 0:3] - goal_pos[:, 0:3]
@@ -41,24 +55,37 @@ class Objective(object):
         # Force costs
         forces = torch.sum(torch.abs(table_forces[:, 0:3]), axis=1)
 
-        total_cost = (
-            self.weights["robot_to_block"] * robot_to_block_dist
-            + self.weights["block_to_goal"] * block_to_goal_dist
-            + self.weights["collision"] * forces
-            + self.weights["robot_ori"] * robot_rpy_dist
+        self.prev_block_to_goal_dist = block_to_goal_dist
+
+        return torch.stack(
+            [robot_to_block_dist, block_to_goal_dist, forces, robot_rpy_dist]
         )
 
-        self.prev_block_to_goal_dist = block_to_goal_dist
+    def compute_cost(self, sim):
+        terms = self.compute_cost_terms(sim)
+        total_cost = (
+            self.weights["robot_to_block"] * terms[0]
+            + self.weights["block_to_goal"] * terms[1]
+            + self.weights["collision"] * terms[2]
+            + self.weights["robot_ori"] * terms[3]
+        )
 
         return total_cost
 
 
 @hydra.main(version_base=None, config_path=".", config_name="panda_pick")
 def run_heijn_robot(cfg: ExampleConfig):
-    objective = Objective(cfg)
-    planner = zerorpc.Server(MPPIisaacPlanner(cfg, objective, prior=None))
-    planner.bind("tcp://0.0.0.0:4242")
-    planner.run()
+    # Note: run with `+cost=panda_pick` to use the declarative objective from conf/cost
+    if "cost" in cfg:
+        objective = CostTermObjective(cfg.cost, cfg.mppi.device)
+    else:
+        objective = Objective(cfg)
+    planner = MPPIisaacPlanner(cfg, objective, prior=None)
+    # Note: `stream=true` decouples the planner from the world loop, run world_stream.py with it
+    if cfg.stream:
+        serve_planner_stream(planner, "tcp://0.0.0.0:4243")
+    else:
+        serve_planner(planner, bind_address(cfg.planner_address))
 
 
 if __name__ == "__main__":
@@ -1,31 +1,36 @@
 from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper
 from isaacgym import gymapi
 import hydra
-import optuna
-import zerorpc
+import os
+import sys
 import torch
 from mppiisaac.utils.config_store import ExampleConfig
+from mppiisaac.utils.tuning import run_lockstep_study, run_parallel_study, tuning_config
 from mppiisaac.utils.transport import torch_to_bytes, bytes_to_torch
-import time
 import numpy as np
 
 
+def block_to_goal(sim):
+    """Distance between the block and the goal in every env."""
+    block_pos = sim.get_actor_position_by_name("panda_pick_block")
+    goal_pos = sim.get_actor_position_by_name("goal")
+    return torch.linalg.norm(block_pos[:, 0:3] - goal_pos[:, 0:3], axis=1)
+
+
 class Tuning:
-    def __init__(self, cfg) -> None:
+    n_steps = 200
+
+    def __init__(self, cfg, viewer=True, num_envs=1) -> None:
         self.cfg = cfg
-        self.viewer = True
+        self.viewer = viewer
         self.sim = IsaacGymWrapper(
             cfg.isaacgym,
             actors=cfg.actors,
             init_positions=cfg.initial_actor_positions,
-            num_envs=1,
+            num_envs=num_envs,
             viewer=self.viewer,
         )
 
-        self.planner = zerorpc.Client()
-        self.planner.connect("tcp://127.0.0.1:4242")
-        print("Mppi server found!")
-
         if self.viewer: 
             self.sim._gym.viewer_camera_look_at(
                 self.sim.viewer,
@@ -34,12 +39,7 @@ class Tuning:
                 gymapi.Vec3(1.0, 0, 0),  # CAMERA LOCATION, CAMERA POINT OF INTEREST
             )
 
-    def tune(self):
-        study = optuna.create_study()
-        study.optimize(self.objective, n_trials=20)
-        study.best_params
-    
-    def objective(self, trial):
+    def suggest(self, trial):
         weights = {
             "robot_to_block": trial.suggest_float("robot_to_block", 0.0, 100.0),
             "block_to_goal": trial.suggest_float("block_to_goal", 0.0, 20.0),
@@ -50,72 +50,46 @@ class Tuning:
         mppi_params = {
             "noise_sigma": (np.eye(self.cfg.nx//2)*noise_sigma).tolist()
         }
+        return weights, mppi_params
 
+    def configure(self, planner, config):
+        weights, mppi_params = config
         # TODO: incorporate latency into this
-        self.planner.update_weights(weights)
-        self.planner.update_mppi_params(mppi_params)
-        cost = self.run()
-        self.reset()
-        return cost
-
-    def reset(self):
-        # self.sim.stop_sim()
-        # self.sim.start_sim()
-        self.sim.reset_to_initial_poses()
-
-        if self.viewer: 
-            self.sim._gym.viewer_camera_look_at(
-                self.sim.viewer,
-                None,
-                gymapi.Vec3(1.0, 6.5, 4),
-                gymapi.Vec3(1.0, 0, 0),  # CAMERA LOCATION, CAMERA POINT OF INTEREST
-            )
-
-    def run(self):
-        obj = 0
-        t = time.time()
-        for _ in range(200):
-            # Compute action
-            action = bytes_to_torch(
-                self.planner.compute_action_tensor(
-                    torch_to_bytes(self.sim._dof_state), torch_to_bytes(self.sim._root_state)
-                )
-            )
-
-            # Apply action
-            self.sim.set_dof_velocity_target_tensor(action)
-
-            # Step simulator
-            self.sim.step()
-
-            # Visualize samples
-            if self.viewer:
-                rollouts = bytes_to_torch(self.planner.get_rollouts())
-                self.sim._gym.clear_lines(self.sim.viewer)
-                self.sim.draw_lines(rollouts)
+        planner.update_weights(weights)
+        planner.update_mppi_params(mppi_params)
+
+    def episode_cost(self, sim):
+        return block_to_goal(sim)
+
+    def screen(self, planner, weight_sets):
+        """
+        Rank weight sets on the rollouts of a single command from the current state,
+        without running a closed-loop episode for each of them.
+        """
+        planner.set_rollout_recording(True)
+        planner.compute_action_tensor(
+            torch_to_bytes(self.sim._dof_state), torch_to_bytes(self.sim._root_state)
+        )
+        result = bytes_to_torch(planner.evaluate_weight_sets(weight_sets))
+        planner.set_rollout_recording(False)
+        return result["min_cost"]
 
-            # Timekeeping
-            actual_dt = time.time() - t
-            rt = self.cfg.isaacgym.dt / actual_dt
-            if rt > 1.0 and self.viewer:
-                time.sleep(self.cfg.isaacgym.dt - actual_dt)
-                actual_dt = time.time() - t
-                rt = self.cfg.isaacgym.dt / actual_dt
-            if self.viewer:
-                print(f"FPS: {1/actual_dt}, RT={rt}")
-            t = time.time()
 
-            block_pos = self.sim.get_actor_position_by_name("panda_pick_block")
-            goal_pos = self.sim.get_actor_position_by_name("goal")
-            block_to_goal = block_pos[:, 0:3] - goal_pos[:, 0:3]
-            obj += torch.linalg.norm(block_to_goal, axis=1)[0]
+def make_world(cfg, num_envs, viewer):
+    return Tuning(cfg, viewer, num_envs)
 
-        return obj
 
+# Note: trials run in parallel as set in the `tuning` node, see mppiisaac.utils.tuning.TuningConfig,
+# e.g. `+tuning.workers=4`. `+planner_pool=[tcp://host:port,...]` uses running planners instead.
+# With `+tuning.lockstep=true` the trials of a batch run as the envs of a single world.
+# Studies persist in tuning_<config hash>.db, `+tuning.report_every=20` prunes hopeless trials.
 @hydra.main(version_base=None, config_path=".", config_name="panda_pick")
 def main(cfg: ExampleConfig):
-    t = Tuning(cfg)
-    t.tune()
+    planner_command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "planner.py")]
+    addresses = list(cfg.get("planner_pool", None) or [])
+    run_study = run_lockstep_study if tuning_config(cfg).lockstep else run_parallel_study
+    study = run_study(make_world, cfg, planner_command, addresses)
+    print(study.best_params)
 
 
 if __name__ == "__main__":
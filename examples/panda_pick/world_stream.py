@@ -0,0 +1,54 @@
+from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper
+from isaacgym import gymapi
+import hydra
+from mppiisaac.utils.config_store import ExampleConfig
+from mppiisaac.utils.stream_transport import StreamPlannerClient
+import time
+
+
+# Note: start the planner with `python planner.py stream=true`, the world runs at its own rate
+@hydra.main(version_base=None, config_path=".", config_name="panda_pick")
+def run_heijn_robot(cfg: ExampleConfig):
+
+    cfg.isaacgym.dt = 0.1
+    sim = IsaacGymWrapper(
+        cfg.isaacgym,
+        actors=cfg.actors,
+        init_positions=cfg.initial_actor_positions,
+        num_envs=1,
+        viewer=True,
+    )
+
+    planner = StreamPlannerClient("tcp://127.0.0.1:4243")
+
+    sim._gym.viewer_camera_look_at(
+        sim.viewer,
+        None,
+        gymapi.Vec3(1.0, 6.5, 4),
+        gymapi.Vec3(1.0, 0, 0),  # CAMERA LOCATION, CAMERA POINT OF INTEREST
+    )
+
+    t = time.time()
+    for _ in range(cfg.n_steps):
+        # Publish the state, the planner picks up the latest one whenever it is ready
+        planner.publish_state(sim._dof_state, sim._root_state)
+
+        # Apply the action of the freshest plan for the current time, there is none before the first plan
+        action = planner.action()
+        if action is not None:
+            sim.apply_robot_cmd(action)
+
+        # Step simulator
+        sim.step()
+
+        # Timekeeping
+        actual_dt = time.time() - t
+        if actual_dt < cfg.isaacgym.dt:
+            time.sleep(cfg.isaacgym.dt - actual_dt)
+            actual_dt = time.time() - t
+        print(f"FPS: {1/actual_dt}, planner delay: {planner.plan_delay()}")
+        t = time.time()
+
+
+if __name__ == "__main__":
+    res = run_heijn_robot()
@@ -0,0 +1,105 @@
+from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+from isaacgym import gymtorch
+from typing import Callable, Optional
+import torch
+
+
+class ClosedLoopPlanner(MPPIisaacPlanner):
+    """
+    Planner and world in one process and one simulator, without rpc or
+    serialization. The simulator gets one extra env after the rollout envs that
+    plays the real world: its state is read device-to-device as the start state
+    of every command, restored after the rollouts, and only stepped with the
+    executed action. Costs and rollouts only cover the rollout envs.
+    """
+
+    num_world_envs = 1
+
+    def __init__(
+        self,
+        cfg,
+        objective: Callable,
+        prior: Optional[Callable] = None,
+        compile_objective: Optional[str] = None,
+    ):
+        super().__init__(cfg, objective, prior, compile_objective)
+        self.world_env = cfg.mppi.num_samples
+
+        # Note: global actor indices of the world env for the indexed setters
+        num_actors = self.sim._root_state.size(1)
+        actors = [a.handle for a in self.sim.env_cfg]
+        self._world_actor_ids = torch.tensor(
+            [self.world_env * num_actors + a for a in actors], dtype=torch.int32, device=self.sim.device
+        )
+        self._world_dof_actor_ids = torch.tensor(
+            [
+                self.world_env * num_actors + a
+                for a in actors
+                if self.sim._gym.get_actor_dof_count(self.sim.envs[0], a) > 0
+            ],
+            dtype=torch.int32,
+            device=self.sim.device,
+        )
+        self._world_cmd = None
+
+    def _pad_command(self, u):
+        # Note: the world env is stepped along with the rollouts and restored afterwards, it gets a zero command
+        return torch.cat([u, torch.zeros((1, u.size(1)), dtype=u.dtype, device=u.device)])
+
+    def world_state(self):
+        """dof state [1, 2 * dofs] and root state [1, actors, 13] of the world env, as views."""
+        return self.sim._dof_state[self.world_env :], self.sim._root_state[self.world_env :]
+
+    def _restore_world(self, dof_state, root_state):
+        self.sim._dof_state[self.world_env :] = dof_state
+        self.sim._root_state[self.world_env :] = root_state
+        self.sim._gym.set_actor_root_state_tensor_indexed(
+            self.sim._sim,
+            gymtorch.unwrap_tensor(self.sim._root_state),
+            gymtorch.unwrap_tensor(self._world_actor_ids),
+            len(self._world_actor_ids),
+        )
+        if len(self._world_dof_actor_ids) > 0:
+            self.sim._gym.set_dof_state_tensor_indexed(
+                self.sim._sim,
+                gymtorch.unwrap_tensor(self.sim._dof_state),
+                gymtorch.unwrap_tensor(self._world_dof_actor_ids),
+                len(self._world_dof_actor_ids),
+            )
+
+    def plan(self):
+        """Compute an action from the current state of the world env."""
+        dof_state, root_state = (t.clone() for t in self.world_state())
+        self.objective.reset()
+        self.set_world_state(dof_state, root_state)
+        action = self._mppi_command()
+        self._restore_world(dof_state, root_state)
+        return action
+
+    def step_world(self, action):
+        """Step the simulator with action in the world env, the rollout envs are reset by the next plan."""
+        if self._world_cmd is None:
+            self._world_cmd = torch.zeros(
+                (self.sim.num_envs, action.numel()), dtype=action.dtype, device=self.sim.device
+            )
+        self._world_cmd[self.world_env] = action.reshape(-1).to(self.sim.device)
+        self.sim.apply_robot_cmd(self._world_cmd)
+
+        # Note: the rollouts of the last plan stay available for visualization
+        if self.sim._visualize_link_present:
+            num_rollout_steps = len(self.sim.visualize_link_buffer)
+        self.sim.step()
+        if self.sim._visualize_link_present:
+            del self.sim.visualize_link_buffer[num_rollout_steps:]
+
+    def step_closed_loop(self):
+        """One control step: plan from the world state and step the world with the action."""
+        action = self.plan()
+        self.step_world(action)
+        return action
+
+    def reset_world(self):
+        self.sim.reset_to_initial_poses()
+
+    def get_rollouts_tensor(self):
+        return super().get_rollouts_tensor()[:, : self.cfg.mppi.num_samples]
@@ -0,0 +1,347 @@
+from mppiisaac.planner.isaacgym_wrapper import Observation
+from dataclasses import dataclass, field
+from mppiisaac.utils.conversions import quaternion_to_yaw
+import pytorch3d.transforms
+import torch
+from typing import Dict, List, Optional
+
+
+@dataclass
+class CostTermConfig:
+    type: str
+    weight: float = 1.0
+    actor: Optional[str] = None
+    link: Optional[str] = None
+    target: Optional[str] = None
+    target_link: Optional[str] = None
+    reference: Optional[str] = None
+    reference_link: Optional[str] = None
+    dims: List[int] = field(default_factory=lambda: [0, 1, 2])
+    dofs: Optional[List[int]] = None
+    values: Optional[List[float]] = None
+    value: float = 0.0
+    euler_convention: str = "ZYX"
+    euler_dims: List[int] = field(default_factory=lambda: [0, 1])
+
+
+@dataclass
+class CostConfig:
+    terms: Dict[str, CostTermConfig] = field(default_factory=dict)
+
+
+def _dims(dims: List[int], offset: int = 0) -> slice:
+    # Note: only contiguous dims are supported, so selecting them stays a view
+    if list(dims) != list(range(dims[0], dims[-1] + 1)):
+        raise ValueError(f"Cost term dims must be contiguous, got {dims}")
+    return slice(offset + dims[0], offset + dims[-1] + 1)
+
+
+def _point(actor: str, link: Optional[str]) -> Observation:
+    # Note: a point is either the root of an actor or one of its links
+    if link is None:
+        return Observation(name=f"root/{actor}", type="actor", actor=actor)
+    return Observation(name=f"body/{actor}/{link}", type="link", actor=actor, link=link)
+
+
+DOF_OBSERVATION = Observation(name="dof", type="dof")
+
+
+class CostTerm(object):
+    """
+    Base class of a declarative cost term. A term lists the observations it needs
+    in `requires` and, given the dict of named observations, returns a cost of
+    shape [num_envs]. Terms are pure functions of that dict so they can be traced.
+    """
+
+    def __init__(self, cfg: CostTermConfig, device: str):
+        self.cfg = cfg
+
+    def requires(self) -> List[Observation]:
+        return []
+
+    def __call__(self, obs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        raise NotImplementedError
+
+
+class Distance(CostTerm):
+    """Euclidean distance between two points, e.g. link-to-actor or actor-to-goal."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.pos = _point(cfg.actor, cfg.link).name
+        self.target = _point(cfg.target, cfg.target_link).name
+        self.dims = _dims(cfg.dims)
+
+    def requires(self):
+        return [
+            _point(self.cfg.actor, self.cfg.link),
+            _point(self.cfg.target, self.cfg.target_link),
+        ]
+
+    def __call__(self, obs):
+        return torch.linalg.norm(
+            obs[self.pos][:, self.dims] - obs[self.target][:, self.dims], axis=1
+        )
+
+
+class Height(CostTerm):
+    """Absolute height difference between two points."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.pos = _point(cfg.actor, cfg.link).name
+        self.target = _point(cfg.target, cfg.target_link).name
+
+    def requires(self):
+        return [
+            _point(self.cfg.actor, self.cfg.link),
+            _point(self.cfg.target, self.cfg.target_link),
+        ]
+
+    def __call__(self, obs):
+        return torch.abs(obs[self.pos][:, 2] - obs[self.target][:, 2])
+
+
+class MinHeight(CostTerm):
+    """Penalty for a point that drops below `value`."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.pos = _point(cfg.actor, cfg.link).name
+        self.value = float(cfg.value)
+
+    def requires(self):
+        return [_point(self.cfg.actor, self.cfg.link)]
+
+    def __call__(self, obs):
+        return torch.clamp(self.value - obs[self.pos][:, 2], min=0)
+
+
+class ContactForce(CostTerm):
+    """Sum of absolute net contact forces on a rigid body of an actor."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.forces = self.requires()[0].name
+        self.dims = _dims(cfg.dims)
+
+    def requires(self):
+        return [
+            Observation(
+                name=f"contact/{self.cfg.actor}/{self.cfg.link}",
+                type="contact",
+                actor=self.cfg.actor,
+                link=self.cfg.link,
+            )
+        ]
+
+    def __call__(self, obs):
+        return torch.sum(torch.abs(obs[self.forces][:, self.dims]), axis=1)
+
+
+class Orientation(CostTerm):
+    """Norm of selected euler angles of a point, as used for end-effector alignment."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.pos = _point(cfg.actor, cfg.link).name
+        self.euler_dims = _dims(cfg.euler_dims)
+
+    def requires(self):
+        return [_point(self.cfg.actor, self.cfg.link)]
+
+    def __call__(self, obs):
+        rpy = pytorch3d.transforms.matrix_to_euler_angles(
+            pytorch3d.transforms.quaternion_to_matrix(obs[self.pos][:, 3:7]),
+            self.cfg.euler_convention,
+        )[:, self.euler_dims]
+        return torch.linalg.norm(rpy, axis=1)
+
+
+class Yaw(CostTerm):
+    """Absolute yaw error of an actor with respect to `value`."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.pos = _point(cfg.actor, cfg.link).name
+        self.value = float(cfg.value)
+
+    def requires(self):
+        return [_point(self.cfg.actor, self.cfg.link)]
+
+    def __call__(self, obs):
+        return torch.abs(quaternion_to_yaw(obs[self.pos][:, 3:7]) - self.value)
+
+
+class Velocity(CostTerm):
+    """Norm of the linear velocity of a point."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.pos = _point(cfg.actor, cfg.link).name
+        self.dims = _dims(cfg.dims, offset=7)
+
+    def requires(self):
+        return [_point(self.cfg.actor, self.cfg.link)]
+
+    def __call__(self, obs):
+        return torch.linalg.norm(obs[self.pos][:, self.dims], axis=1)
+
+
+class PushAlign(CostTerm):
+    """
+    Alignment of the pusher (actor/link) behind the reference (the pushed object)
+    with respect to the target. Zero when perfectly aligned, two when opposite.
+    """
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.pos = _point(cfg.actor, cfg.link).name
+        self.ref = _point(cfg.reference, cfg.reference_link).name
+        self.target = _point(cfg.target, cfg.target_link).name
+        self.dims = _dims(cfg.dims)
+
+    def requires(self):
+        return [
+            _point(self.cfg.actor, self.cfg.link),
+            _point(self.cfg.reference, self.cfg.reference_link),
+            _point(self.cfg.target, self.cfg.target_link),
+        ]
+
+    def __call__(self, obs):
+        ref = obs[self.ref][:, self.dims]
+        robot_to_ref = obs[self.pos][:, self.dims] - ref
+        ref_to_target = obs[self.target][:, self.dims] - ref
+        return (
+            torch.sum(robot_to_ref * ref_to_target, 1)
+            / (
+                torch.linalg.norm(robot_to_ref, axis=1)
+                * torch.linalg.norm(ref_to_target, axis=1)
+            )
+            + 1
+        )
+
+
+class DofVelocity(CostTerm):
+    """Sum of squared velocities of the dof slice [start, stop)."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.dofs = slice(*cfg.dofs)
+
+    def requires(self):
+        return [DOF_OBSERVATION]
+
+    def __call__(self, obs):
+        return torch.sum(torch.square(obs["dof"][:, self.dofs, 1]), dim=1)
+
+
+class DofPose(CostTerm):
+    """Sum of squared deviations of the dof slice [start, stop) from `values`."""
+
+    def __init__(self, cfg, device):
+        super().__init__(cfg, device)
+        self.dofs = slice(*cfg.dofs)
+        self.ref = torch.tensor(cfg.values, device=device)
+
+    def requires(self):
+        return [DOF_OBSERVATION]
+
+    def __call__(self, obs):
+        return torch.sum(torch.square(obs["dof"][:, self.dofs, 0] - self.ref), dim=1)
+
+
+COST_TERMS = {
+    "distance": Distance,
+    "height": Height,
+    "min_height": MinHeight,
+    "contact_force": ContactForce,
+    "orientation": Orientation,
+    "yaw": Yaw,
+    "velocity": Velocity,
+    "push_align": PushAlign,
+    "dof_velocity": DofVelocity,
+    "dof_pose": DofPose,
+}
+
+
+class CostTermObjective(object):
+    """
+    Objective assembled from a `CostConfig`. On `compile` the terms register their
+    observations with the simulator, which resolves all by-name lookups once and
+    gathers them into preallocated buffers after every step. In eager execution
+    the terms are written into a preallocated buffer too, the pure
+    `cost_from_observations` path stacks them and is the one that gets compiled.
+    Weights live in a device tensor, updating them never touches the terms.
+    """
+
+    def __init__(self, cfg: CostConfig, device: str = "cuda:0"):
+        self.device = device
+        self.names = list(cfg.terms.keys())
+        self.terms = []
+        for name in self.names:
+            term_cfg = cfg.terms[name]
+            if term_cfg.type not in COST_TERMS:
+                raise ValueError(f"Unknown cost term type {term_cfg.type} for {name}")
+            self.terms.append(COST_TERMS[term_cfg.type](term_cfg, device))
+
+        self._weights = torch.tensor(
+            [cfg.terms[name].weight for name in self.names],
+            dtype=torch.float32,
+            device=device,
+        )
+        self._term_buffer = None
+        self.reset()
+
+    @property
+    def weights(self) -> Dict[str, float]:
+        return dict(zip(self.names, self._weights.tolist()))
+
+    @weights.setter
+    def weights(self, weights: Dict[str, float]):
+        for name, w in weights.items():
+            self._weights[self.names.index(name)] = w
+
+    @property
+    def weight_tensor(self) -> torch.Tensor:
+        return self._weights
+
+    def reset(self):
+        pass
+
+    @property
+    def observation_spec(self) -> List[Observation]:
+        spec = []
+        for term in self.terms:
+            for o in term.requires():
+                if o not in spec:
+                    spec.append(o)
+        return spec
+
+    def compile(self, sim):
+        sim.register_observations(self.observation_spec)
+
+    def cost_terms_from_observations(self, obs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        return torch.stack([term(obs) for term in self.terms])
+
+    def cost_from_observations(
+        self, obs: Dict[str, torch.Tensor], weights: torch.Tensor
+    ) -> torch.Tensor:
+        return torch.matmul(weights, self.cost_terms_from_observations(obs))
+
+    def _terms_into_buffer(self, obs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        for i, term in enumerate(self.terms):
+            cost = term(obs)
+            if self._term_buffer is None or self._term_buffer.size(1) != cost.size(0):
+                self._term_buffer = torch.empty(
+                    (len(self.terms), cost.size(0)), dtype=cost.dtype, device=cost.device
+                )
+            self._term_buffer[i] = cost
+        return self._term_buffer
+
+    def compute_cost_terms(self, sim) -> torch.Tensor:
+        # Note: the returned buffer is overwritten by the next call
+        return self._terms_into_buffer(sim.observations)
+
+    def compute_cost(self, sim) -> torch.Tensor:
+        return torch.matmul(self._weights, self._terms_into_buffer(sim.observations))
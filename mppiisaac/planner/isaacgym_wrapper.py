@@ -3,6 +3,7 @@ from isaacgym import gymtorch
 from dataclasses import dataclass, field
 import torch
 import numpy as np
+import multiprocessing
 from enum import Enum
 from typing import List, Optional, Any
 
@@ -77,7 +78,21 @@ class ActorWrapper:
     noise_percentage_friction: float = 0.0
 
 
-from mppiisaac.utils.isaacgym_utils import load_asset, add_ground_plane, load_actor_cfgs, load_obs_actor_cfgs_envs
+@dataclass
+class Observation:
+    """
+    Named quantity read by an objective every step.
+    type is one of "actor" (root state), "link" (rigid body state), "contact"
+    (net contact force of a link) or "dof" (dof state slice [start, stop)).
+    """
+    name: str
+    type: str
+    actor: Optional[str] = None
+    link: Optional[str] = None
+    dofs: Optional[List[int]] = None
+
+
+from mppiisaac.utils.isaacgym_utils import asset_key, load_asset, add_ground_plane, load_actor_cfgs, load_obs_actor_cfgs_envs
 
 
 class IsaacGymWrapper:
@@ -116,6 +131,8 @@ class IsaacGymWrapper:
         self.interactive_goal = interactive_goal
         self.num_envs = num_envs
         self.restarted = 1
+        self._observation_spec = {}
+        self.observations = {}
         self.start_sim()
 
     def initialize_keyboard_listeners(self):
@@ -163,9 +180,11 @@ class IsaacGymWrapper:
             self.restarted += 1
 
         # Load / create assets for all actors in the envs
+        # Note: asset handles belong to the sim, within it actors made from the same asset share it
+        self._assets = {}
         env_actor_assets = []
         for actor_cfg in self.env_cfg:
-            asset = load_asset(self._gym, self._sim, actor_cfg)
+            asset = self._load_asset(actor_cfg)
             env_actor_assets.append(asset)
         
         obs_env_actor_assets = []
@@ -173,7 +192,7 @@ class IsaacGymWrapper:
             for obs_actor_cfg in self.obs_env_cfg:
                 temp_list = []
                 for i in range(len(obs_actor_cfg)):
-                    obs_asset = load_asset(self._gym, self._sim, obs_actor_cfg[i])
+                    obs_asset = self._load_asset(obs_actor_cfg[i])
                     temp_list.append(obs_asset)
                 obs_env_actor_assets.append(temp_list)
             
@@ -228,8 +247,8 @@ class IsaacGymWrapper:
             self.visualize_link_buffer = []
 
         # helpfull slices
-        self.robot_indices = torch.tensor([i for i, a in enumerate(self.env_cfg) if a.type == "robot"], device=self.device)
-        self.obstacle_indices = torch.tensor([i for i, a in enumerate(self.env_cfg) if (a.type in ["sphere", "box"] and a.name != "dummy")], device=self.device)
+        self.robot_indices = torch.tensor([i for i, a in enumerate(self.env_cfg) if a.type == "robot"], dtype=torch.long, device=self.device)
+        self.obstacle_indices = torch.tensor([i for i, a in enumerate(self.env_cfg) if (a.type in ["sphere", "box"] and a.name != "dummy")], dtype=torch.long, device=self.device)
 
         if self._visualize_link_present:
             self.visualize_link_pos = self._rigid_body_state[
@@ -260,16 +279,18 @@ class IsaacGymWrapper:
         self._gym.set_dof_state_tensor(self._sim, gymtorch.unwrap_tensor(dof_state))
         self._gym.refresh_dof_state_tensor(self._sim)
 
-    def reset_to_initial_poses(self):
+        # tensors are recreated on a restart, so the observation buffers are as well
+        if self._observation_spec:
+            self._build_observation_buffers()
+
+    def reset_to_initial_poses(self, env_ids: Optional[torch.Tensor] = None):
+        """Reset the actors of all envs, or only of env_ids, to their initial poses."""
+        envs = slice(None) if env_ids is None else env_ids.to(self.device, torch.long)
         for actor in self.env_cfg:
             actor_state = torch.tensor(
-                [*actor.init_pos, *actor.init_ori, *[0] * 6], device=self.device
+                [*actor.init_pos, *actor.init_ori, *[0] * 6], dtype=torch.float32, device=self.device
             )
-            self._root_state[:, actor.handle] = actor_state
-
-        self._gym.set_actor_root_state_tensor(
-            self._sim, gymtorch.unwrap_tensor(self._root_state)
-        )
+            self._root_state[envs, actor.handle] = actor_state
 
         # set initial joint poses
         robots = [a for a in self.env_cfg if a.type == "robot"]
@@ -282,35 +303,62 @@ class IsaacGymWrapper:
                 dof_state += (
                     [0] * 2 * self._gym.get_actor_dof_count(self.envs[0], robot.handle)
                 )
-        dof_state = (
-            torch.tensor(dof_state, device=self.device)
-            .type(torch.float32)
-            .repeat(self.num_envs, 1)
-        )
-        self._gym.set_dof_state_tensor(self._sim, gymtorch.unwrap_tensor(dof_state))
+
+        if env_ids is None:
+            self._gym.set_actor_root_state_tensor(
+                self._sim, gymtorch.unwrap_tensor(self._root_state)
+            )
+            dof_state = (
+                torch.tensor(dof_state, device=self.device)
+                .type(torch.float32)
+                .repeat(self.num_envs, 1)
+            )
+            self._gym.set_dof_state_tensor(self._sim, gymtorch.unwrap_tensor(dof_state))
+        else:
+            # Note: the other envs keep running, so only the actors of env_ids are written
+            self._dof_state[envs] = torch.tensor(dof_state, device=self.device).type(torch.float32)
+            num_actors = self._root_state.size(1)
+            actor_ids = (envs.unsqueeze(1) * num_actors + torch.arange(num_actors, device=self.device)).int().flatten()
+            self._gym.set_actor_root_state_tensor_indexed(
+                self._sim,
+                gymtorch.unwrap_tensor(self._root_state),
+                gymtorch.unwrap_tensor(actor_ids),
+                len(actor_ids),
+            )
+            dof_actors = torch.tensor(
+                [a.handle for a in self.env_cfg if self._gym.get_actor_dof_count(self.envs[0], a.handle) > 0],
+                device=self.device,
+            )
+            dof_actor_ids = (envs.unsqueeze(1) * num_actors + dof_actors).int().flatten()
+            self._gym.set_dof_state_tensor_indexed(
+                self._sim,
+                gymtorch.unwrap_tensor(self._dof_state),
+                gymtorch.unwrap_tensor(dof_actor_ids),
+                len(dof_actor_ids),
+            )
         self._gym.refresh_dof_state_tensor(self._sim)
 
     @property
     def num_robots(self):
-        return len(self._robot_indices)
+        return len(self.robot_indices)
 
     @property
     def robot_positions(self):
-        return torch.index_select(self._root_state, 1, self._robot_indices)[:, :, 0:3]
+        return torch.index_select(self._root_state, 1, self.robot_indices)[:, :, 0:3]
 
     @property
     def robot_velocities(self):
-        return torch.index_select(self._root_state, 1, self._robot_indices)[:, :, 7:10]
+        return torch.index_select(self._root_state, 1, self.robot_indices)[:, :, 7:10]
 
     @property
     def obstacle_positions(self):
-        return torch.index_select(self._root_state, 1, self._obstacle_indices)[
+        return torch.index_select(self._root_state, 1, self.obstacle_indices)[
             :, :, 0:3
         ]
 
     @property
     def ostacle_velocities(self):
-        return torch.index_select(self._root_state, 1, self._obstacle_indices)[
+        return torch.index_select(self._root_state, 1, self.obstacle_indices)[
             :, :, 7:10
         ]
 
@@ -318,7 +366,7 @@ class IsaacGymWrapper:
         return torch.tensor([a.name for a in self.env_cfg].index(name), device=self.device)
 
     def _get_actor_index_by_robot_index(self, robot_idx: int):
-        return self._robot_indices[robot_idx]
+        return self.robot_indices[robot_idx]
 
     # Getters
     def get_actor_position_by_actor_index(self, actor_idx: int):
@@ -380,6 +428,72 @@ class IsaacGymWrapper:
     def get_dof_state(self):
         return self._dof_state
 
+    # Observations
+    def register_observations(self, observations: List[Observation]):
+        """
+        Register named quantities that are gathered into preallocated buffers
+        right after every refresh, with one gather per source tensor.
+        Returns the dict of named views, also available as `self.observations`.
+        """
+        for o in observations:
+            if o.name in self._observation_spec and self._observation_spec[o.name] != o:
+                raise ValueError(f"Observation {o.name} is already registered differently")
+            self._observation_spec[o.name] = o
+
+        self._build_observation_buffers()
+        return self.observations
+
+    def _build_observation_buffers(self):
+        actor_names = [a.name for a in self.env_cfg]
+        spec = list(self._observation_spec.values())
+
+        def rigid_body_index(o):
+            return self._gym.find_actor_rigid_body_index(
+                self.envs[0], actor_names.index(o.actor), o.link, gymapi.IndexDomain.DOMAIN_ENV
+            )
+
+        actors = [o for o in spec if o.type == "actor"]
+        links = [o for o in spec if o.type == "link"]
+        contacts = [o for o in spec if o.type == "contact"]
+
+        self._obs_root_idx = torch.tensor(
+            [actor_names.index(o.actor) for o in actors], dtype=torch.long, device=self.device
+        )
+        self._obs_body_idx = torch.tensor(
+            [rigid_body_index(o) for o in links], dtype=torch.long, device=self.device
+        )
+        self._obs_contact_idx = torch.tensor(
+            [rigid_body_index(o) for o in contacts], dtype=torch.long, device=self.device
+        )
+        self._obs_root = torch.zeros((self.num_envs, len(actors), 13), device=self.device)
+        self._obs_body = torch.zeros((self.num_envs, len(links), 13), device=self.device)
+        self._obs_contact = torch.zeros((self.num_envs, len(contacts), 3), device=self.device)
+
+        self.observations = {}
+        self.observations.update({o.name: self._obs_root[:, i] for i, o in enumerate(actors)})
+        self.observations.update({o.name: self._obs_body[:, i] for i, o in enumerate(links)})
+        self.observations.update({o.name: self._obs_contact[:, i] for i, o in enumerate(contacts)})
+
+        dof_view = self._dof_state.view(self.num_envs, -1, 2)
+        for o in spec:
+            if o.type == "dof":
+                start, stop = o.dofs if o.dofs is not None else (0, dof_view.size(1))
+                self.observations[o.name] = dof_view[:, start:stop]
+            elif o.type not in ["actor", "link", "contact"]:
+                raise ValueError(f"Invalid observation type {o.type}")
+
+        self.refresh_observations()
+
+    def refresh_observations(self):
+        if len(self._obs_root_idx):
+            torch.index_select(self._root_state, 1, self._obs_root_idx, out=self._obs_root)
+        if len(self._obs_body_idx):
+            torch.index_select(self._rigid_body_state, 1, self._obs_body_idx, out=self._obs_body)
+        if len(self._obs_contact_idx):
+            torch.index_select(
+                self._net_contact_force, 1, self._obs_contact_idx, out=self._obs_contact
+            )
+
     # torch.index_select(self._net_contact_force, 1, rigid_body_idx)
     # self._net_contact_force[:, rigid_body_idx]
 
@@ -400,7 +514,7 @@ class IsaacGymWrapper:
     def set_actor_position_by_robot_index(
         self, position: List[float], robot_idx: str
     ) -> None:
-        actor_idx = self._robot_indices[robot_idx]
+        actor_idx = self.robot_indices[robot_idx]
         self.set_actor_position_by_actor_index(position, actor_idx)
 
     def set_actor_velocity_by_actor_index(
@@ -418,7 +532,7 @@ class IsaacGymWrapper:
     def set_actor_velocity_by_robot_index(
         self, velocity: List[float], robot_idx: str
     ) -> None:
-        actor_idx = self._robot_indices[robot_idx]
+        actor_idx = self.robot_indices[robot_idx]
         self.set_actor_velocity_by_actor_index(velocity, actor_idx)
 
     def set_actor_dof_state(self, state):
@@ -440,10 +554,10 @@ class IsaacGymWrapper:
 
     def stop_sim(self):
         if self.viewer:
-            self.gym.destroy_viewer(self.viewer)
-        for env_idx in range(self.num_envs):
-            self.gym.destroy_env(self.envs[env_idx])
-        self.gym.destroy_sim(self.sim)
+            self._gym.destroy_viewer(self.viewer)
+        for env in self.envs:
+            self._gym.destroy_env(env)
+        self._gym.destroy_sim(self._sim)
 
     def add_to_envs(self, additions):
         for a in additions:
@@ -451,6 +565,14 @@ class IsaacGymWrapper:
         self.stop_sim()
         self.start_sim()
 
+    def _load_asset(self, actor: ActorWrapper):
+        key = asset_key(actor)
+        if key is None:
+            return load_asset(self._gym, self._sim, actor)
+        if key not in self._assets:
+            self._assets[key] = load_asset(self._gym, self._sim, actor)
+        return self._assets[key]
+
     def _create_actor(self, env, env_idx, asset, actor: ActorWrapper) -> int:
         if actor.noise_sigma_size is not None:
             asset = load_asset(self._gym, self._sim, actor)
@@ -669,6 +791,9 @@ class IsaacGymWrapper:
         self._gym.refresh_rigid_body_state_tensor(self._sim)
         self._gym.refresh_net_contact_force_tensor(self._sim)
 
+        if self._observation_spec:
+            self.refresh_observations()
+
         if self.viewer is not None:
             self._gym.step_graphics(self._sim)
             self._gym.draw_viewer(self.viewer, self._sim, False)
@@ -723,6 +848,7 @@ class IsaacGymWrapper:
         where each obstacle is a list of the following order [position, velocity, type, size]
         """
         env_cfg_changed = False
+        actor_indices = {actor.name: idx for idx, actor in enumerate(self.env_cfg)}
 
         for i, obst in enumerate(list(obstacles.values())):
             pos = obst["position"]
@@ -730,11 +856,8 @@ class IsaacGymWrapper:
             o_type = "sphere"
             o_size = obst["size"]
             name = f"{o_type}{i}"
-            try:
-                obst_idx = [
-                    idx for idx, actor in enumerate(self.env_cfg) if actor.name == name
-                ][0]
-            except:
+            obst_idx = actor_indices.get(name)
+            if obst_idx is None:
                 self.env_cfg.append(
                     ActorWrapper(
                         **{
@@ -758,8 +881,7 @@ class IsaacGymWrapper:
                 env_cfg_changed = True
                 self.env_cfg[obst_idx].size = o_size
 
-            for j, env in enumerate(self.envs):
-                self._root_state[j, obst_idx] = obst_state
+            self._root_state[:, obst_idx] = obst_state
 
         # restart _sim for env changes
         if env_cfg_changed:
@@ -783,17 +905,28 @@ class IsaacGymWrapper:
         )
 
     def draw_lines(self, lines, env_idx=0):
-        # convert list of vertices into line segments
-        line_segments = (
-            torch.concat((lines[:-1], lines[1:]), axis=-1)
-            .flatten(end_dim=-2)
-            .cpu()
-            .numpy()
-            .astype(np.float32)
-        )
-        num_lines = line_segments.shape[0]
-        colors = np.zeros((num_lines, 3), dtype=np.float32)
-        colors[:, 1] = 255
+        segments, colors = line_segments(lines)
         self._gym.add_lines(
-            self.viewer, self.envs[env_idx], num_lines, line_segments, colors
+            self.viewer, self.envs[env_idx], segments.shape[0], segments, colors
         )
+
+
+def line_segments(lines):
+    """Segments [num_lines, 6] between consecutive vertices of lines [vertices, ..., 3] and their colors, for add_lines."""
+    # convert list of vertices into line segments
+    segments = (
+        torch.concat((lines[:-1], lines[1:]), axis=-1)
+        .flatten(end_dim=-2)
+        .cpu()
+        .numpy()
+        .astype(np.float32)
+    )
+    colors = np.zeros((segments.shape[0], 3), dtype=np.float32)
+    colors[:, 1] = 255
+    return segments, colors
+
+
+def sim_process_context():
+    """Multiprocessing context for child processes that build simulators."""
+    # Note: spawn, a forked child would share the parent's CUDA and isaacgym state, and isaacgym hosts one simulator per process
+    return multiprocessing.get_context("spawn")
@@ -1,10 +1,19 @@
 from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper, ActorWrapper
+from mppiisaac.planner.objective_compile import CompiledObjective
+from mppiisaac.planner.rollout_reduction import RolloutReduction, encode_rollouts, reduce_rollouts
+from mppiisaac.planner.state_sync import StateSyncTarget, SyncSchema
+from mppiisaac.planner.weight_sets import evaluate_weight_sets, weight_sets_to_tensor
 from mppiisaac.utils.transport import bytes_to_torch, torch_to_bytes
+from mppiisaac.utils.config_store import config_hash
+from mppiisaac.utils.latency import LatencyRecorder
 from mppi_torch.mppi import MPPIPlanner as MPPIPlanner
 import mppiisaac
+from contextlib import contextmanager
 from typing import Callable, Optional
 import io
 import os
+import time
+import warnings
 import yaml
 from yaml.loader import SafeLoader
 
@@ -14,6 +23,49 @@ import torch
 
 torch.set_printoptions(precision=2, sci_mode=False)
 
+CHECKPOINT_VERSION = 2
+
+# Note: the fields of the mppi_torch planner that make up its warm start, the nominal sequence is U or mean_action
+# depending on the mppi mode and the covariance cov_action, fields the planner does not have are skipped
+MPPI_CHECKPOINT_FIELDS = ["U", "mean_action", "cov_action", "scale_tril", "noise_sigma"]
+
+
+def mppi_state(mppi) -> dict:
+    """The warm start fields of an mppi planner, as cpu tensors."""
+    return {
+        k: getattr(mppi, k).detach().cpu()
+        for k in MPPI_CHECKPOINT_FIELDS
+        if isinstance(getattr(mppi, k, None), torch.Tensor)
+    }
+
+
+def load_mppi_state(mppi, state: dict):
+    for k, v in state.items():
+        if k not in MPPI_CHECKPOINT_FIELDS:
+            raise ValueError(f"Unknown mppi checkpoint field {k}")
+        current = getattr(mppi, k, None)
+        if not isinstance(current, torch.Tensor) or current.size() != v.size():
+            warnings.warn(f"Checkpoint field {k} does not fit the planner, skipped")
+            continue
+        current.copy_(v)
+
+
+def objective_state(objective) -> dict:
+    """The weights of an objective, and what its state_dict returns if it has one."""
+    state = {}
+    if isinstance(getattr(objective, "weights", None), dict):
+        state["weights"] = dict(objective.weights)
+    if hasattr(objective, "state_dict"):
+        state["state"] = objective.state_dict()
+    return state
+
+
+def load_objective_state(objective, state: dict):
+    if "weights" in state:
+        objective.weights = state["weights"]
+    if "state" in state:
+        objective.load_state_dict(state["state"])
+
 
 class MPPIisaacPlanner(object):
     """
@@ -21,20 +73,43 @@ class MPPIisaacPlanner(object):
         dynamics, running_cost, and terminal_cost
     """
 
-    def __init__(self, cfg, objective: Callable, prior: Optional[Callable] = None):
+    # Note: envs of the simulator after the num_samples rollout envs that mppi never sees, see ClosedLoopPlanner
+    num_world_envs = 0
+
+    def __init__(
+        self,
+        cfg,
+        objective: Callable,
+        prior: Optional[Callable] = None,
+        compile_objective: Optional[str] = None,
+        sim: Optional[IsaacGymWrapper] = None,
+    ):
         self.cfg = cfg
-        self.objective = objective
+        # Note: opt-in compilation of the objective, one of "compile", "trace" or "eager"
+        self.compile_objective = compile_objective or cfg.get("compile_objective", None)
+        self.objective = self._wrap_objective(objective)
         self.done = False
 
-        self.sim = IsaacGymWrapper(
-            cfg.isaacgym,
-            actors=cfg.actors,
-            obs_actors=cfg.obs_actors,
-            init_positions=cfg.initial_actor_positions,
-            num_envs=cfg.mppi.num_samples, 
-            device=cfg.mppi.device,
-            # viewer=True
-        )
+        num_envs = cfg.mppi.num_samples + self.num_world_envs
+        if sim is None:
+            self.sim = IsaacGymWrapper(
+                cfg.isaacgym,
+                actors=cfg.actors,
+                obs_actors=cfg.obs_actors,
+                init_positions=cfg.initial_actor_positions,
+                num_envs=num_envs,
+                device=cfg.mppi.device,
+                # viewer=True
+            )
+        else:
+            # Note: a simulator shared with other planners that take turns, e.g. the sessions of a PlannerHost
+            if sim.num_envs != num_envs or str(sim.device) != str(cfg.mppi.device):
+                raise ValueError(
+                    f"The simulator has {sim.num_envs} envs on {sim.device}, "
+                    f"the planner needs {num_envs} on {cfg.mppi.device}"
+                )
+            self.sim = sim
+        self._compile_objective()
 
         if prior:
             self.prior = lambda state, t: prior.compute_command(self.sim)
@@ -51,53 +126,167 @@ class MPPIisaacPlanner(object):
 
         # Note: place_holder variable to pass to mppi so it doesn't complain, while the real state is actually the isaacgym simulator itself.
         self.state_place_holder = torch.zeros((self.cfg.mppi.num_samples, self.cfg.nx))
+
+        # Note: when enabled, the sampled actions and per-term costs of the last command are kept
+        self.record_rollouts = False
+        self._rollout_step = 0
+        self._rollout_actions = None
+        self._term_costs = None
+        self._rollout_costs = None
+        # Note: the weights of objectives without a weight_tensor, as a tensor, built on first use
+        self._weights = None
+        self._state_sync = None
+        self.latency = LatencyRecorder()
+        # Note: when enabled, the reset, rollout, cost and remaining mppi time of every command is recorded in
+        # latency as command/<phase>, the device is synchronized around every phase to time it
+        self.profile_phases = cfg.get("profile_phases", False)
+        self._phase_times = {}
+        # Note: how the rollouts of step replies are reduced, see mppiisaac.planner.rollout_reduction
+        self.rollout_reduction = RolloutReduction(**cfg.get("rollout_reduction", {}))
+
+        # Note: the last world state is kept so that a checkpoint can warm start another planner
+        self._last_world_state = None
+        self._num_commands = 0
+        self.checkpoint_path = cfg.get("checkpoint", None)
+        self.checkpoint_interval = cfg.get("checkpoint_interval", 0)
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            self.load_checkpoint(self.checkpoint_path)
     
+    def _wrap_objective(self, objective):
+        if self.compile_objective:
+            return CompiledObjective(objective, backend=self.compile_objective)
+        return objective
+
+    def _compile_objective(self):
+        # Note: compiled objectives are warmed up here, so the first command is not slowed down
+        if hasattr(self.objective, "warmup"):
+            self.objective.warmup(self.sim)
+        # Note: declarative objectives resolve their indices once against the simulator
+        elif hasattr(self.objective, "compile"):
+            self.objective.compile(self.sim)
+        elif hasattr(self.objective, "observation_spec"):
+            self.sim.register_observations(self.objective.observation_spec)
+
     def update_objective(self, objective):
-        self.objective = objective
+        self.objective = self._wrap_objective(objective)
+        self._weights = None
+        self._compile_objective()
 
     def dynamics(self, _, u, t=None):
         # Note: normally mppi passes the state as the first parameter in a dynamics call, but using isaacgym the state is already saved in the simulator itself, so we ignore it.
         # Note: t is an unused step dependent dynamics variable
 
-        self.sim.apply_robot_cmd(u)
+        with self._phase("rollout"):
+            self.sim.apply_robot_cmd(self._pad_command(u))
+
+            self.sim.step()
 
-        self.sim.step()
+        if self.record_rollouts and self._rollout_step < self.cfg.mppi.horizon:
+            if self._rollout_actions is None or self._rollout_actions.size(0) != u.size(0):
+                self._rollout_actions = torch.zeros(
+                    (u.size(0), self.cfg.mppi.horizon, u.size(1)), device=u.device
+                )
+            self._rollout_actions[:, self._rollout_step] = u
+        self._rollout_step += 1
 
         return (self.state_place_holder, u)
 
+    def _pad_command(self, u):
+        return u
+
     def running_cost(self, _):
         # Note: again normally mppi passes the state as a parameter in the running cost call, but using isaacgym the state is already saved and accesible in the simulator itself, so we ignore it and pass a handle to the simulator.
-        return self.objective.compute_cost(self.sim)
+        with self._phase("cost"):
+            return self._running_cost()
+
+    def _running_cost(self):
+        if self.record_rollouts and hasattr(self.objective, "compute_cost_terms"):
+            # Note: objectives exposing per-term costs must satisfy compute_cost == weights @ terms
+            terms = self.objective.compute_cost_terms(self.sim)[:, : self.cfg.mppi.num_samples]
+            if self._term_costs is None or self._term_costs.size() != terms.size():
+                self._term_costs = torch.zeros_like(terms)
+            self._term_costs += terms
+            cost = torch.matmul(self._weight_tensor(), terms)
+        else:
+            cost = self.objective.compute_cost(self.sim)[: self.cfg.mppi.num_samples]
+
+        # Note: the accumulated cost per sample is used to select the best rollouts to return
+        if self._rollout_costs is None or self._rollout_costs.size() != cost.size():
+            self._rollout_costs = torch.zeros_like(cost)
+        self._rollout_costs += cost
+        return cost
+
+    def _weight_tensor(self):
+        if hasattr(self.objective, "weight_tensor"):
+            return self.objective.weight_tensor
+        if self._weights is None:
+            self._weights = weight_sets_to_tensor(
+                [self.objective.weights], self.objective.names, self.cfg.mppi.device
+            )[0]
+        return self._weights
+
+    def _begin_rollouts(self):
+        self._rollout_step = 0
+        if self._term_costs is not None:
+            self._term_costs.zero_()
+        if self._rollout_costs is not None:
+            self._rollout_costs.zero_()
+
+    @contextmanager
+    def _phase(self, name: str):
+        if not self.profile_phases:
+            yield
+            return
+        sync = "cuda" in str(self.cfg.mppi.device)
+        if sync:
+            torch.cuda.synchronize(self.cfg.mppi.device)
+        t = time.perf_counter()
+        yield
+        if sync:
+            torch.cuda.synchronize(self.cfg.mppi.device)
+        self._phase_times[name] = self._phase_times.get(name, 0.0) + time.perf_counter() - t
+
+    def _record_phases(self):
+        phases = self._phase_times
+        self._phase_times = {}
+        command = phases.pop("command")
+        phases["mppi"] = command - phases.get("rollout", 0.0) - phases.get("cost", 0.0)
+        phases["total"] = command + phases.get("reset", 0.0)
+        self.latency.record({f"command/{k}": v for k, v in phases.items()})
+
+    def _mppi_command(self):
+        self._begin_rollouts()
+        with self._phase("command"):
+            action = self.mppi.command(self.state_place_holder)
+        if self.profile_phases:
+            self._record_phases()
+
+        self._num_commands += 1
+        if self.checkpoint_path and self.checkpoint_interval and self._num_commands % self.checkpoint_interval == 0:
+            self.save_checkpoint(self.checkpoint_path)
+        return action
 
     def compute_action(self, q, qdot, obst=None, obst_tensor=None):
-        self.sim.reset_root_state()
-        self.sim.reset_robot_state(q, qdot)
+        with self._phase("reset"):
+            self.sim.reset_root_state()
+            self.sim.reset_robot_state(q, qdot)
 
-        # NOTE: There are two different ways of updating obstacle root_states
-        # Both update based on id in the list of obstacles
-        if obst:
-            self.sim.update_root_state_tensor_by_obstacles(obst)
+            # NOTE: There are two different ways of updating obstacle root_states
+            # Both update based on id in the list of obstacles
+            if obst:
+                self.sim.update_root_state_tensor_by_obstacles(obst)
 
-        if obst_tensor:
-            self.sim.update_root_state_tensor_by_obstacles_tensor(obst_tensor)
+            if obst_tensor:
+                self.sim.update_root_state_tensor_by_obstacles_tensor(obst_tensor)
 
-        self.sim.save_root_state()
-        actions = self.mppi.command(self.state_place_holder).cpu()
+            self.sim.save_root_state()
+        actions = self._mppi_command().cpu()
         return actions
 
     def reset_rollout_sim(
         self, dof_state_tensor, root_state_tensor, rigid_body_state_tensor=None
     ):
-        self.sim.visualize_link_buffer = []
-        self.sim._dof_state[:] = bytes_to_torch(dof_state_tensor)
-        self.sim._root_state[:] = bytes_to_torch(root_state_tensor)
-
-        self.sim._gym.set_dof_state_tensor(
-            self.sim._sim, gymtorch.unwrap_tensor(self.sim._dof_state)
-        )
-        self.sim._gym.set_actor_root_state_tensor(
-            self.sim._sim, gymtorch.unwrap_tensor(self.sim._root_state)
-        )
+        self.set_world_state(bytes_to_torch(dof_state_tensor), bytes_to_torch(root_state_tensor))
 
         # Not implemented by nvidia
         # self.sim._rigid_body_state[:] = bytes_to_torch(rigid_body_state_tensor)
@@ -105,27 +294,172 @@ class MPPIisaacPlanner(object):
         #     self.sim._sim, gymtorch.unwrap_tensor(self.sim._rigid_body_state)
         # )
 
+    def set_world_state(self, dof_state, root_state):
+        with self._phase("reset"):
+            self.sim.visualize_link_buffer = []
+            self._last_world_state = (dof_state.clone(), root_state.clone())
+            self.sim._dof_state[:] = dof_state
+            self.sim._root_state[:] = root_state
+
+            self.sim._gym.set_dof_state_tensor(
+                self.sim._sim, gymtorch.unwrap_tensor(self.sim._dof_state)
+            )
+            self.sim._gym.set_actor_root_state_tensor(
+                self.sim._sim, gymtorch.unwrap_tensor(self.sim._root_state)
+            )
+
     def compute_action_tensor(self, dof_state_tensor, root_state_tensor):
         self.objective.reset()
         self.reset_rollout_sim(dof_state_tensor, root_state_tensor)
         return self.command()
 
+    def compute_action_from_tensors(self, dof_state, root_state):
+        """Tensor level version of compute_action_tensor, used by the shared-memory transport."""
+        self.objective.reset()
+        self.set_world_state(dof_state, root_state)
+        return self._mppi_command()
+
     def command(self):
-        return torch_to_bytes(self.mppi.command(self.state_place_holder))
+        return torch_to_bytes(self._mppi_command())
 
     def add_to_env(self, env_cfg_additions):
         self.sim.add_to_envs(env_cfg_additions)
 
     def get_rollouts(self):
+        return torch_to_bytes(self.select_rollouts())
+
+    def get_rollouts_tensor(self):
         # lines = lines[:, self.mppi.important_samples_indexes, :]
         # print(type(self.mppi.important_samples_indexes))
         if not self.sim._visualize_link_present:
-            return torch_to_bytes(torch.zeros((1, 1, 1)))
+            return torch.zeros((1, 1, 1))
+
+        return torch.stack(self.sim.visualize_link_buffer)
+
+    def select_rollouts(self, top_k: int = 0, downsample: int = 1):
+        """
+        Rollouts of the last command, reduced as configured in rollout_reduction,
+        where top_k and downsample take precedence when set.
+        """
+        return reduce_rollouts(
+            self.get_rollouts_tensor(),
+            self._rollout_costs,
+            self.rollout_reduction.override(top_k, downsample),
+            self.cfg.mppi.lambda_,
+        )
+
+    def set_rollout_reduction(self, options):
+        """Replace the rollout reduction, options are the fields of RolloutReduction."""
+        self.rollout_reduction = RolloutReduction(**options)
+
+    def nominal_sequence(self):
+        """Control sequence [horizon, nu] that mppi warm starts the next command from."""
+        # Note: mppi_torch keeps it as mean_action in the halton-spline mode and as U otherwise
+        nominal = getattr(self.mppi, "mean_action", None)
+        return nominal if nominal is not None else self.mppi.U
+
+    def rollout_cost_stats(self):
+        """min, mean and max of the accumulated rollout costs of the last command."""
+        if self._rollout_costs is None:
+            raise RuntimeError("Run a command first")
+        costs = self._rollout_costs
+        return torch.stack([costs.min(), costs.mean(), costs.max()])
+
+    def set_sync_schema(self, schema):
+        """Only the dynamic actors and dofs of the schema are sent from now on, see mppiisaac.planner.state_sync."""
+        self._state_sync = StateSyncTarget(SyncSchema.from_tensors(bytes_to_torch(schema)), self.sim)
+
+    def apply_state_sync(self, message):
+        if self._state_sync is None:
+            raise RuntimeError("Received a state sync message without a sync schema")
+        self.sim.visualize_link_buffer = []
+        self._state_sync.apply(message, self.sim)
+        self._last_world_state = (self.sim._dof_state[0:1].clone(), self.sim._root_state[0:1].clone())
+
+    def step_from_tensors(self, dof_state, root_state, want_rollouts=False, top_k=0, downsample=1):
+        return self.step_from_message(
+            {"dof_state": dof_state, "root_state": root_state}, want_rollouts, top_k, downsample
+        )
 
-        return torch_to_bytes(torch.stack(self.sim.visualize_link_buffer))
+    def step_from_message(self, message, want_rollouts=False, top_k=0, downsample=1):
+        """message holds either the full dof_state and root_state or a state sync message."""
+        t = time.perf_counter()
+        if "keyframe" in message:
+            self.objective.reset()
+            self.apply_state_sync(message)
+            result = {"action": self._mppi_command()}
+        else:
+            result = {"action": self.compute_action_from_tensors(message["dof_state"], message["root_state"])}
+        # Note: with `every` > 1 most replies carry no rollouts, worlds keep drawing the previous ones
+        if want_rollouts and (self._num_commands - 1) % self.rollout_reduction.every == 0:
+            result.update(
+                encode_rollouts(self.select_rollouts(top_k, downsample), self.rollout_reduction.encoding)
+            )
+        if result["action"].is_cuda:
+            torch.cuda.synchronize(result["action"].device)
+        result["timing"] = torch.tensor([time.perf_counter() - t], dtype=torch.float64)
+        return result
+
+    def step(self, state, want_rollouts=False, top_k=0, downsample=1):
+        """
+        Everything a world needs for one control step in a single round trip.
+        state is a message with the dof_state and root_state tensors or a state sync
+        message, the reply holds the action, the rollouts if requested and the
+        planning time in seconds.
+        """
+        received = time.time()
+        message = bytes_to_torch(state)
+        started = time.time()
+        result = self.step_from_message(message, want_rollouts, top_k, downsample)
+        finished = time.time()
+
+        # Note: the stamps let the client split the round trip, see mppiisaac.utils.latency
+        result["stamps"] = torch.tensor([received, started, finished], dtype=torch.float64)
+        reply = torch_to_bytes(result)
+        self.latency.record(
+            {
+                "step/server_decode": started - received,
+                "step/planning": finished - started,
+                "step/server_encode": time.time() - finished,
+                "step/request_bytes": len(state),
+                "step/reply_bytes": len(reply),
+            }
+        )
+        return reply
+
+    def get_latency_stats(self):
+        """Rolling p50/p95/p99 of the server side timings and payload sizes."""
+        return self.latency.summary()
+
+    def dump_latency(self, path: str):
+        self.latency.dump(path)
 
     def update_weights(self, weights):
         self.objective.weights = weights
+        self._weights = None
+
+    def set_rollout_recording(self, enabled: bool):
+        self.record_rollouts = enabled
+
+    def evaluate_weight_sets(self, weight_sets):
+        """
+        Counterfactual evaluation of a list of weight dicts on the rollouts of the
+        last command, without simulating again. Requires rollout recording and an
+        objective that exposes `names` and `compute_cost_terms`.
+        """
+        if not self.record_rollouts or self._term_costs is None:
+            raise RuntimeError("Enable rollout recording and run a command first")
+
+        weights = weight_sets_to_tensor(weight_sets, self.objective.names, self.cfg.mppi.device)
+        return torch_to_bytes(
+            evaluate_weight_sets(
+                self._term_costs, self._rollout_actions, weights, self.cfg.mppi.lambda_
+            )
+        )
+
+    def seed(self, seed: int):
+        """Seed the sampling of the planner, e.g. for reproducible tuning trials."""
+        torch.manual_seed(seed)
 
     def update_mppi_params(self, params):
         self.cfg.mppi.noise_sigma = params['noise_sigma']
@@ -136,4 +470,40 @@ class MPPIisaacPlanner(object):
             dynamics=self.dynamics,
             running_cost=self.running_cost,
             prior=self.prior,
-        )
\ No newline at end of file
+        )
+
+    def save_checkpoint(self, path: str):
+        """
+        Save what is needed to warm start a planner: the mppi nominal sequence and
+        covariance, the objective state, the last world state and the config hash.
+        """
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "config_hash": config_hash(self.cfg),
+            "mppi": mppi_state(self.mppi),
+            "objective": objective_state(getattr(self.objective, "objective", self.objective)),
+            "world_state": None
+            if self._last_world_state is None
+            else tuple(t.cpu() for t in self._last_world_state),
+        }
+        # Note: write then rename, so a crash never leaves a truncated checkpoint behind
+        tmp_path = f"{path}.tmp"
+        torch.save(checkpoint, tmp_path)
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self, path: str, strict: bool = False):
+        checkpoint = torch.load(path, map_location="cpu")
+        if checkpoint["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {checkpoint['version']}")
+        if checkpoint["config_hash"] != config_hash(self.cfg):
+            if strict:
+                raise ValueError("Checkpoint was saved with a different configuration")
+            warnings.warn("Checkpoint was saved with a different configuration, loading anyway")
+
+        load_mppi_state(self.mppi, checkpoint["mppi"])
+        load_objective_state(getattr(self.objective, "objective", self.objective), checkpoint["objective"])
+        self._weights = None
+
+        if checkpoint["world_state"] is not None:
+            dof_state, root_state = checkpoint["world_state"]
+            self.set_world_state(dof_state, root_state)
@@ -0,0 +1,117 @@
+from typing import Callable, Dict, Optional
+import warnings
+import torch
+
+
+COMPILE_BACKENDS = ["compile", "trace", "eager"]
+
+
+class CompiledObjective(object):
+    """
+    Opt-in compiled execution of an objective that exposes the pure tensor function
+    `cost_from_observations(observations, weights)` and a `weight_tensor`.
+
+    The weights are passed in as a tensor, so `update_weights` does not trigger a
+    recompilation. One compiled function is kept per number of envs (the shape
+    bucket), because the rollout batch of a planner always has the same size.
+    Backends are tried in order: torch.compile, TorchScript tracing and eager.
+    """
+
+    def __init__(self, objective, backend: str = "compile"):
+        if not hasattr(objective, "cost_from_observations"):
+            raise ValueError(
+                "Only objectives that implement cost_from_observations can be compiled"
+            )
+        if backend not in COMPILE_BACKENDS:
+            raise ValueError(f"Invalid compile backend {backend}, use one of {COMPILE_BACKENDS}")
+
+        self.objective = objective
+        self.backend = backend
+        self._compiled: Dict[int, Callable] = {}
+        self.used_backend: Dict[int, str] = {}
+        self._obs_source = None
+
+    @property
+    def weights(self):
+        return self.objective.weights
+
+    @weights.setter
+    def weights(self, weights):
+        self.objective.weights = weights
+
+    @property
+    def weight_tensor(self) -> torch.Tensor:
+        return self.objective.weight_tensor
+
+    @property
+    def observation_spec(self):
+        return self.objective.observation_spec
+
+    def reset(self):
+        self.objective.reset()
+
+    def compile(self, sim):
+        if hasattr(self.objective, "compile"):
+            self.objective.compile(sim)
+        else:
+            sim.register_observations(self.objective.observation_spec)
+
+    def warmup(self, sim):
+        """Compile the bucket for this simulator now instead of during the first command."""
+        self.compile(sim)
+        self.compute_cost(sim)
+
+    def _build(self, obs: Dict[str, torch.Tensor], bucket: int) -> Callable:
+        fn = self.objective.cost_from_observations
+        weights = self.objective.weight_tensor
+        candidates = COMPILE_BACKENDS[COMPILE_BACKENDS.index(self.backend):]
+
+        for backend in candidates:
+            try:
+                if backend == "compile":
+                    if not hasattr(torch, "compile"):
+                        raise RuntimeError("torch.compile requires torch>=2.0")
+                    compiled = torch.compile(fn, dynamic=False)
+                elif backend == "trace":
+                    compiled = torch.jit.trace(fn, (obs, weights), strict=False)
+                else:
+                    compiled = fn
+
+                # Note: compilation errors only surface on the first call
+                compiled(obs, weights)
+            except Exception as e:
+                warnings.warn(f"Compiling the objective with {backend} failed, falling back: {e}")
+                continue
+
+            self.used_backend[bucket] = backend
+            return compiled
+
+        raise RuntimeError("Unable to evaluate the objective")
+
+    def _function(self, obs: Dict[str, torch.Tensor], num_envs: int) -> Callable:
+        fn = self._compiled.get(num_envs)
+        if fn is None:
+            fn = self._build(obs, num_envs)
+            self._compiled[num_envs] = fn
+        return fn
+
+    def cost_from_observations(
+        self, obs: Dict[str, torch.Tensor], weights: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        if weights is None:
+            weights = self.objective.weight_tensor
+        num_envs = next(iter(obs.values())).size(0)
+        return self._function(obs, num_envs)(obs, weights)
+
+    def compute_cost(self, sim) -> torch.Tensor:
+        # Note: only the observations of this objective are passed, so unrelated ones don't retrace
+        if sim.observations is not self._obs_source:
+            self._obs_source = sim.observations
+            self._obs = {o.name: sim.observations[o.name] for o in self.objective.observation_spec}
+        return self.cost_from_observations(self._obs)
+
+    def __getattr__(self, name):
+        # Note: anything else, e.g. objective state or per-term costs, is served by the objective
+        if name == "objective":
+            raise AttributeError(name)
+        return getattr(self.objective, name)
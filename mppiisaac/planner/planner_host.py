@@ -0,0 +1,233 @@
+from mppiisaac.planner.cost_terms import CostConfig, CostTermObjective
+from mppiisaac.planner.isaacgym_wrapper import IsaacGymConfig
+from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+from mppiisaac.planner.rollout_reduction import decode_rollouts
+from mppiisaac.utils.transport import bytes_to_torch, torch_to_bytes
+from mppi_torch.mppi import MPPIConfig
+from collections import OrderedDict, deque
+from omegaconf import OmegaConf
+from typing import Dict, List
+import gevent
+import gevent.event
+import zerorpc
+
+
+# Note: what a command leaves in the shared simulator for later calls of the same session
+SESSION_SIM_STATE = ["visualize_link_buffer", "saved_root_state"]
+
+
+def scene_of(cfg) -> dict:
+    """The part of a planner config that its rollout simulator is built from."""
+    return OmegaConf.to_container(
+        OmegaConf.create(
+            {
+                "isaacgym": cfg.isaacgym,
+                "actors": cfg.actors,
+                "obs_actors": cfg.get("obs_actors", []),
+                "initial_actor_positions": cfg.initial_actor_positions,
+                "num_samples": cfg.mppi.num_samples,
+                "device": cfg.mppi.device,
+            }
+        ),
+        resolve=True,
+    )
+
+
+class PlannerHost(object):
+    """
+    Serves several named planner sessions behind one zerorpc endpoint, so they
+    share the process, its CUDA context and the gym instance. isaacgym hosts a
+    single simulator per process, so the sessions also share one rollout
+    simulator: every command writes the world state of its session into all envs
+    before its rollouts, and calls run one at a time. Sessions therefore need the
+    same scene, see `scene_of`, and have their own config, objective and mppi
+    warm start. The simulator is destroyed when the last session closes; viewers
+    should be disabled.
+
+    Calls take the session id as first argument. They are queued per session and
+    executed by a single worker in round-robin order, one call per session per
+    round, so a session that sends many requests cannot starve the others.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, MPPIisaacPlanner] = OrderedDict()
+        self.sim = None
+        self._scene = None
+        self._sim_state: Dict[str, dict] = {}
+        self._pending: Dict[str, deque] = OrderedDict()
+        self._wakeup = gevent.event.Event()
+        self._worker = None
+
+    def _check_scene(self, cfg):
+        if self._scene is not None and scene_of(cfg) != self._scene:
+            raise ValueError(
+                f"Sessions share the rollout simulator of the host, the scene {scene_of(cfg)} "
+                f"differs from {self._scene}"
+            )
+
+    def add_session(self, session_id: str, planner: MPPIisaacPlanner):
+        """Add a planner, the first one provides the simulator, later ones are built with sim=host.sim."""
+        if session_id in self.sessions:
+            raise ValueError(f"Session {session_id} already exists")
+        sim = getattr(planner, "sim", None)
+        if self.sim is not None and sim is not self.sim:
+            raise ValueError("Planners of a host share its simulator, build them with sim=host.sim")
+        if hasattr(planner, "cfg"):
+            self._check_scene(planner.cfg)
+            self._scene = scene_of(planner.cfg)
+        self.sim = sim
+        self.sessions[session_id] = planner
+        self._sim_state[session_id] = {"visualize_link_buffer": [], "saved_root_state": None}
+        self._pending[session_id] = deque()
+
+    def open_session(self, session_id: str, config: str):
+        """
+        Create a session from a yaml config, as composed for an example, with a
+        declarative objective in its `cost` node.
+        """
+        cfg = OmegaConf.create(config)
+        if "cost" not in cfg:
+            raise ValueError("Sessions opened over rpc need a declarative objective in `cost`")
+        cfg.mppi = OmegaConf.merge(OmegaConf.structured(MPPIConfig), cfg.mppi)
+        cfg.isaacgym = OmegaConf.merge(OmegaConf.structured(IsaacGymConfig), cfg.isaacgym)
+        if session_id in self.sessions:
+            raise ValueError(f"Session {session_id} already exists")
+        self._check_scene(cfg)
+        objective = CostTermObjective(
+            OmegaConf.merge(OmegaConf.structured(CostConfig), cfg.cost), cfg.mppi.device
+        )
+        self.add_session(session_id, MPPIisaacPlanner(cfg, objective, prior=None, sim=self.sim))
+
+    def close_session(self, session_id: str):
+        self._planner(session_id)
+        for _, _, result in self._pending.pop(session_id):
+            result.set_exception(RuntimeError(f"Session {session_id} was closed"))
+        del self.sessions[session_id]
+        del self._sim_state[session_id]
+
+        if not self.sessions:
+            if self.sim is not None:
+                self.sim.stop_sim()
+            self.sim = None
+            self._scene = None
+
+    def list_sessions(self) -> List[str]:
+        return list(self.sessions.keys())
+
+    def _planner(self, session_id: str) -> MPPIisaacPlanner:
+        if session_id not in self.sessions:
+            raise ValueError(f"Unknown session {session_id}")
+        return self.sessions[session_id]
+
+    def _submit(self, session_id: str, fn, *args):
+        self._planner(session_id)
+        result = gevent.event.AsyncResult()
+        self._pending[session_id].append((fn, args, result))
+        self._wakeup.set()
+        return result.get()
+
+    def _swap_sim_state(self, session_id: str, restore: bool):
+        if self.sim is None:
+            return
+        if restore:
+            for name, value in self._sim_state[session_id].items():
+                setattr(self.sim, name, value)
+        elif session_id in self.sessions:
+            # Note: a session closed during its own call leaves no state behind
+            self._sim_state[session_id] = {name: getattr(self.sim, name, None) for name in SESSION_SIM_STATE}
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            while any(self._pending.values()):
+                for session_id in list(self._pending.keys()):
+                    queue = self._pending.get(session_id)
+                    if not queue:
+                        continue
+                    fn, args, result = queue.popleft()
+                    self._swap_sim_state(session_id, restore=True)
+                    try:
+                        result.set(fn(*args))
+                    except Exception as e:
+                        result.set_exception(e)
+                    finally:
+                        self._swap_sim_state(session_id, restore=False)
+                    # Note: yield after every call, so requests that arrived meanwhile join this round
+                    gevent.sleep(0)
+
+                # Note: rotate the order, so no session is always served first
+                if self._pending:
+                    self._pending.move_to_end(next(iter(self._pending)))
+
+    def start(self):
+        if self._worker is None:
+            self._worker = gevent.spawn(self._run)
+
+    def step(self, session_id: str, state, want_rollouts=False, top_k=0, downsample=1):
+        planner = self._planner(session_id)
+        return self._submit(session_id, planner.step, state, want_rollouts, top_k, downsample)
+
+    def compute_action_tensor(self, session_id: str, dof_state_tensor, root_state_tensor):
+        planner = self._planner(session_id)
+        return self._submit(session_id, planner.compute_action_tensor, dof_state_tensor, root_state_tensor)
+
+    def get_rollouts(self, session_id: str):
+        planner = self._planner(session_id)
+        return self._submit(session_id, planner.get_rollouts)
+
+    def call(self, session_id: str, method: str, *args):
+        """Any other public method of the planner of a session, e.g. update_weights."""
+        if method.startswith("_"):
+            raise ValueError(f"Method {method} is not public")
+        planner = self._planner(session_id)
+        return self._submit(session_id, getattr(planner, method), *args)
+
+
+class SessionClient(object):
+    """Client of one session of a PlannerHost, with the calls of a planner client."""
+
+    def __init__(self, address: str, session_id: str, **kwargs):
+        self.session_id = session_id
+        self.rpc = zerorpc.Client(**kwargs)
+        self.rpc.connect(address)
+
+    def compute_action_tensor(self, dof_state_tensor, root_state_tensor):
+        return self.rpc.compute_action_tensor(self.session_id, dof_state_tensor, root_state_tensor)
+
+    def get_rollouts(self):
+        return self.rpc.get_rollouts(self.session_id)
+
+    def compute_action_from_tensors(self, dof_state, root_state):
+        return bytes_to_torch(
+            self.compute_action_tensor(torch_to_bytes(dof_state), torch_to_bytes(root_state))
+        )
+
+    def get_rollouts_tensor(self):
+        return bytes_to_torch(self.get_rollouts())
+
+    def step_from_message(self, message, want_rollouts=False, top_k=0, downsample=1):
+        result = bytes_to_torch(
+            self.rpc.step(self.session_id, torch_to_bytes(message), want_rollouts, top_k, downsample)
+        )
+        result.pop("stamps", None)
+        return decode_rollouts(result)
+
+    def step_from_tensors(self, dof_state, root_state, want_rollouts=False, top_k=0, downsample=1):
+        return self.step_from_message(
+            {"dof_state": dof_state, "root_state": root_state}, want_rollouts, top_k, downsample
+        )
+
+    def __getattr__(self, name):
+        if name in ("rpc", "session_id"):
+            raise AttributeError(name)
+        return lambda *args: self.rpc.call(self.session_id, name, *args)
+
+
+def serve_host(host: PlannerHost, address: str = "tcp://0.0.0.0:4242"):
+    """Serve a planner host. Blocks."""
+    host.start()
+    server = zerorpc.Server(host)
+    server.bind(address)
+    server.run()
@@ -0,0 +1,86 @@
+"""
+Server-side reduction of the rollouts sent for visualization.
+
+The full rollouts are [horizon, num_samples, 3] float32, megabytes per step at
+a thousand samples. The planner reduces them before they are sent: the top_k
+cheapest samples, an evenly spaced subset of samples, or only the nominal
+trajectory, every downsample-th step of the horizon, and only every `every`-th
+command. They are then encoded as float32, float16, or int16 quantized
+relative to their bounding box.
+"""
+from mppiisaac.planner.weight_sets import mppi_sample_weights
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+import torch
+
+ENCODINGS = ["float32", "float16", "int16"]
+
+
+@dataclass
+class RolloutReduction:
+    top_k: int = 0
+    num_samples: int = 0
+    nominal: bool = False
+    downsample: int = 1
+    every: int = 1
+    encoding: str = "float32"
+
+    def __post_init__(self):
+        if self.encoding not in ENCODINGS:
+            raise ValueError(f"Unknown rollout encoding {self.encoding}, use one of {ENCODINGS}")
+        if self.downsample < 1 or self.every < 1:
+            raise ValueError("downsample and every must be at least 1")
+
+    def override(self, top_k: int = 0, downsample: int = 1) -> "RolloutReduction":
+        """The reduction with the per-call options of a step request, where they are set."""
+        return replace(
+            self,
+            top_k=top_k if top_k > 0 else self.top_k,
+            downsample=downsample if downsample > 1 else self.downsample,
+        )
+
+
+def reduce_rollouts(
+    rollouts: torch.Tensor,
+    costs: Optional[torch.Tensor],
+    reduction: RolloutReduction,
+    lambda_: float = 1.0,
+) -> torch.Tensor:
+    """Select samples and steps of rollouts [horizon, samples, 3] given the accumulated costs per sample."""
+    has_costs = costs is not None and rollouts.size(1) == costs.size(0)
+    if reduction.nominal and has_costs:
+        # Note: the importance weighted mean of the sampled trajectories, mppi does not simulate the nominal one
+        omega = mppi_sample_weights(costs, lambda_)
+        rollouts = torch.einsum("k,hkd->hd", omega, rollouts).unsqueeze(1)
+    elif reduction.top_k > 0 and has_costs:
+        k = min(reduction.top_k, rollouts.size(1))
+        rollouts = rollouts[:, torch.topk(costs, k, largest=False).indices]
+    if 0 < reduction.num_samples < rollouts.size(1):
+        idx = torch.linspace(0, rollouts.size(1) - 1, reduction.num_samples, device=rollouts.device).long()
+        rollouts = rollouts[:, idx]
+    if reduction.downsample > 1:
+        rollouts = rollouts[:: reduction.downsample]
+    return rollouts
+
+
+def encode_rollouts(rollouts: torch.Tensor, encoding: str = "float32") -> Dict[str, torch.Tensor]:
+    if encoding == "float16":
+        return {"rollouts": rollouts.half()}
+    if encoding == "int16":
+        flat = rollouts.reshape(-1, rollouts.size(-1))
+        low = flat.min(dim=0).values
+        scale = (flat.max(dim=0).values - low).clamp_min(1e-9) / 65535
+        q = torch.round((rollouts - low) / scale) - 32768
+        return {"rollouts_q": q.to(torch.int16), "rollouts_low": low, "rollouts_scale": scale}
+    return {"rollouts": rollouts}
+
+
+def decode_rollouts(result: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+    """Replace encoded rollouts in a step result by float32 rollouts, in place."""
+    if "rollouts_q" in result:
+        q = result.pop("rollouts_q")
+        low, scale = result.pop("rollouts_low"), result.pop("rollouts_scale")
+        result["rollouts"] = (q.float() + 32768) * scale + low
+    elif "rollouts" in result and result["rollouts"].dtype != torch.float32:
+        result["rollouts"] = result["rollouts"].float()
+    return result
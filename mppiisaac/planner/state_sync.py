@@ -0,0 +1,185 @@
+from isaacgym import gymapi, gymtorch
+from mppiisaac.utils.transport import torch_to_bytes
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import torch
+
+
+@dataclass
+class SyncSchema:
+    """
+    The part of the world state that is sent to the planner every step, agreed on
+    when connecting. actors index the actor dimension of the root state, dofs the
+    dof dimension of the dof state; num_actors and num_dofs guard against a
+    planner with a differently built scene.
+    """
+    actors: List[int]
+    dofs: List[int]
+    num_actors: int
+    num_dofs: int
+
+    @classmethod
+    def from_sim(cls, sim, actors: Optional[List[str]] = None) -> "SyncSchema":
+        """
+        By default robots and all actors that are not fixed are dynamic, and the
+        goal when it can be moved from the viewer.
+        """
+        if actors is None:
+            actors = [a.name for a in sim.env_cfg if a.type == "robot" or not a.fixed]
+            if sim.interactive_goal and sim.viewer is not None:
+                actors.append("goal")
+
+        actor_idx, dof_idx = [], []
+        for a in sim.env_cfg:
+            if a.name not in actors:
+                continue
+            actor_idx.append(a.handle)
+            for i in range(sim._gym.get_actor_dof_count(sim.envs[0], a.handle)):
+                dof_idx.append(
+                    sim._gym.get_actor_dof_index(sim.envs[0], a.handle, i, gymapi.DOMAIN_ENV)
+                )
+        return cls(
+            actors=actor_idx,
+            dofs=dof_idx,
+            num_actors=sim._root_state.size(1),
+            num_dofs=sim._dof_state.size(1) // 2,
+        )
+
+    def to_tensors(self) -> Dict[str, torch.Tensor]:
+        return {
+            "actors": torch.tensor(self.actors, dtype=torch.int64),
+            "dofs": torch.tensor(self.dofs, dtype=torch.int64),
+            "sizes": torch.tensor([self.num_actors, self.num_dofs], dtype=torch.int64),
+        }
+
+    @classmethod
+    def from_tensors(cls, tensors: Dict[str, torch.Tensor]) -> "SyncSchema":
+        num_actors, num_dofs = tensors["sizes"].tolist()
+        return cls(
+            actors=tensors["actors"].tolist(),
+            dofs=tensors["dofs"].tolist(),
+            num_actors=num_actors,
+            num_dofs=num_dofs,
+        )
+
+
+class StateSync(object):
+    """
+    World side of the state synchronization. `message` returns the dynamic rows
+    of the root and dof state that changed since the last acknowledged message,
+    and all of them for a keyframe, i.e. until a message is acknowledged, every
+    `keyframe_interval` messages and after `reset`. Call `ack` once the planner
+    replied to a message, a lost message is then covered by the next one.
+    """
+
+    def __init__(self, schema: SyncSchema, device: str, keyframe_interval: int = 100):
+        self.schema = schema
+        self.keyframe_interval = keyframe_interval
+        self._actors = torch.tensor(schema.actors, dtype=torch.long, device=device)
+        self._dofs = torch.tensor(schema.dofs, dtype=torch.long, device=device)
+        self._count = 0
+        self.reset()
+
+    def reset(self):
+        self._root_ref = None
+        self._dof_ref = None
+        self._pending = None
+
+    def ack(self):
+        """The planner applied the last message, the next deltas are taken against it."""
+        if self._pending is None:
+            raise RuntimeError("No message to acknowledge")
+        self._root_ref, self._dof_ref = self._pending
+        self._pending = None
+
+    def message(self, sim) -> Dict[str, torch.Tensor]:
+        root = sim._root_state[0, self._actors]
+        dof = sim._dof_state.view(sim.num_envs, -1, 2)[0, self._dofs]
+
+        keyframe = self._root_ref is None or (
+            self.keyframe_interval > 0 and self._count % self.keyframe_interval == 0
+        )
+        if keyframe:
+            root_idx = torch.arange(root.size(0), device=root.device)
+            dof_idx = torch.arange(dof.size(0), device=dof.device)
+        else:
+            # Note: exact comparison, bodies at rest keep bit-identical states and are skipped
+            root_idx = torch.nonzero(torch.any(root != self._root_ref, dim=1)).flatten()
+            dof_idx = torch.nonzero(torch.any(dof != self._dof_ref, dim=1)).flatten()
+
+        self._pending = (root.clone(), dof.clone())
+        self._count += 1
+        return {
+            "keyframe": torch.tensor([keyframe]),
+            "root_idx": root_idx,
+            "root": root[root_idx],
+            "dof_idx": dof_idx,
+            "dof": dof[dof_idx],
+        }
+
+
+class StateSyncTarget(object):
+    """
+    Planner side of the state synchronization. Keeps the last world state of the
+    dynamic rows, applies the changed rows of a message to it and writes it into
+    every env of the rollout simulator with indexed writes.
+    """
+
+    def __init__(self, schema: SyncSchema, sim):
+        num_actors, num_dofs = sim._root_state.size(1), sim._dof_state.size(1) // 2
+        if (schema.num_actors, schema.num_dofs) != (num_actors, num_dofs):
+            raise ValueError(
+                f"World has {schema.num_actors} actors and {schema.num_dofs} dofs, "
+                f"the planner {num_actors} actors and {num_dofs} dofs"
+            )
+
+        self.schema = schema
+        self._actors = torch.tensor(schema.actors, dtype=torch.long, device=sim.device)
+        self._dofs = torch.tensor(schema.dofs, dtype=torch.long, device=sim.device)
+        self._root = torch.zeros((len(schema.actors), 13), device=sim.device)
+        self._dof = torch.zeros((len(schema.dofs), 2), device=sim.device)
+        self._has_keyframe = False
+
+        # Note: global actor indices for the indexed setters, for all envs of the rollout simulator
+        envs = torch.arange(sim.num_envs, dtype=torch.int32, device=sim.device).unsqueeze(1)
+        self._actor_ids = (envs * num_actors + self._actors.int()).flatten()
+        dof_actors = [
+            a for a in schema.actors if sim._gym.get_actor_dof_count(sim.envs[0], a) > 0
+        ]
+        self._dof_actor_ids = (
+            envs * num_actors + torch.tensor(dof_actors, dtype=torch.int32, device=sim.device)
+        ).flatten()
+
+    def apply(self, message: Dict[str, torch.Tensor], sim):
+        if bool(message["keyframe"][0]):
+            self._has_keyframe = True
+        elif not self._has_keyframe:
+            raise RuntimeError("Received a state delta before a keyframe")
+
+        self._root[message["root_idx"].to(sim.device)] = message["root"].to(sim.device)
+        self._dof[message["dof_idx"].to(sim.device)] = message["dof"].to(sim.device)
+
+        sim._root_state[:, self._actors] = self._root
+        sim._dof_state.view(sim.num_envs, -1, 2)[:, self._dofs] = self._dof
+
+        if len(self._actor_ids) > 0:
+            sim._gym.set_actor_root_state_tensor_indexed(
+                sim._sim,
+                gymtorch.unwrap_tensor(sim._root_state),
+                gymtorch.unwrap_tensor(self._actor_ids),
+                len(self._actor_ids),
+            )
+        if len(self._dof_actor_ids) > 0:
+            sim._gym.set_dof_state_tensor_indexed(
+                sim._sim,
+                gymtorch.unwrap_tensor(sim._dof_state),
+                gymtorch.unwrap_tensor(self._dof_actor_ids),
+                len(self._dof_actor_ids),
+            )
+
+
+def negotiate_state_sync(planner, sim, actors: Optional[List[str]] = None, keyframe_interval: int = 100) -> StateSync:
+    """Agree on a sync schema with a connected planner client, returns the world side of it."""
+    schema = SyncSchema.from_sim(sim, actors)
+    planner.set_sync_schema(torch_to_bytes(schema.to_tensors()))
+    return StateSync(schema, sim.device, keyframe_interval)
@@ -0,0 +1,30 @@
+import pytest
+import torch
+
+
+class PointSim(object):
+    """Point masses that move with the commanded velocity, one per env."""
+
+    device = "cpu"
+
+    def __init__(self, num_envs):
+        self.num_envs = num_envs
+        self._dof_state = torch.zeros((num_envs, 2))
+        self._root_state = torch.zeros((num_envs, 1, 13))
+        self.resets = []
+
+    def apply_robot_cmd(self, u):
+        self._dof_state[:, 1] = u[:, 0]
+
+    def step(self):
+        self._dof_state[:, 0] += self._dof_state[:, 1]
+
+    def reset_to_initial_poses(self, env_ids=None):
+        self.resets.append(env_ids.tolist())
+        self._dof_state[env_ids] = 0
+
+
+@pytest.fixture
+def point_sim():
+    """Makes a PointSim of num_envs envs."""
+    return PointSim
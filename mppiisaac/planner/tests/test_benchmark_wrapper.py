@@ -0,0 +1,55 @@
+from mppiisaac.planner.mppi_isaac import mppi_state
+from mppiisaac.utils.scenario_runner import load_example
+from omegaconf import OmegaConf
+from types import SimpleNamespace
+import importlib.util
+import mppiisaac
+import numpy as np
+import os
+import pytest
+import torch
+
+pytest.importorskip("plannerbenchmark")
+
+ROOT = os.path.join(os.path.dirname(mppiisaac.__file__), "..")
+EXAMPLE = os.path.join(ROOT, "examples/heijn_reach/config_heijn_reach.yaml")
+
+
+def _wrapper_module():
+    path = os.path.join(ROOT, "benchmarks/point_robot/mppi_planner/mppi_planner_wrapper.py")
+    spec = importlib.util.spec_from_file_location("mppi_planner_wrapper", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_warm_up_after_adding_obstacles() -> None:
+    overrides = ["mppi.num_samples=8", "mppi.horizon=4", "mppi.device=cpu", "isaacgym.use_gpu_pipeline=false"]
+    config = OmegaConf.to_container(load_example(EXAMPLE, overrides))
+    config.update(warmup_calls=2, profile_phases=False)
+    exp = SimpleNamespace(initState=lambda: (np.zeros(3), np.zeros(3)))
+    goal = SimpleNamespace(sub_goals=lambda: [SimpleNamespace(position=lambda: [2.0, 2.0])])
+
+    planner = _wrapper_module().MPPIPlanner(exp, config=config)
+    planner.setGoal(goal)
+    planner.concretize()
+    sim = planner._planner.sim
+    num_actors = sim._root_state.shape[1]
+    warm_start = mppi_state(planner._planner.mppi)["U"].clone()
+    try:
+        # Note: the first observation brings an obstacle, which restarts the simulator with one more actor
+        obstacle = {"position": [1.0, 1.0, 0.0], "velocity": [0.0, 0.0, 0.0], "size": [0.2]}
+        ob = {
+            "FullSensor": {"obstacles": {"obst0": obstacle}},
+            "joint_state": {"position": np.zeros(3), "velocity": np.zeros(3)},
+        }
+        action = planner.computeAction(**ob)
+        assert action.shape == (3,)
+        assert sim._root_state.shape[1] > num_actors
+
+        profile = planner.profile()
+        assert profile["warmup_ms"]["count"] == 4
+        assert [r["call"] for r in profile["restarts"]] == [1] and profile["steady_ms"]["count"] == 0
+        assert not torch.equal(planner._planner.mppi.U, warm_start)
+    finally:
+        sim.stop_sim()
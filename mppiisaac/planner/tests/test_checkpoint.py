@@ -0,0 +1,46 @@
+from mppiisaac.planner.mppi_isaac import load_mppi_state, mppi_state
+from mppiisaac.utils.scenario_runner import example_objective, load_example
+import mppiisaac
+import os
+import torch
+
+EXAMPLE = os.path.join(os.path.dirname(mppiisaac.__file__), "../examples/heijn_reach/config_heijn_reach.yaml")
+
+
+def test_mppi_state_keeps_nominal_of_sample_length() -> None:
+    # Note: a horizon equal to num_samples must not make the nominal sequence look like a per-sample buffer
+    class Mppi(object):
+        def __init__(self):
+            self.U = torch.rand((12, 3))
+            self.cov_action = torch.rand(3)
+            self.device = "cpu"
+
+    source, target = Mppi(), Mppi()
+    state = mppi_state(source)
+    assert sorted(state) == ["U", "cov_action"]
+
+    target.device = "cuda:0"
+    load_mppi_state(target, state)
+    assert torch.equal(target.U, source.U) and torch.equal(target.cov_action, source.cov_action)
+    assert target.device == "cuda:0"
+
+
+def test_checkpoint_round_trip(tmp_path) -> None:
+    from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+
+    overrides = ["mppi.num_samples=12", "mppi.horizon=12", "mppi.device=cpu", "isaacgym.use_gpu_pipeline=false"]
+    cfg = load_example(EXAMPLE, overrides)
+    objective = example_objective(cfg, os.path.dirname(EXAMPLE))
+    planner = MPPIisaacPlanner(cfg, objective)
+    dof_state, root_state = planner.sim._dof_state[0:1].clone(), planner.sim._root_state[0:1].clone()
+    for _ in range(3):
+        planner.compute_action_from_tensors(dof_state, root_state)
+    path = str(tmp_path / "planner.ckpt")
+    planner.save_checkpoint(path)
+    nominal = planner.nominal_sequence().clone()
+
+    planner.compute_action_from_tensors(dof_state, root_state)
+    assert not torch.equal(planner.nominal_sequence(), nominal)
+    planner.load_checkpoint(path, strict=True)
+    assert torch.equal(planner.nominal_sequence(), nominal)
+    planner.sim.stop_sim()
@@ -0,0 +1,68 @@
+from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper
+from mppiisaac.planner.cost_terms import CostConfig, CostTermConfig, CostTermObjective
+from hydra import initialize, compose
+from types import SimpleNamespace
+import torch
+
+
+def test_cost_terms_match_getters() -> None:
+    with initialize(version_base=None, config_path="."):
+        cfg_isaacgym = compose(config_name="test_isaacgym_config")
+
+        num_envs = 10
+        sim = IsaacGymWrapper(
+            cfg_isaacgym,
+            actors=["boxer", "wall", "goal"],
+            obs_actors=[],
+            num_envs=num_envs,
+        )
+
+        cost_cfg = CostConfig(
+            terms={
+                "robot_to_goal": CostTermConfig(
+                    type="distance", weight=2.0, actor="boxer", link="ee_link", target="goal"
+                ),
+                "collision": CostTermConfig(
+                    type="contact_force", weight=10.0, actor="wall", link="box"
+                ),
+            }
+        )
+        objective = CostTermObjective(cost_cfg, device=sim.device)
+        objective.compile(sim)
+
+        sim.apply_robot_cmd(torch.tensor([0.2, 0.0]).repeat(num_envs, 1))
+        for _ in range(10):
+            sim.step()
+
+        r_pos = sim.get_actor_link_by_name("boxer", "ee_link")
+        goal_pos = sim.get_actor_position_by_name("goal")
+        wall_forces = sim.get_actor_contact_forces_by_name("wall", "box")
+        expected = 2.0 * torch.linalg.norm(
+            r_pos[:, 0:3] - goal_pos, axis=1
+        ) + 10.0 * torch.sum(torch.abs(wall_forces[:, 0:3]), axis=1)
+
+        assert torch.allclose(objective.compute_cost(sim), expected)
+
+        objective.weights = {"collision": 0.0}
+        assert objective.weights["collision"] == 0.0
+        assert objective.compute_cost_terms(sim).size() == torch.Size([2, num_envs])
+
+
+def test_eager_cost_terms_reuse_buffer() -> None:
+    cost_cfg = CostConfig(
+        terms={
+            "pose": CostTermConfig(type="dof_pose", weight=2.0, dofs=[0, 2], values=[0.5, -0.5]),
+            "velocity": CostTermConfig(type="dof_velocity", weight=0.5, dofs=[0, 3]),
+        }
+    )
+    objective = CostTermObjective(cost_cfg, device="cpu")
+    sim = SimpleNamespace(observations={"dof": torch.rand((6, 3, 2))})
+
+    terms = objective.compute_cost_terms(sim)
+    buffer = terms.data_ptr()
+    assert torch.allclose(terms, objective.cost_terms_from_observations(sim.observations))
+
+    sim.observations["dof"].copy_(torch.rand((6, 3, 2)))
+    assert objective.compute_cost_terms(sim).data_ptr() == buffer
+    expected = objective.cost_from_observations(sim.observations, objective.weight_tensor)
+    assert torch.allclose(objective.compute_cost(sim), expected)
@@ -0,0 +1,28 @@
+from mppiisaac.utils.episode_recorder import EpisodeLog, EpisodeRecorder
+import numpy as np
+import pytest
+import torch
+
+
+def test_episode_recorder_grows_and_slices(tmp_path) -> None:
+    path = str(tmp_path / "episode")
+    actions = torch.rand((11, 7))
+    recorder = EpisodeRecorder(path, capacity=4, flush_every=5, meta={"seed": 3})
+    for i, action in enumerate(actions):
+        recorder.record({"action": action, "root_state": torch.full((2, 13), float(i)), "planning_time": 0.01 * i})
+
+    # Note: the index is flushed every 5 steps, a reader sees the steps up to then
+    log = EpisodeLog(path)
+    assert len(log) == 10 and log.meta == {"seed": 3}
+    assert np.array_equal(log["action"], actions[:10].numpy())
+
+    with pytest.raises(ValueError):
+        recorder.record({"action": torch.rand(6), "root_state": torch.zeros((2, 13)), "planning_time": 0.0})
+    recorder.close()
+
+    log = EpisodeLog(path)
+    assert len(log) == 11 and recorder.capacity == 11
+    assert np.array_equal(log["root_state"][4:6, 0, 0], [4.0, 5.0])
+    assert log.step(10)["planning_time"] == pytest.approx(0.1)
+    # Note: closed recordings are plain npy files
+    assert np.load(f"{path}/action.npy").shape == (11, 7)
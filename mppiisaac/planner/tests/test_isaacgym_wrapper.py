@@ -1,4 +1,4 @@
-from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper, ActorWrapper
+from mppiisaac.planner.isaacgym_wrapper import IsaacGymWrapper, ActorWrapper, Observation
 from mppiisaac.utils.config_store import ExampleConfig, MPPIConfig
 from hydra import initialize, compose
 import torch
@@ -33,3 +33,34 @@ def test_body_force() -> None:
             sim.step()
 
         assert all(sim.net_cf[:, 0] == sim.net_cf[:, -1])
+
+
+def test_observations() -> None:
+    with initialize(version_base=None, config_path="."):
+        cfg_isaacgym = compose(config_name="test_isaacgym_config")
+
+        num_envs = 10
+        sim = IsaacGymWrapper(
+            cfg_isaacgym,
+            actors=["boxer", "wall", "goal"],
+            obs_actors=[],
+            num_envs=num_envs,
+        )
+        obs = sim.register_observations(
+            [
+                Observation(name="ee", type="link", actor="boxer", link="ee_link"),
+                Observation(name="goal", type="actor", actor="goal"),
+                Observation(name="wall_forces", type="contact", actor="wall", link="box"),
+                Observation(name="wheels", type="dof", dofs=[0, 2]),
+            ]
+        )
+
+        sim.apply_robot_cmd(torch.tensor([0.2, 0.0]).repeat(num_envs, 1))
+        sim.step()
+
+        assert torch.equal(obs["ee"], sim.get_actor_link_by_name("boxer", "ee_link"))
+        assert torch.equal(obs["goal"][:, 0:3], sim.get_actor_position_by_name("goal"))
+        assert torch.equal(
+            obs["wall_forces"], sim.get_actor_contact_forces_by_name("wall", "box")
+        )
+        assert obs["wheels"].size() == torch.Size([num_envs, 2, 2])
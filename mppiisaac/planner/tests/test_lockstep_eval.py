@@ -0,0 +1,25 @@
+from mppiisaac.utils.lockstep_eval import LockstepEvaluator
+import torch
+
+
+class GainPlanner(object):
+    gain = 0.0
+
+    def compute_action_from_tensors(self, dof_state, root_state):
+        return torch.tensor([self.gain])
+
+
+def test_lockstep_matches_sequential(point_sim) -> None:
+    sim = point_sim(2)
+    planners = [GainPlanner(), GainPlanner()]
+
+    def configure(planner, gain):
+        planner.gain = gain
+
+    evaluator = LockstepEvaluator(sim, planners, lambda s: s._dof_state[:, 0].abs(), 3, configure)
+    costs = evaluator.evaluate([1.0, -2.0, 0.5])
+
+    # Note: positions 1, 2, 3 times the gain, summed over the episode
+    assert costs == [6.0, 12.0, 3.0]
+    # Note: the third config starts in the first env that finished, the other is left alone
+    assert sim.resets == [[0, 1], [0]]
@@ -0,0 +1,91 @@
+from mppiisaac.planner.planner_host import PlannerHost
+from types import SimpleNamespace
+import gevent
+
+
+class RecordingPlanner(object):
+    def __init__(self, name, order):
+        self.name = name
+        self.order = order
+
+    def get_rollouts(self):
+        self.order.append(self.name)
+        gevent.sleep(0.001)
+        return self.name
+
+
+def test_round_robin_sessions() -> None:
+    order = []
+    host = PlannerHost()
+    host.add_session("a", RecordingPlanner("a", order))
+    host.add_session("b", RecordingPlanner("b", order))
+    host.start()
+
+    calls = [gevent.spawn(host.get_rollouts, "a") for _ in range(4)]
+    calls += [gevent.spawn(host.get_rollouts, "b") for _ in range(2)]
+    gevent.joinall(calls)
+
+    assert [c.value for c in calls] == ["a"] * 4 + ["b"] * 2
+    # Note: session b is served before a has worked through its backlog
+    assert order.index("b") < 2 and order[:4].count("b") == 2
+
+
+def test_close_session_during_its_call() -> None:
+    order = []
+    sim = SimpleNamespace(stop_sim=lambda: None)
+    host = PlannerHost()
+    for name in ["a", "b"]:
+        planner = RecordingPlanner(name, order)
+        planner.sim = sim
+        host.add_session(name, planner)
+    host.start()
+
+    call = gevent.spawn(host.get_rollouts, "a")
+    while not order:
+        gevent.sleep(0)
+    host.close_session("a")
+    call.join()
+    assert call.value == "a" and list(host._sim_state) == ["b"]
+
+
+def test_sessions_share_the_simulator(monkeypatch) -> None:
+    from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+    from mppiisaac.utils.scenario_runner import example_objective, load_example
+    from mppiisaac.utils.transport import bytes_to_torch, torch_to_bytes
+    import mppiisaac
+    import os
+    import pytest
+    import torch
+
+    example = os.path.join(os.path.dirname(mppiisaac.__file__), "../examples/heijn_reach/config_heijn_reach.yaml")
+    overrides = ["mppi.num_samples=8", "mppi.device=cpu", "isaacgym.use_gpu_pipeline=false"]
+
+    def planner(extra, sim=None):
+        cfg = load_example(example, overrides + extra)
+        return MPPIisaacPlanner(cfg, example_objective(cfg, os.path.dirname(example)), sim=sim)
+
+    host = PlannerHost()
+    host.add_session("a", planner([]))
+    host.add_session("b", planner(["mppi.lambda_=0.5"], sim=host.sim))
+    assert host.sessions["a"].sim is host.sessions["b"].sim
+    with pytest.raises(ValueError):
+        planner(["mppi.num_samples=4"], sim=host.sim)
+    host.start()
+
+    sim = host.sim
+    state = [torch_to_bytes(sim._dof_state[0:1].clone()), torch_to_bytes(sim._root_state[0:1].clone())]
+    host.compute_action_tensor("a", *state)
+    rollouts_a = bytes_to_torch(host.get_rollouts("a"))
+    host.compute_action_tensor("b", *state)
+    # Note: the rollouts of a session survive the commands of the other
+    assert torch.equal(bytes_to_torch(host.get_rollouts("a")), rollouts_a)
+    buffers = [host._sim_state[s]["visualize_link_buffer"] for s in ["a", "b"]]
+    assert buffers[0] is not buffers[1] and len(buffers[1]) == host.sessions["b"].cfg.mppi.horizon
+
+    stopped = []
+    stop_sim = sim.stop_sim
+    monkeypatch.setattr(sim, "stop_sim", lambda: (stopped.append(True), stop_sim()))
+    host.close_session("a")
+    assert not stopped and host.sim is sim
+    host.close_session("b")
+    assert stopped and host.sim is None
@@ -0,0 +1,52 @@
+from mppiisaac.utils.planner_pool import PlannerPool
+import pytest
+import sys
+import zerorpc
+
+# Note: a local process with the rpc interface of a planner stands in for a remote planner server
+WORKER = """
+import sys, time, zerorpc
+
+class Planner(object):
+    def __init__(self):
+        self.steps = 0
+
+    def get_rollouts(self):
+        time.sleep(0.2)
+        return sys.argv[-1]
+
+    def step(self):
+        self.steps += 1
+        return self.steps
+
+server = zerorpc.Server(Planner())
+server.bind(sys.argv[-1].split("=", 1)[1].replace("127.0.0.1", "0.0.0.0"))
+server.run()
+"""
+
+
+def test_dispatch_and_pinning() -> None:
+    pool = PlannerPool.launch([sys.executable, "-c", WORKER], 2, base_port=4262, startup_timeout=30)
+    try:
+        # Note: two concurrent calls go to different workers
+        served = pool.map(lambda p, _: p.call("get_rollouts"), range(2))
+        assert sorted(served) == ["planner_address=tcp://127.0.0.1:4262", "planner_address=tcp://127.0.0.1:4263"]
+
+        a, b = pool.pinned("a"), pool.pinned("b")
+        assert [a.step(), b.step(), a.step(), a.step()] == [1, 1, 2, 3]
+
+        stats = pool.utilization()
+        assert sorted(w["calls"] for w in stats) == [2, 4]
+        assert all(w["healthy"] and w["utilization"] > 0 for w in stats)
+
+        # Note: a client fails when its own worker fails, it only moves to another worker when unpinned
+        i = pool.pin("b")
+        pool._processes[i].kill()
+        pool._processes[i].wait()
+        assert pool.check_health(timeout=0.5) == [i != 0, i != 1]
+        with pytest.raises(RuntimeError):
+            pool.call("step", key="b")
+        pool.unpin("b")
+        assert pool.call("step", key="b") == 4
+    finally:
+        pool.close()
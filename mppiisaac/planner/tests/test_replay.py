@@ -0,0 +1,63 @@
+from mppiisaac.utils.episode_recorder import EpisodeRecorder, planner_step
+from mppiisaac.utils.replay import replay
+from types import SimpleNamespace
+import torch
+
+
+class CountingPlanner(object):
+    """Commands the first dof position plus its command count, which advances like the sampling noise of mppi."""
+
+    sim = SimpleNamespace(device="cpu")
+
+    def __init__(self, offset_from=None):
+        self.calls = 0
+        self.offset_from = offset_from
+
+    def compute_action_from_tensors(self, dof_state, root_state):
+        self.calls += 1
+        action = dof_state[0, :2] + self.calls
+        if self.offset_from is not None and self.calls > self.offset_from:
+            action = action + 0.1
+        self.nominal = torch.stack([action, action * 2.0])
+        return action
+
+    def nominal_sequence(self):
+        return self.nominal
+
+    def rollout_cost_stats(self):
+        return torch.tensor([0.0, float(self.calls), 2.0 * self.calls])
+
+
+def _record(path, n_steps):
+    planner = CountingPlanner()
+    with EpisodeRecorder(path, meta={"seed": 0}) as recorder:
+        for i in range(n_steps):
+            dof_state, root_state = torch.full((1, 4), float(i)), torch.rand((1, 2, 13))
+            action = planner.compute_action_from_tensors(dof_state, root_state)
+            recorder.record(planner_step(planner, dof_state, root_state, action, 0.01))
+
+
+def test_replay_matches_recording(tmp_path) -> None:
+    path = str(tmp_path / "episode")
+    _record(path, 6)
+
+    report = replay(path, planner=CountingPlanner())
+    assert report["stop"] == 6 and len(report["latencies"]) == 6
+    for name in ("action", "nominal", "cost"):
+        assert report[name]["diverged_steps"] == 0 and report[name]["first_divergence"] is None
+        assert report[name]["max_abs_diff"] == 0.0
+
+    # Note: the steps before start are replayed untimed, so the commands keep counting
+    report = replay(path, start=2, stop=5, planner=CountingPlanner())
+    assert len(report["latencies"]) == 3 and report["action"]["diverged_steps"] == 0
+
+
+def test_replay_detects_divergence(tmp_path) -> None:
+    path = str(tmp_path / "episode")
+    _record(path, 6)
+
+    report = replay(path, planner=CountingPlanner(offset_from=3))
+    assert report["action"]["diverged_steps"] == 3 and report["action"]["first_divergence"] == 3
+    assert report["action"]["max_abs_diff"] > 0.09
+    assert report["nominal"]["first_divergence"] == 3
+    assert report["cost"]["diverged_steps"] == 0
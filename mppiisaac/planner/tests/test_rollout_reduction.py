@@ -0,0 +1,50 @@
+from mppiisaac.planner.rollout_reduction import (
+    RolloutReduction,
+    decode_rollouts,
+    encode_rollouts,
+    reduce_rollouts,
+)
+import torch
+
+
+def test_reduce_rollouts() -> None:
+    rollouts = torch.rand((10, 8, 3))
+    costs = torch.arange(8, 0, -1, dtype=torch.float32)
+
+    top = reduce_rollouts(rollouts, costs, RolloutReduction(top_k=2, downsample=3))
+    assert torch.equal(top, rollouts[::3, [7, 6]])
+
+    assert reduce_rollouts(rollouts, costs, RolloutReduction(num_samples=3)).size() == (10, 3, 3)
+
+    # Note: with a tiny lambda the nominal trajectory is the cheapest sample
+    nominal = reduce_rollouts(rollouts, costs, RolloutReduction(nominal=True), lambda_=1e-3)
+    assert torch.allclose(nominal[:, 0], rollouts[:, 7])
+
+
+def test_rollout_encodings() -> None:
+    rollouts = torch.rand((10, 8, 3)) * 4 - 2
+    for encoding, tolerance in [("float32", 0), ("float16", 1e-2), ("int16", 1e-4)]:
+        decoded = decode_rollouts(encode_rollouts(rollouts, encoding))["rollouts"]
+        assert decoded.dtype == torch.float32
+        assert torch.allclose(decoded, rollouts, atol=tolerance)
+
+
+def test_planner_step_reduces_rollouts() -> None:
+    from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+    from mppiisaac.utils.scenario_runner import example_objective, load_example
+    import mppiisaac
+    import os
+
+    example = os.path.join(os.path.dirname(mppiisaac.__file__), "../examples/heijn_reach/config_heijn_reach.yaml")
+    cfg = load_example(example, ["mppi.num_samples=16", "mppi.device=cpu", "isaacgym.use_gpu_pipeline=false"])
+    planner = MPPIisaacPlanner(cfg, example_objective(cfg, os.path.dirname(example)))
+    dof_state, root_state = planner.sim._dof_state[0:1].clone(), planner.sim._root_state[0:1].clone()
+
+    result = planner.step_from_message(
+        {"dof_state": dof_state, "root_state": root_state}, want_rollouts=True, top_k=3, downsample=2
+    )
+    rollouts = decode_rollouts(result)["rollouts"]
+    cheapest = torch.topk(planner._rollout_costs, 3, largest=False).indices
+    assert torch.equal(rollouts, planner.get_rollouts_tensor()[::2, cheapest])
+    assert torch.equal(planner.select_rollouts(top_k=3, downsample=2), rollouts)
+    planner.sim.stop_sim()
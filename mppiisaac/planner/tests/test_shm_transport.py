@@ -0,0 +1,95 @@
+from mppiisaac.utils.shm_transport import RpcPlannerClient, ShmPlannerClient, ShmPlannerServer
+from mppiisaac.utils.transport import bytes_to_torch, torch_to_bytes
+from omegaconf import OmegaConf
+import gevent
+import socket
+import threading
+import torch
+import zerorpc
+
+
+class EchoPlanner(object):
+    cfg = OmegaConf.create({"mppi": {"device": "cpu"}})
+
+    def compute_action_from_tensors(self, dof_state, root_state):
+        return dof_state[:, ::2] + root_state.sum()
+
+    def get_rollouts_tensor(self):
+        return torch.ones((2, 5, 3))
+
+    def select_rollouts(self, top_k=0, downsample=1):
+        return self.get_rollouts_tensor()
+
+    def step_from_message(self, message, want_rollouts, top_k, downsample):
+        # Note: the reduction itself is tested on a real planner in test_rollout_reduction, here only the flags
+        self.flags = (want_rollouts, top_k, downsample)
+        result = {"action": self.compute_action_from_tensors(message["dof_state"], message["root_state"])}
+        if want_rollouts:
+            result["rollouts"] = self.get_rollouts_tensor()
+        return result
+
+    def compute_action_tensor(self, dof_state, root_state):
+        return torch_to_bytes(self.compute_action_from_tensors(bytes_to_torch(dof_state), bytes_to_torch(root_state)))
+
+    def get_rollouts(self):
+        return torch_to_bytes(self.get_rollouts_tensor())
+
+
+def test_shm_roundtrip() -> None:
+    planner = EchoPlanner()
+    server = ShmPlannerServer(planner, "mppiisaac_test", capacity=1 << 16)
+    done = threading.Event()
+
+    def serve():
+        while not done.is_set():
+            server.poll()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        client = ShmPlannerClient("mppiisaac_test")
+        for _ in range(3):
+            dof_state = torch.randn((1, 14))
+            root_state = torch.randn((1, 2, 13))
+            action = client.compute_action_from_tensors(dof_state, root_state)
+            assert torch.allclose(action, dof_state[:, ::2] + root_state.sum())
+        assert torch.equal(client.get_rollouts_tensor(), torch.ones((2, 5, 3)))
+
+        result = client.step_from_tensors(dof_state, root_state, want_rollouts=True, top_k=2, downsample=2)
+        assert torch.allclose(result["action"], dof_state[:, ::2] + root_state.sum())
+        assert torch.equal(result["rollouts"], torch.ones((2, 5, 3)))
+        assert planner.flags == (True, 2, 2)
+
+        stats = client.latency.summary()
+        assert stats["compute_action_tensor/total"]["count"] == 3
+        assert stats["step/planning"]["p99"] >= stats["step/planning"]["p50"]
+        client.close()
+    finally:
+        done.set()
+        thread.join()
+        server.close()
+
+
+def test_rpc_client_records_latency() -> None:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = zerorpc.Server(EchoPlanner())
+    server.bind(f"tcp://127.0.0.1:{port}")
+    serving = gevent.spawn(server.run)
+    try:
+        client = RpcPlannerClient(f"tcp://127.0.0.1:{port}")
+        dof_state, root_state = torch.randn((1, 14)), torch.randn((1, 2, 13))
+        action = client.compute_action_from_tensors(dof_state, root_state)
+        assert torch.allclose(action, dof_state[:, ::2] + root_state.sum())
+        assert torch.equal(client.get_rollouts_tensor(), torch.ones((2, 5, 3)))
+
+        stats = client.latency.summary()
+        for method in ["compute_action_tensor", "get_rollouts"]:
+            assert stats[f"{method}/total"]["count"] == 1
+            assert stats[f"{method}/reply_bytes"]["mean"] > 0
+        assert stats["compute_action_tensor/request_bytes"]["mean"] > 0
+        client.close()
+    finally:
+        server.stop()
+        serving.kill()
@@ -0,0 +1,118 @@
+from mppiisaac.planner.state_sync import StateSync, StateSyncTarget, SyncSchema
+from mppiisaac.utils.transport import bytes_to_torch, torch_to_bytes
+import pytest
+import torch
+
+
+class TensorGym(object):
+    """The gym calls of the state sync, actors with dofs and the indexed writes they get."""
+
+    def __init__(self, dof_counts):
+        self.dof_counts = dof_counts
+        self.root_writes = []
+        self.dof_writes = []
+
+    def get_actor_dof_count(self, env, actor):
+        return self.dof_counts[actor]
+
+    def set_actor_root_state_tensor_indexed(self, sim, state, ids, count):
+        self.root_writes.append(ids.tolist())
+
+    def set_dof_state_tensor_indexed(self, sim, state, ids, count):
+        self.dof_writes.append(ids.tolist())
+
+
+class TensorSim(object):
+    """Root and dof state of num_envs envs with a robot of 2 dofs, a box and a fixed wall."""
+
+    device = "cpu"
+
+    def __init__(self, num_envs):
+        self.num_envs = num_envs
+        self.envs = [None] * num_envs
+        self._sim = None
+        self._gym = TensorGym([2, 0, 0])
+        self._root_state = torch.zeros((num_envs, 3, 13))
+        self._dof_state = torch.zeros((num_envs, 4))
+
+
+def test_state_sync_round_trip() -> None:
+    world, planner_sim = TensorSim(1), TensorSim(3)
+    # Note: the robot and the box are dynamic, the wall is not synchronized
+    schema = SyncSchema(actors=[0, 1], dofs=[0, 1], num_actors=3, num_dofs=2)
+    schema = SyncSchema.from_tensors(bytes_to_torch(torch_to_bytes(schema.to_tensors())))
+    source = StateSync(schema, "cpu", keyframe_interval=3)
+    target = StateSyncTarget(schema, planner_sim)
+    assert target._actor_ids.tolist() == [0, 1, 3, 4, 6, 7]
+    assert target._dof_actor_ids.tolist() == [0, 3, 6]
+
+    world._root_state[0] = torch.randn((3, 13))
+    world._dof_state[0] = torch.randn(4)
+    planner_sim._root_state[:, 2] = 7.0
+
+    def step():
+        message = bytes_to_torch(torch_to_bytes(source.message(world)))
+        target.apply(message, planner_sim)
+        source.ack()
+        assert torch.equal(planner_sim._root_state[:, :2], world._root_state[:, :2].expand(3, -1, -1))
+        assert torch.equal(planner_sim._dof_state, world._dof_state.expand(3, -1))
+        assert torch.all(planner_sim._root_state[:, 2] == 7.0)
+        return message
+
+    message = step()
+    assert bool(message["keyframe"][0]) and message["root_idx"].tolist() == [0, 1]
+
+    # Note: only the moved box is sent, the robot is at rest
+    world._root_state[0, 1, :3] += 0.5
+    message = step()
+    assert not bool(message["keyframe"][0])
+    assert message["root_idx"].tolist() == [1] and message["dof_idx"].numel() == 0
+
+    world._dof_state[0, 2:] += 0.1
+    message = step()
+    assert message["root_idx"].numel() == 0 and message["dof_idx"].tolist() == [1]
+
+    message = step()
+    assert bool(message["keyframe"][0])
+    assert planner_sim._gym.root_writes[-1] == [0, 1, 3, 4, 6, 7]
+
+
+def test_state_sync_resends_dropped_message() -> None:
+    world, planner_sim = TensorSim(1), TensorSim(1)
+    schema = SyncSchema(actors=[0, 1], dofs=[0, 1], num_actors=3, num_dofs=2)
+    source = StateSync(schema, "cpu")
+    target = StateSyncTarget(schema, planner_sim)
+
+    # Note: a lost keyframe is sent again, nothing was acknowledged yet
+    source.message(world)
+    assert bool(source.message(world)["keyframe"][0])
+    target.apply(source.message(world), planner_sim)
+    source.ack()
+
+    # Note: the box moves in a step whose message is lost, the robot in the next one
+    world._root_state[0, 1, :3] += 0.5
+    source.message(world)
+    world._root_state[0, 0, :3] += 0.5
+    message = source.message(world)
+    assert not bool(message["keyframe"][0]) and message["root_idx"].tolist() == [0, 1]
+    target.apply(message, planner_sim)
+    source.ack()
+    assert torch.equal(planner_sim._root_state[:, :2], world._root_state[:, :2])
+
+    with pytest.raises(RuntimeError):
+        source.ack()
+
+
+def test_state_sync_needs_keyframe_and_matching_scene() -> None:
+    schema = SyncSchema(actors=[0], dofs=[0, 1], num_actors=3, num_dofs=2)
+    world, planner_sim = TensorSim(1), TensorSim(2)
+    source = StateSync(schema, "cpu")
+    target = StateSyncTarget(schema, planner_sim)
+
+    source.message(world)
+    source.ack()
+    with pytest.raises(RuntimeError):
+        target.apply(source.message(world), planner_sim)
+
+    with pytest.raises(ValueError):
+        StateSyncTarget(SyncSchema(actors=[0], dofs=[0], num_actors=4, num_dofs=2), planner_sim)
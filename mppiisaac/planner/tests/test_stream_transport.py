@@ -0,0 +1,67 @@
+from mppiisaac.utils.stream_transport import StreamPlannerClient, StreamPlannerServer
+from types import SimpleNamespace
+import socket
+import time
+import torch
+
+
+class NominalPlanner(object):
+    """Returns the first dof position as action and keeps a nominal sequence of 4 steps."""
+
+    cfg = SimpleNamespace(isaacgym=SimpleNamespace(dt=0.1))
+
+    def __init__(self):
+        self.nominal = torch.arange(8, dtype=torch.float32).reshape(4, 2)
+
+    def compute_action_from_tensors(self, dof_state, root_state):
+        return dof_state[0, :2]
+
+    def nominal_sequence(self):
+        return self.nominal
+
+
+def _free_port_pair() -> int:
+    while True:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        with socket.socket() as s:
+            try:
+                s.bind(("127.0.0.1", port + 1))
+                return port
+            except OSError:
+                continue
+
+
+def test_stream_round_trip() -> None:
+    address = f"tcp://127.0.0.1:{_free_port_pair()}"
+    planner = NominalPlanner()
+    server = StreamPlannerServer(planner, address)
+    client = StreamPlannerClient(address)
+    try:
+        assert client.action() is None
+        stamp = time.time()
+        dof_state = torch.tensor([[-1.0, -2.0, 0.0, 0.0]])
+        # Note: PUB/SUB drops messages until the subscription is up, so publish until a plan arrives
+        for _ in range(200):
+            client.publish_state(dof_state, torch.zeros((1, 1, 13)), stamp)
+            if server.step(timeout=10) and client.receive():
+                break
+        assert client.sequence is not None
+
+        actions = client.sequence["actions"]
+        assert torch.equal(actions[0], torch.tensor([-1.0, -2.0]))
+        assert torch.equal(actions[1:], planner.nominal[1:])
+        # Note: the published sequence is a copy, the nominal sequence keeps its first step
+        assert torch.equal(planner.nominal[0], torch.tensor([0.0, 1.0]))
+
+        assert client.plan_delay() >= 0.0
+        stats = client.latency.summary()
+        assert stats["stream/total"]["count"] == 1
+        assert stats["stream/planning"]["mean"] >= 0.0
+        assert stats["stream/request_bytes"]["mean"] > 0 and stats["stream/reply_bytes"]["mean"] > 0
+        assert torch.equal(client.action(now=stamp + 0.25), planner.nominal[2])
+        assert torch.equal(client.action(now=stamp + 10.0), planner.nominal[3])
+    finally:
+        client.close()
+        server.close()
@@ -0,0 +1,29 @@
+from mppiisaac.utils.transport import bytes_to_torch, decode_tensors, encode_tensors, torch_to_bytes
+import pytest
+import torch
+
+
+def test_roundtrip() -> None:
+    tensors = {
+        "dof_state": torch.randn((1, 18)),
+        "root_state": torch.randn((1, 3, 13)).transpose(0, 1),
+        "ids": torch.arange(4, dtype=torch.int32),
+        "flag": torch.tensor(True),
+        "empty": torch.empty((0, 3)),
+    }
+    decoded = decode_tensors(encode_tensors(tensors))
+
+    assert list(decoded.keys()) == list(tensors.keys())
+    for name, t in tensors.items():
+        assert decoded[name].dtype == t.dtype
+        assert torch.equal(decoded[name], t)
+
+    action = torch.randn((1, 7))
+    assert torch.equal(bytes_to_torch(torch_to_bytes(action)), action)
+
+
+def test_rejects_invalid_messages() -> None:
+    with pytest.raises(ValueError):
+        decode_tensors(b"\x80\x02not a tensor message")
+    with pytest.raises(ValueError):
+        decode_tensors(torch_to_bytes(torch.randn(100))[:-16])
@@ -0,0 +1,102 @@
+from mppiisaac.utils.tuning import ResultCache, TuningConfig, _open_study, _run_batches
+import gevent
+import optuna
+import torch
+
+
+class DelayPlanner(object):
+    """Commands its gain as velocity, waits delay seconds per command."""
+
+    gain = 0.0
+    delay = 0.0
+    calls = 0
+
+    def seed(self, seed):
+        pass
+
+    def compute_action_from_tensors(self, dof_state, root_state):
+        self.calls += 1
+        if self.delay > 0:
+            gevent.sleep(self.delay)
+        return torch.tensor([self.gain])
+
+
+class PointWorld(object):
+    n_steps = 10
+
+    def __init__(self, sim):
+        self.sim = sim
+
+    def suggest(self, trial):
+        return trial.suggest_float("gain", 0.0, 1.0), trial.suggest_float("delay", 0.0, 0.05)
+
+    def configure(self, planner, config):
+        planner.gain, planner.delay = config
+
+    def episode_cost(self, sim):
+        return sim._dof_state[:, 0].abs()
+
+
+def _study(tuning, params):
+    study = _open_study(tuning, "test")
+    for p in params:
+        study.enqueue_trial(p)
+    return study
+
+
+def test_result_cache(tmp_path) -> None:
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    key = ResultCache.key("study", {"a": 1.0, "b": 2.0}, 3)
+    assert key == ResultCache.key("study", {"b": 2.0, "a": 1.0}, 3)
+    assert key != ResultCache.key("study", {"a": 1.0, "b": 2.0}, 4)
+    assert cache.get(key) is None
+    cache.put(key, 1.5)
+    assert ResultCache(str(tmp_path / "cache.db")).get(key) == 1.5
+
+
+def test_prune_and_cache(tmp_path, point_sim) -> None:
+    tuning = TuningConfig(
+        trials=6, report_every=2, storage=f"sqlite:///{tmp_path}/a.db", cache=str(tmp_path / "cache.db")
+    )
+    params = [{"gain": 0.0, "delay": 0.0}] * 5 + [{"gain": 1.0, "delay": 0.0}]
+    study = _study(tuning, params)
+    _run_batches(study, PointWorld(point_sim(1)), [DelayPlanner()], tuning, "test")
+
+    states = [t.state for t in study.trials]
+    assert states == [optuna.trial.TrialState.COMPLETE] * 5 + [optuna.trial.TrialState.PRUNED]
+    assert study.trials[-1].last_step == 2
+
+    # Note: a repeated run of the same trials takes the finished ones from the cache
+    tuning.storage = f"sqlite:///{tmp_path}/b.db"
+    study = _study(tuning, params)
+    planner = DelayPlanner()
+    _run_batches(study, PointWorld(point_sim(1)), [planner], tuning, "test")
+    assert [t.user_attrs.get("cached", False) for t in study.trials] == [True] * 5 + [False]
+    # Note: only the uncached trial runs, cached trials report no intermediate costs to prune against
+    assert planner.calls == PointWorld.n_steps
+
+
+def test_timeout_keeps_finished_trials(tmp_path, point_sim) -> None:
+    tuning = TuningConfig(trials=8, report_every=2, trial_timeout=0.2, storage=f"sqlite:///{tmp_path}/a.db", cache="")
+    # Note: the last batch holds a trial that is pruned at its first report and one that is too slow
+    params = [{"gain": 0.0, "delay": 0.0}] * 6 + [{"gain": 1.0, "delay": 0.0}, {"gain": 0.0, "delay": 0.05}]
+    study = _study(tuning, params)
+    _run_batches(study, PointWorld(point_sim(2)), [DelayPlanner(), DelayPlanner()], tuning, "test")
+
+    states = [t.state for t in study.trials]
+    assert states[:6] == [optuna.trial.TrialState.COMPLETE] * 6
+    assert states[6:] == [optuna.trial.TrialState.PRUNED, optuna.trial.TrialState.FAIL]
+    assert study.trials[-1].user_attrs["timeout"] == 0.2 and "timeout" not in study.trials[-2].user_attrs
+
+
+def test_seeded_sampler_repeats_trials(tmp_path, point_sim) -> None:
+    tuning = TuningConfig(trials=3, storage=f"sqlite:///{tmp_path}/a.db", cache=str(tmp_path / "cache.db"))
+    first = _open_study(tuning, "test")
+    _run_batches(first, PointWorld(point_sim(1)), [DelayPlanner()], tuning, "test")
+
+    tuning.storage = f"sqlite:///{tmp_path}/b.db"
+    second = _open_study(tuning, "test")
+    planner = DelayPlanner()
+    _run_batches(second, PointWorld(point_sim(1)), [planner], tuning, "test")
+    assert [t.params for t in second.trials] == [t.params for t in first.trials]
+    assert all(t.user_attrs["cached"] for t in second.trials) and planner.calls == 0
@@ -0,0 +1,66 @@
+from mppiisaac.planner.weight_sets import evaluate_weight_sets, weight_sets_to_tensor
+import torch
+
+
+def test_evaluate_weight_sets() -> None:
+    num_terms, num_samples, horizon, nu = 3, 50, 12, 2
+    term_costs = torch.rand((num_terms, num_samples))
+    actions = torch.randn((num_samples, horizon, nu))
+    names = ["a", "b", "c"]
+    weight_sets = weight_sets_to_tensor(
+        [{"a": 1.0, "b": 0.0, "c": 0.0}, {"a": 0.0, "b": 2.0, "c": 1.0}], names, "cpu"
+    )
+
+    result = evaluate_weight_sets(term_costs, actions, weight_sets, lambda_=0.05)
+
+    assert result["costs"].size() == torch.Size([2, num_samples])
+    assert torch.allclose(result["costs"][0], term_costs[0])
+    assert torch.allclose(result["costs"][1], 2.0 * term_costs[1] + term_costs[2])
+    assert result["sequences"].size() == torch.Size([2, horizon, nu])
+    assert torch.equal(result["actions"], result["sequences"][:, 0])
+
+    # A tiny temperature selects the best sample
+    result = evaluate_weight_sets(term_costs, actions, weight_sets, lambda_=1e-6)
+    best = torch.argmin(term_costs[0])
+    assert torch.allclose(result["sequences"][0], actions[best], atol=1e-5)
+
+
+class TermObjective(object):
+    """Squared positions and velocities of the dofs as two cost terms with dict weights."""
+
+    names = ["position", "velocity"]
+
+    def __init__(self):
+        self.weights = {"position": 1.0, "velocity": 0.5}
+
+    def reset(self):
+        pass
+
+    def compute_cost_terms(self, sim):
+        dof = sim._dof_state.view(sim.num_envs, -1, 2)
+        return torch.stack([torch.sum(dof[:, :, 0] ** 2, dim=1), torch.sum(dof[:, :, 1] ** 2, dim=1)])
+
+    def compute_cost(self, sim):
+        return torch.matmul(weight_sets_to_tensor([self.weights], self.names, "cpu")[0], self.compute_cost_terms(sim))
+
+
+def test_recorded_weights_follow_update_weights() -> None:
+    from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+    from mppiisaac.utils.scenario_runner import load_example
+    import mppiisaac
+    import os
+
+    example = os.path.join(os.path.dirname(mppiisaac.__file__), "../examples/heijn_reach/config_heijn_reach.yaml")
+    overrides = ["mppi.num_samples=8", "mppi.horizon=4", "mppi.device=cpu", "isaacgym.use_gpu_pipeline=false"]
+    planner = MPPIisaacPlanner(load_example(example, overrides), TermObjective())
+    try:
+        planner.set_rollout_recording(True)
+        planner.command()
+        weights = planner._weight_tensor()
+        assert planner._weight_tensor() is weights and weights.tolist() == [1.0, 0.5]
+
+        planner.update_weights({"position": 2.0, "velocity": 0.0})
+        planner.command()
+        assert planner._weight_tensor().tolist() == [2.0, 0.0]
+    finally:
+        planner.sim.stop_sim()
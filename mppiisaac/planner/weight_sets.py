@@ -0,0 +1,53 @@
+from typing import Dict, List
+import torch
+
+
+def weight_sets_to_tensor(
+    weight_sets: List[Dict[str, float]], names: List[str], device: str
+) -> torch.Tensor:
+    """Convert a list of weight dicts into a [W, num_terms] tensor in the order of `names`."""
+    return torch.tensor(
+        [[float(w[name]) for name in names] for w in weight_sets],
+        dtype=torch.float32,
+        device=device,
+    )
+
+
+def mppi_sample_weights(costs: torch.Tensor, lambda_: float) -> torch.Tensor:
+    """Normalized MPPI importance weights over the last dimension of `costs`."""
+    beta = torch.min(costs, dim=-1, keepdim=True).values
+    omega = torch.exp(-(costs - beta) / lambda_)
+    return omega / torch.sum(omega, dim=-1, keepdim=True)
+
+
+def evaluate_weight_sets(
+    term_costs: torch.Tensor,
+    actions: torch.Tensor,
+    weight_sets: torch.Tensor,
+    lambda_: float,
+) -> Dict[str, torch.Tensor]:
+    """
+    Evaluate W weight vectors on a single batch of rollouts.
+
+    term_costs: [num_terms, num_samples] cost terms accumulated over the horizon
+    actions: [num_samples, horizon, nu] sampled control sequences of the rollouts
+    weight_sets: [W, num_terms]
+
+    Returns the [W, num_samples] costs, the MPPI weighted control sequence and
+    first action for every weight set, and diagnostics of the sample weights.
+    Note: this is the plain MPPI update over the given samples, it does not
+    reproduce the smoothing or covariance adaptation of the planner itself.
+    """
+    costs = torch.matmul(weight_sets, term_costs)
+    omega = mppi_sample_weights(costs, lambda_)
+    sequences = torch.einsum("wk,khn->whn", omega, actions)
+
+    return {
+        "costs": costs,
+        "sequences": sequences,
+        "actions": sequences[:, 0],
+        "min_cost": torch.min(costs, dim=1).values,
+        "mean_cost": torch.mean(costs, dim=1),
+        "best_sample": torch.argmin(costs, dim=1),
+        "effective_sample_size": 1.0 / torch.sum(torch.square(omega), dim=1),
+    }
@@ -1,9 +1,10 @@
 from dataclasses import dataclass, field
 from mppi_torch.mppi import MPPIConfig
 from mppiisaac.planner.isaacgym_wrapper import IsaacGymConfig, ActorWrapper
+from mppiisaac.planner.cost_terms import CostConfig
 from hydra.core.config_store import ConfigStore
 
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 @dataclass
@@ -16,6 +17,14 @@ class ExampleConfig:
     nx: int
     actors: List[str]
     initial_actor_positions: List[List[float]]
+    compile_objective: Optional[str] = None
+    checkpoint: Optional[str] = None
+    checkpoint_interval: int = 0
+    profile_phases: bool = False
+    stream: bool = False
+    planner_address: str = "tcp://127.0.0.1:4242"
+    # Note: goal and metrics of headless runs, see mppiisaac.utils.scenario_runner.ScenarioConfig
+    scenario: Optional[Dict[str, Any]] = None
 
 
 cs = ConfigStore.instance()
@@ -35,12 +44,22 @@ cs.store(name="config_boxer_reach", node=ExampleConfig)
 cs.store(name="config_panda_c_space_goal", node=ExampleConfig)
 cs.store(group="mppi", name="base_mppi", node=MPPIConfig)
 cs.store(group="isaacgym", name="base_isaacgym", node=IsaacGymConfig)
+cs.store(group="cost", name="base_cost", node=CostConfig)
 
 
 from hydra import compose, initialize
 from omegaconf import OmegaConf
+import hashlib
 def load_isaacgym_config(name):
     with initialize(config_path="../../conf"):
         cfg = compose(config_name=name)
         print(OmegaConf.to_yaml(cfg))
-    return cfg
\ No newline at end of file
+    return cfg
+
+
+def config_hash(cfg) -> str:
+    """Short stable hash of a (hydra) configuration, used to match checkpoints and studies."""
+    if not OmegaConf.is_config(cfg):
+        cfg = OmegaConf.create(cfg)
+    yaml_str = OmegaConf.to_yaml(cfg, resolve=True, sort_keys=True)
+    return hashlib.sha1(yaml_str.encode()).hexdigest()[:16]
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+Recording of what the planner saw and did, step by step, for later analysis.
+
+An episode is a directory with an npy file per field and an `index.json`. Every
+field is a preallocated memory-mapped array of [capacity, *shape], a step writes
+one row of every field, so recording costs a device to host copy and a memcpy
+per field. When the capacity is reached the files grow in place by rewriting
+their npy header. The index holds the number of recorded steps, the dtype and
+shape of the fields and free-form metadata, e.g. the config and seed. It is
+rewritten every `flush_every` steps and on close, when the files are also cut
+to the recorded steps, so they load with a plain np.load.
+
+`EpisodeLog` opens a recorded episode read-only, its fields are memory-mapped
+and only the slices that are used get read from disk, also while recording.
+"""
+from typing import Any, Dict, Optional
+import io
+import json
+import numpy as np
+import os
+import time
+import torch
+
+INDEX_VERSION = 1
+
+
+def _as_array(value) -> np.ndarray:
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+def _resize_npy(path: str, rows: int):
+    """Change the first dimension of an npy file in place, its data is kept."""
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+        header = io.BytesIO()
+        d = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran_order, "shape": (rows, *shape[1:])}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header, d)
+        else:
+            np.lib.format.write_array_header_2_0(header, d)
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+
+        if header.tell() == offset:
+            f.seek(0)
+            f.write(header.getvalue())
+            f.truncate(offset + rows * row_bytes)
+            return
+
+    # Note: older numpy versions do not pad the header for growth, then the file is copied
+    old = np.load(path, mmap_mode="r")
+    new = np.lib.format.open_memmap(f"{path}.tmp", mode="w+", dtype=dtype, shape=(rows, *shape[1:]))
+    n = min(rows, shape[0])
+    new[:n] = old[:n]
+    new.flush()
+    del old, new
+    os.replace(f"{path}.tmp", path)
+
+
+class EpisodeRecorder(object):
+    """
+    Append-only recording of steps into memory-mapped npy files in `path`.
+    Fields are taken from the first step, every later step has to hold the same
+    fields with the same shapes.
+    """
+
+    def __init__(self, path: str, capacity: int = 1024, flush_every: int = 100, meta: Optional[Dict[str, Any]] = None):
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self.path = path
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.meta = dict(meta or {})
+        self.steps = 0
+        self._arrays = {}
+        self._fields = {}
+        os.makedirs(path, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.npy")
+
+    def _create(self, step: Dict[str, np.ndarray]):
+        for name, value in step.items():
+            self._arrays[name] = np.lib.format.open_memmap(
+                self._file(name), mode="w+", dtype=value.dtype, shape=(self.capacity, *value.shape)
+            )
+            self._fields[name] = {"dtype": value.dtype.str, "shape": list(value.shape)}
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        for name, array in self._arrays.items():
+            array.flush()
+            # Note: the memmap has to be released before its file changes size
+            self._arrays[name] = None
+            del array
+            _resize_npy(self._file(name), capacity)
+            self._arrays[name] = np.lib.format.open_memmap(self._file(name), mode="r+")
+        self.capacity = capacity
+
+    def record(self, step: Dict[str, Any]):
+        """Append a step, a dict of tensors, arrays or numbers by field name."""
+        step = {name: _as_array(value) for name, value in step.items()}
+        if not self._arrays:
+            self._create(step)
+        elif step.keys() != self._arrays.keys():
+            raise ValueError(f"Step fields {sorted(step)} differ from the recorded {sorted(self._arrays)}")
+        if self.steps == self.capacity:
+            self._grow()
+
+        for name, value in step.items():
+            array = self._arrays[name]
+            if value.shape != array.shape[1:]:
+                raise ValueError(f"Field {name} has shape {value.shape}, recorded are {array.shape[1:]}")
+            array[self.steps] = value
+        self.steps += 1
+        if self.flush_every and self.steps % self.flush_every == 0:
+            self._write_index()
+
+    def _write_index(self):
+        index = {
+            "version": INDEX_VERSION,
+            "steps": self.steps,
+            "capacity": self.capacity,
+            "fields": self._fields,
+            "meta": self.meta,
+            "updated": time.time(),
+        }
+        # Note: write then rename, readers never see a truncated index
+        tmp_path = os.path.join(self.path, "index.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, "index.json"))
+
+    def flush(self):
+        for array in self._arrays.values():
+            array.flush()
+        self._write_index()
+
+    def close(self):
+        """Flush and cut the files to the recorded steps."""
+        if self._arrays is None:
+            return
+        for name in list(self._arrays):
+            self._arrays[name].flush()
+            self._arrays[name] = None
+            _resize_npy(self._file(name), self.steps)
+        self.capacity = self.steps
+        self._write_index()
+        self._arrays = None
+
+
+class EpisodeLog(object):
+    """Read-only view of a recorded episode, fields are memory-mapped arrays of [steps, *shape]."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        if index["version"] != INDEX_VERSION:
+            raise ValueError(f"Unsupported episode index version {index['version']}")
+        self.steps = index["steps"]
+        self.meta = index["meta"]
+        self.fields = list(index["fields"])
+        self._arrays = {}
+
+    def __len__(self):
+        return self.steps
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            if name not in self.fields:
+                raise KeyError(f"No field {name} in {self.path}, recorded are {self.fields}")
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")[: self.steps]
+        return self._arrays[name]
+
+    def step(self, i: int) -> Dict[str, np.ndarray]:
+        return {name: self[name][i] for name in self.fields}
+
+
+def planner_step(planner, dof_state, root_state, action, planning_time: float, top_k: int = 0) -> Dict[str, Any]:
+    """
+    The fields of a step of an MPPIisaacPlanner: the world state it planned from,
+    the action, the nominal sequence, min/mean/max of the rollout costs, the
+    planning time and, with top_k > 0, the top_k rollouts of the visualize link.
+    """
+    step = {
+        "time": time.time(),
+        "dof_state": dof_state.reshape(-1),
+        "root_state": root_state.reshape(-1, 13),
+        "action": action.reshape(-1),
+        "nominal": planner.nominal_sequence(),
+        "cost": planner.rollout_cost_stats(),
+        "planning_time": planning_time,
+    }
+    if top_k > 0:
+        step["rollouts"] = planner.select_rollouts(top_k)
+    return step
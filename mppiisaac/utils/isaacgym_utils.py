@@ -1,6 +1,8 @@
 import mppiisaac
 from isaacgym import gymapi
 from typing import List
+import copy
+import functools
 import yaml
 from yaml import SafeLoader
 import numpy as np
@@ -69,6 +71,14 @@ def load_asset(gym, sim, actor_cfg):
     return actor_asset
 
 
+def asset_key(actor_cfg: ActorWrapper):
+    """What the asset of an actor is made from, None if it has size noise and differs on every load."""
+    if actor_cfg.noise_sigma_size is not None:
+        return None
+    size = tuple(actor_cfg.size) if actor_cfg.size is not None else None
+    return (actor_cfg.type, actor_cfg.urdf_file, size, actor_cfg.fixed, actor_cfg.flip_visual, actor_cfg.gravity)
+
+
 def add_ground_plane(gym, sim):
     plane_params = gymapi.PlaneParams()
     plane_params.normal = gymapi.Vec3(0, 0, 1)  # z-up!
@@ -78,13 +88,23 @@ def add_ground_plane(gym, sim):
     plane_params.restitution = 0
     gym.add_ground(sim, plane_params)
 
+@functools.lru_cache(maxsize=None)
+def _load_actor_yaml(path: str) -> dict:
+    with open(path) as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def load_actor_cfg(path: str) -> ActorWrapper:
+    # Note: the parsed files are cached, e.g. for the obstacle catalogs of every env, the actor configs are not since they get mutated
+    return ActorWrapper(**copy.deepcopy(_load_actor_yaml(path)))
+
+
 def load_actor_cfgs(actors: List[str]) -> List[ActorWrapper]:
     actor_cfgs = []
     for actor_name in actors:
-        with open(
-            f"{os.path.dirname(mppiisaac.__file__)}/../conf/actors/{actor_name}.yaml"
-        ) as f:
-            actor_cfgs.append(ActorWrapper(**yaml.load(f, Loader=SafeLoader)))
+        actor_cfgs.append(
+            load_actor_cfg(f"{os.path.dirname(mppiisaac.__file__)}/../conf/actors/{actor_name}.yaml")
+        )
     
     return actor_cfgs
 
@@ -96,10 +116,11 @@ def load_obs_actor_cfgs_envs(actors: List[str], num_envs:int) -> List[ActorWrapp
     for actor_name in actors:
         actor_cata = []
         for i in range(num_envs):
-            with open(
-                f"{os.path.dirname(mppiisaac.__file__)}/../conf/actors/{actor_name}/{actor_name}_{i}.yaml"
-            ) as f:
-                actor_cata.append(ActorWrapper(**yaml.load(f, Loader=SafeLoader)))
+            actor_cata.append(
+                load_actor_cfg(
+                    f"{os.path.dirname(mppiisaac.__file__)}/../conf/actors/{actor_name}/{actor_name}_{i}.yaml"
+                )
+            )
         actor_cfgs.append(actor_cata)
     
     random_actor_cfgs = []
@@ -0,0 +1,90 @@
+"""
+Latency and payload instrumentation of the world-planner link.
+
+Both ends stamp every call with wall-clock times:
+
+    client: start, sent (request encoded), replied (reply received), done (reply decoded)
+    server: received, planning start, planning end
+
+and the client splits a call into the intervals encode, request (transfer and
+queueing), server_decode, planning, response (reply encoding and transfer),
+decode and total. request and response compare clocks of both processes, they
+are only meaningful when the clocks agree, e.g. on the same host.
+"""
+from collections import defaultdict, deque
+from typing import Dict, Optional
+import json
+import time
+import numpy as np
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+def distribution(values, scale: float = 1.0) -> Dict[str, float]:
+    """Count, mean, std, min, max and the PERCENTILES of values times scale, e.g. 1e3 for seconds to ms."""
+    values = np.asarray(values, dtype=np.float64) * scale
+    if values.size == 0:
+        return {"count": 0}
+    stats = {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{p}"] = float(v)
+    return stats
+
+
+class LatencyRecorder(object):
+    """Rolling window of durations (seconds) and payload sizes (bytes) per metric."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.records = deque(maxlen=window)
+
+    def record(self, values: Dict[str, float]):
+        self.records.append({"time": time.time(), **values})
+        for name, value in values.items():
+            self.samples[name].append(value)
+
+    def record_call(
+        self,
+        method: str,
+        start: float,
+        sent: float,
+        replied: float,
+        done: float,
+        server_stamps: Optional[list] = None,
+        request_bytes: Optional[int] = None,
+        reply_bytes: Optional[int] = None,
+    ):
+        values = {
+            f"{method}/encode": sent - start,
+            f"{method}/decode": done - replied,
+            f"{method}/total": done - start,
+        }
+        if server_stamps is not None:
+            received, plan_start, plan_end = server_stamps
+            values[f"{method}/request"] = received - sent
+            values[f"{method}/server_decode"] = plan_start - received
+            values[f"{method}/planning"] = plan_end - plan_start
+            values[f"{method}/response"] = replied - plan_end
+        if request_bytes is not None:
+            values[f"{method}/request_bytes"] = request_bytes
+        if reply_bytes is not None:
+            values[f"{method}/reply_bytes"] = reply_bytes
+        self.record(values)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: distribution(samples) for name, samples in self.samples.items()}
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "records": list(self.records)}, f, indent=2)
+
+    def reset(self):
+        self.samples.clear()
+        self.records.clear()
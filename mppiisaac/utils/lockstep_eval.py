@@ -0,0 +1,123 @@
+"""
+Closed-loop evaluation of many configurations in lockstep.
+
+The episodes run as the envs of one world simulator, env i driven by its own
+planner, e.g. a worker of a PlannerPool or a session of a PlannerHost. Every
+step the planners are queried concurrently, the world is stepped once for all
+envs, and the per-episode objective is accumulated on tensors. An env that
+finishes its episode is reset on its own and takes the next configuration, so
+evaluating as many configurations as there are envs costs about one episode
+of wall time.
+"""
+from collections import deque
+from typing import Any, Callable, List, Optional
+import gevent
+import torch
+
+
+class LockstepEvaluator(object):
+    """
+    `episode_cost(sim)` returns the cost of the current step for every env [num_envs],
+    `configure(planner, config)` prepares a planner for the episode of a config.
+    """
+
+    def __init__(
+        self,
+        sim,
+        planners: list,
+        episode_cost: Callable,
+        n_steps: int,
+        configure: Optional[Callable[[Any, Any], None]] = None,
+    ):
+        if len(planners) != sim.num_envs:
+            raise ValueError(f"Need one planner per env, got {len(planners)} for {sim.num_envs} envs")
+        self.sim = sim
+        self.planners = planners
+        self.episode_cost = episode_cost
+        self.n_steps = n_steps
+        self.configure = configure
+
+    def _actions(self, active: List[int]) -> torch.Tensor:
+        def act(i):
+            return self.planners[i].compute_action_from_tensors(
+                self.sim._dof_state[i : i + 1], self.sim._root_state[i : i + 1]
+            )
+
+        calls = [gevent.spawn(act, i) for i in active]
+        try:
+            gevent.joinall(calls, raise_error=True)
+        except BaseException:
+            # Note: e.g. a timeout, calls still in flight must not act on the next episodes
+            gevent.killall(calls)
+            raise
+
+        # Note: envs without an episode get a zero command
+        nu = calls[0].value.numel()
+        actions = torch.zeros((self.sim.num_envs, nu), device=self.sim.device)
+        for i, call in zip(active, calls):
+            actions[i] = call.value.reshape(-1).to(self.sim.device)
+        return actions
+
+    def evaluate(
+        self,
+        configs: list,
+        should_stop: Optional[Callable[[int, int, float], bool]] = None,
+        check_every: int = 0,
+        on_result: Optional[Callable[[int, Optional[float]], None]] = None,
+    ) -> List[Optional[float]]:
+        """
+        Accumulated episode cost of every config, in order. Every check_every
+        steps `should_stop(index, step, cost)` is asked for every running episode,
+        stopped episodes are cut short and get None. `on_result(index, cost)` is
+        called as soon as an episode ends, so its result is not lost when the
+        evaluation is interrupted.
+        """
+        num_envs = self.sim.num_envs
+        results: List[Optional[float]] = [None] * len(configs)
+        pending = deque(enumerate(configs))
+        episode = [None] * num_envs
+        steps = torch.zeros(num_envs, dtype=torch.long, device=self.sim.device)
+        cost = torch.zeros(num_envs, device=self.sim.device)
+
+        def start(envs):
+            started = []
+            for i in envs:
+                episode[i] = None
+                if pending:
+                    episode[i], config = pending.popleft()
+                    if self.configure is not None:
+                        self.configure(self.planners[i], config)
+                    started.append(i)
+            if started:
+                ids = torch.tensor(started, device=self.sim.device)
+                self.sim.reset_to_initial_poses(ids)
+                steps[ids] = 0
+                cost[ids] = 0
+
+        start(range(num_envs))
+        while any(e is not None for e in episode):
+            active = [i for i in range(num_envs) if episode[i] is not None]
+            self.sim.apply_robot_cmd(self._actions(active))
+            self.sim.step()
+
+            mask = torch.zeros(num_envs, dtype=torch.bool, device=self.sim.device)
+            mask[active] = True
+            cost += torch.where(mask, self.episode_cost(self.sim), torch.zeros_like(cost))
+            steps += mask.long()
+
+            finished = torch.nonzero(mask & (steps >= self.n_steps)).flatten().tolist()
+            for i, c in zip(finished, cost[finished].tolist()):
+                results[episode[i]] = c
+                if on_result is not None:
+                    on_result(episode[i], c)
+
+            if should_stop is not None and check_every > 0:
+                step_counts = steps.tolist()
+                checked = [i for i in active if i not in finished and step_counts[i] % check_every == 0]
+                for i, c in zip(checked, cost[checked].tolist()):
+                    if should_stop(episode[i], step_counts[i], c):
+                        finished.append(i)
+                        if on_result is not None:
+                            on_result(episode[i], None)
+            start(finished)
+        return results
@@ -0,0 +1,216 @@
+"""
+A pool of planner servers with the same config, for parallel evaluation.
+
+The pool either connects to running servers or launches them as local
+processes. Calls go to the healthy worker with the fewest calls in flight;
+a client that passes a key is pinned to the worker that served its first call,
+so the warm start of the planner carries over between its calls. A worker that
+fails a call or a health check is skipped until it passes a health check again,
+the calls of clients pinned to it fail until they are unpinned.
+"""
+from mppiisaac.utils.shm_transport import RpcPlannerClient
+from typing import Dict, Hashable, List, Optional
+import gevent
+import gevent.pool
+import subprocess
+import time
+import zerorpc
+
+
+class PoolWorker(object):
+    def __init__(self, address: str, client: RpcPlannerClient):
+        self.address = address
+        self.client = client
+        self.healthy = True
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.busy_time = 0.0
+
+
+class PinnedClient(object):
+    """A planner client whose calls all go through the pool to the worker pinned to key."""
+
+    def __init__(self, pool: "PlannerPool", key: Hashable):
+        self.pool = pool
+        self.key = key
+
+    def __getattr__(self, name):
+        if name in ("pool", "key"):
+            raise AttributeError(name)
+        return lambda *args: self.pool.call(name, *args, key=self.key)
+
+
+class PlannerPool(object):
+    """
+    Dispatches calls over planner servers. Calls are gevent-friendly, run them
+    from several greenlets, or use `map`, to keep all workers busy.
+    """
+
+    def __init__(self, addresses: List[str], timeout: float = 30, **kwargs):
+        if len(addresses) == 0:
+            raise ValueError("A planner pool needs at least one address")
+        self.timeout = timeout
+        self.workers = [
+            PoolWorker(address, RpcPlannerClient(address, timeout=timeout, **kwargs)) for address in addresses
+        ]
+        self._pins: Dict[Hashable, PoolWorker] = {}
+        self._processes: List[subprocess.Popen] = []
+        self._started = time.time()
+
+    @classmethod
+    def launch(
+        cls,
+        command: List[str],
+        num_workers: int,
+        base_port: int = 4242,
+        host: str = "127.0.0.1",
+        startup_timeout: float = 120,
+        **kwargs,
+    ) -> "PlannerPool":
+        """
+        Start `num_workers` planner servers on consecutive ports, e.g. with
+        `[sys.executable, "planner.py"]`. Each process gets the override
+        `planner_address=tcp://<host>:<port>` appended to `command`.
+        """
+        addresses = [f"tcp://{host}:{base_port + i}" for i in range(num_workers)]
+        processes = [subprocess.Popen(command + [f"planner_address={a}"]) for a in addresses]
+        pool = cls(addresses, **kwargs)
+        pool._processes = processes
+        try:
+            pool.wait_ready(startup_timeout)
+        except Exception:
+            pool.close()
+            raise
+        return pool
+
+    def _ping(self, worker: PoolWorker, timeout: float) -> bool:
+        try:
+            worker.client.rpc("_zerorpc_ping", timeout=timeout)
+            return True
+        except (zerorpc.TimeoutExpired, zerorpc.LostRemote):
+            return False
+
+    def check_health(self, timeout: float = 5) -> List[bool]:
+        """Ping all workers concurrently and update which of them take calls."""
+        pings = [gevent.spawn(self._ping, w, timeout) for w in self.workers]
+        gevent.joinall(pings)
+        for worker, ping in zip(self.workers, pings):
+            worker.healthy = bool(ping.value)
+        return [w.healthy for w in self.workers]
+
+    def wait_ready(self, timeout: float = 120):
+        deadline = time.time() + timeout
+        while not all(self.check_health(timeout=1)):
+            for process in self._processes:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Planner process exited with code {process.returncode}")
+            if time.time() > deadline:
+                raise RuntimeError(f"Planners not ready after {timeout}s")
+            gevent.sleep(0.5)
+
+    def _select(self, key: Optional[Hashable]) -> PoolWorker:
+        if key is not None and key in self._pins:
+            if not self._pins[key].healthy:
+                raise RuntimeError(f"The planner pinned to {key!r} is down, unpin it to start over on another one")
+            return self._pins[key]
+
+        healthy = [w for w in self.workers if w.healthy]
+        if len(healthy) == 0:
+            raise RuntimeError("No healthy planner in the pool")
+        # Note: ties go to the worker with the fewest pinned clients, then the one busy the shortest
+        pins = [sum(p is w for p in self._pins.values()) for w in healthy]
+        worker = min(zip(healthy, pins), key=lambda wp: (wp[0].in_flight, wp[1], wp[0].busy_time))[0]
+        if key is not None:
+            self._pins[key] = worker
+        return worker
+
+    def pin(self, key: Hashable, index: Optional[int] = None) -> int:
+        """Pin a client key to a worker, by default its current one or the least loaded. Returns its index."""
+        if index is None:
+            worker = self._select(key)
+        else:
+            worker = self.workers[index]
+            self._pins[key] = worker
+        return self.workers.index(worker)
+
+    def unpin(self, key: Hashable):
+        self._pins.pop(key, None)
+
+    def client(self, key: Optional[Hashable] = None) -> RpcPlannerClient:
+        """The client of the worker for key, for calls that need a specific server."""
+        return self._select(key).client
+
+    def pinned(self, key: Hashable) -> "PinnedClient":
+        return PinnedClient(self, key)
+
+    def call(self, method: str, *args, key: Optional[Hashable] = None):
+        """
+        Call a method on a worker. Calls without key are retried on another
+        worker if their worker fails; pinned calls fail, since they need the state
+        of their planner, until the key is unpinned.
+        """
+        worker = self._select(key)
+        worker.in_flight += 1
+        start = time.time()
+        try:
+            result = getattr(worker.client, method)(*args)
+        except (zerorpc.TimeoutExpired, zerorpc.LostRemote):
+            worker.failures += 1
+            worker.healthy = False
+            if key is not None or not any(w.healthy for w in self.workers):
+                raise
+            return self.call(method, *args)
+        finally:
+            worker.in_flight -= 1
+            worker.calls += 1
+            worker.busy_time += time.time() - start
+        return result
+
+    def broadcast(self, method: str, *args) -> list:
+        """Call a method on all healthy workers, e.g. update_weights."""
+        calls = [gevent.spawn(getattr(w.client, method), *args) for w in self.workers if w.healthy]
+        gevent.joinall(calls, raise_error=True)
+        return [c.value for c in calls]
+
+    def map(self, fn, items, concurrency: Optional[int] = None) -> list:
+        """
+        Run `fn(pool, item)` for all items in greenlets, by default as many at
+        a time as there are workers, and return the results in order.
+        """
+        group = gevent.pool.Pool(concurrency or len(self.workers))
+        return list(group.imap(lambda item: fn(self, item), items))
+
+    def utilization(self) -> List[Dict[str, float]]:
+        """Per worker: calls, failures, busy time and the busy fraction of the pool lifetime."""
+        elapsed = max(time.time() - self._started, 1e-9)
+        return [
+            {
+                "address": w.address,
+                "healthy": w.healthy,
+                "calls": w.calls,
+                "failures": w.failures,
+                "in_flight": w.in_flight,
+                "busy_time": w.busy_time,
+                "utilization": w.busy_time / elapsed,
+            }
+            for w in self.workers
+        ]
+
+    def reset_utilization(self):
+        self._started = time.time()
+        for w in self.workers:
+            w.calls, w.failures, w.busy_time = 0, 0, 0.0
+
+    def close(self):
+        for w in self.workers:
+            w.client.rpc.close()
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes = []
+
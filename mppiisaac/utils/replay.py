@@ -0,0 +1,120 @@
+"""
+Deterministic replay of recorded episodes, for regression tests of the planner.
+
+A recording of mppiisaac.utils.scenario_runner holds the world state every
+command started from, the resulting action, nominal sequence, rollout costs and
+planning time, see mppiisaac.utils.episode_recorder. `replay` rebuilds the
+planner from the example config, overrides and seed of the recording and feeds
+it the recorded world states in order, without a world simulator and without
+waiting for anything. The planner is seeded as in the recorded run and gets the
+same sequence of commands, so the sampling noise and the halton offsets, which
+advance with every command, are the same as when recording. Actions, nominal
+sequences and costs are compared to the recording, as are the planning times.
+
+Replays only reproduce the recording exactly on the same hardware, software
+and device, the tolerances absorb small numerical differences.
+"""
+from mppiisaac.planner.closed_loop import ClosedLoopPlanner
+from mppiisaac.planner.mppi_isaac import MPPIisaacPlanner
+from mppiisaac.utils.config_store import config_hash
+from mppiisaac.utils.episode_recorder import EpisodeLog
+from mppiisaac.utils.latency import distribution
+from mppiisaac.utils.scenario_runner import example_objective, load_example
+from typing import List, Optional
+import numpy as np
+import os
+import random
+import time
+import torch
+import warnings
+
+PLANNERS = {"MPPIisaacPlanner": MPPIisaacPlanner, "ClosedLoopPlanner": ClosedLoopPlanner}
+
+
+def replay_planner(log: EpisodeLog, overrides: Optional[List[str]] = None):
+    """The planner of a recording, seeded as in the recorded run."""
+    meta = log.meta
+    cfg = load_example(meta["example"], list(meta["overrides"]) + ["isaacgym.viewer=false"] + list(overrides or []))
+    if not overrides and meta.get("config_hash") not in (None, config_hash(cfg)):
+        warnings.warn("The example config changed since the recording, replaying anyway")
+
+    seed = meta["seed"]
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    planner = PLANNERS[meta.get("planner", "MPPIisaacPlanner")](
+        cfg, example_objective(cfg, os.path.dirname(meta["example"]))
+    )
+    planner.seed(seed)
+    return planner
+
+
+def _max_abs_diff(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Largest absolute difference per step of two [steps, ...] arrays."""
+    return np.abs(a - b).reshape(len(a), -1).max(axis=1)
+
+
+def replay(
+    path: str,
+    overrides: Optional[List[str]] = None,
+    start: int = 0,
+    stop: Optional[int] = None,
+    atol: float = 1e-4,
+    planner=None,
+) -> dict:
+    """
+    Replay the recording at path and compare it to the recorded steps from start
+    to stop. The steps before start are replayed too, untimed, since every command
+    depends on the ones before it. Overrides, e.g. mppi.num_samples=200, change
+    the planner on top of the recorded config, differing actions are then
+    expected and only the timings are comparable. A given planner is replayed
+    instead of the one of the recording, it is expected to be seeded already.
+    """
+    log = EpisodeLog(path)
+    stop = len(log) if stop is None else min(stop, len(log))
+    if not 0 <= start < stop:
+        raise ValueError(f"Cannot replay steps {start} to {stop} of a recording of {len(log)} steps")
+
+    if planner is None:
+        planner = replay_planner(log, overrides)
+    device = planner.sim.device
+    fields = {"action": [], "nominal": [], "cost": []}
+    latencies = []
+    for i in range(stop):
+        dof_state = torch.from_numpy(np.array(log["dof_state"][i])).to(device).reshape(1, -1)
+        root_state = torch.from_numpy(np.array(log["root_state"][i])).to(device).reshape(1, -1, 13)
+        t = time.perf_counter()
+        action = planner.compute_action_from_tensors(dof_state, root_state)
+        if action.is_cuda:
+            torch.cuda.synchronize(action.device)
+        if i < start:
+            continue
+        latencies.append(time.perf_counter() - t)
+        # Note: copies, mppi may return views of its nominal sequence that the next command changes
+        fields["action"].append(np.array(action.reshape(-1).cpu()))
+        fields["nominal"].append(np.array(planner.nominal_sequence().cpu()))
+        fields["cost"].append(np.array(planner.rollout_cost_stats().cpu()))
+
+    report = {"episode": path, "start": start, "stop": stop, "atol": atol}
+    for name, values in fields.items():
+        if name not in log.fields:
+            continue
+        diff = _max_abs_diff(np.stack(values), np.asarray(log[name][start:stop]))
+        diverged = np.flatnonzero(diff > atol)
+        report[name] = {
+            "max_abs_diff": float(diff.max()),
+            "mean_abs_diff": float(diff.mean()),
+            "diverged_steps": int(len(diverged)),
+            "first_divergence": int(start + diverged[0]) if len(diverged) else None,
+        }
+
+    recorded = distribution(log["planning_time"][start:stop], 1e3)
+    replayed = distribution(latencies, 1e3)
+    report["latency_ms"] = {
+        "recorded": recorded,
+        "replay": replayed,
+        "p50_ratio": replayed["p50"] / recorded["p50"],
+        "p99_ratio": replayed["p99"] / recorded["p99"],
+    }
+    report["latencies"] = latencies
+    return report
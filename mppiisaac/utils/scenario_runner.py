@@ -0,0 +1,247 @@
+"""
+Headless closed-loop runs of the examples with task metrics.
+
+An episode runs planner and world in one process with a ClosedLoopPlanner,
+without a viewer and without waiting for real time. It records whether and when
+the goal is reached, the path length of a point of the robot, the contact
+impulse on a set of actors and the planning latency of every step. What the goal
+is, is set in the `scenario` node of an example config, see ScenarioConfig.
+
+`run_scenarios` runs the episodes of a list of example configs and seeds in
+parallel worker processes, a fresh process per episode since isaacgym hosts a
+single simulator per process, and aggregates them into a report. With a
+`record` directory every episode is also recorded step by step, see
+mppiisaac.utils.episode_recorder.
+"""
+from mppiisaac.planner.closed_loop import ClosedLoopPlanner
+from mppiisaac.planner.cost_terms import CostTermObjective
+from mppiisaac.planner.isaacgym_wrapper import sim_process_context
+from mppiisaac.utils.config_store import config_hash
+from mppiisaac.utils.episode_recorder import EpisodeRecorder, planner_step
+from mppiisaac.utils.latency import distribution
+from isaacgym import gymapi
+from dataclasses import dataclass, field
+from hydra import compose, initialize_config_dir
+from omegaconf import OmegaConf, open_dict
+from typing import List, Optional
+import importlib.util
+import numpy as np
+import os
+import random
+import time
+import torch
+
+
+@dataclass
+class ScenarioConfig:
+    # Note: points are "actor" for the root or "actor:link", the goal is reached when goal[0] is within tolerance of goal[1]
+    goal: List[str] = field(default_factory=list)
+    tolerance: float = 0.1
+    # Note: 2 to only compare x and y, e.g. for mobile bases
+    goal_dims: int = 3
+    # Note: the point whose travelled distance is the path length, empty for the root of the first robot
+    path: str = ""
+    # Note: actors whose net contact forces add up to the collision impulse, empty for the robots
+    collision_actors: List[str] = field(default_factory=list)
+    # Note: 0 for n_steps of the example
+    max_steps: int = 0
+    stop_at_goal: bool = True
+
+
+def scenario_config(cfg) -> ScenarioConfig:
+    """The `scenario` node of an example config, with defaults for missing fields."""
+    return OmegaConf.to_object(OmegaConf.merge(OmegaConf.structured(ScenarioConfig), cfg.get("scenario") or {}))
+
+
+def load_example(path: str, overrides: Optional[List[str]] = None):
+    """Compose an example config, e.g. examples/panda_pick/panda_pick.yaml, with hydra overrides."""
+    import mppiisaac.utils.config_store  # noqa: F401, registers the base configs
+
+    with initialize_config_dir(config_dir=os.path.dirname(os.path.abspath(path)), version_base=None):
+        cfg = compose(config_name=os.path.splitext(os.path.basename(path))[0], overrides=overrides or [])
+    with open_dict(cfg):
+        cfg.setdefault("obs_actors", [])
+    return cfg
+
+
+def example_objective(cfg, example_dir: str):
+    """The declarative objective of the config if it has one, else the Objective of the example's planner.py."""
+    if "cost" in cfg:
+        return CostTermObjective(cfg.cost, cfg.mppi.device)
+    spec = importlib.util.spec_from_file_location("planner", os.path.join(example_dir, "planner.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Objective(cfg)
+
+
+def _point(sim, spec: str):
+    actor, _, link = spec.partition(":")
+    if link:
+        return lambda: sim.get_actor_link_by_name(actor, link)[:, 0:3]
+    return lambda: sim.get_actor_position_by_name(actor)
+
+
+def _rigid_body_indices(sim, actors: List[str]) -> torch.Tensor:
+    names = [a.name for a in sim.env_cfg]
+    env = sim.envs[0]
+    indices = []
+    for actor in actors:
+        handle = sim.env_cfg[names.index(actor)].handle
+        for body in sim._gym.get_actor_rigid_body_names(env, handle):
+            indices.append(sim._gym.find_actor_rigid_body_index(env, handle, body, gymapi.IndexDomain.DOMAIN_ENV))
+    return torch.tensor(indices, dtype=torch.long, device=sim.device)
+
+
+def run_episode(
+    path: str,
+    seed: int,
+    overrides: Optional[List[str]] = None,
+    record: Optional[str] = None,
+    record_top_k: int = 0,
+) -> dict:
+    """
+    One headless closed-loop episode of the example config at path. With record,
+    the steps are recorded in record/<config>_seed<seed>, with the top
+    record_top_k rollouts if set.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    cfg = load_example(path, list(overrides or []) + ["isaacgym.viewer=false"])
+    scenario = scenario_config(cfg)
+
+    # Note: seeded before the simulator is made, actor noise is drawn when the actors are created
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    planner = ClosedLoopPlanner(cfg, example_objective(cfg, os.path.dirname(os.path.abspath(path))))
+    planner.seed(seed)
+    sim, env = planner.sim, planner.world_env
+    dt = cfg.isaacgym.dt
+
+    robots = [a for a in sim.env_cfg if a.type == "robot"]
+    path_point = _point(sim, scenario.path or robots[0].name)
+    goal_points = [_point(sim, p) for p in scenario.goal]
+    if goal_points and len(goal_points) != 2:
+        raise ValueError(f"The goal of a scenario takes two points, got {scenario.goal}")
+    bodies = _rigid_body_indices(sim, scenario.collision_actors or [a.name for a in robots])
+
+    latencies = []
+    path_length = torch.zeros((), device=sim.device)
+    impulse = torch.zeros((), device=sim.device)
+    last = path_point()[env].clone()
+    time_to_goal, distance = None, None
+
+    recorder = None
+    if record:
+        # Note: what is needed to rebuild the planner from the recording, see mppiisaac.utils.replay
+        recorder = EpisodeRecorder(
+            os.path.join(record, f"{name}_seed{seed}"),
+            meta={
+                "example": os.path.abspath(path),
+                "seed": seed,
+                "overrides": list(overrides or []),
+                "planner": type(planner).__name__,
+                "config_hash": config_hash(cfg),
+            },
+        )
+        OmegaConf.save(cfg, os.path.join(recorder.path, "config.yaml"))
+
+    t_start = time.perf_counter()
+    steps = 0
+    try:
+        for steps in range(1, (scenario.max_steps or cfg.n_steps) + 1):
+            if recorder:
+                dof_state, root_state = (s.clone() for s in planner.world_state())
+            t = time.perf_counter()
+            action = planner.plan()
+            if action.is_cuda:
+                torch.cuda.synchronize(action.device)
+            latencies.append(time.perf_counter() - t)
+            if recorder:
+                recorder.record(planner_step(planner, dof_state, root_state, action, latencies[-1], record_top_k))
+            planner.step_world(action)
+
+            position = path_point()[env]
+            path_length += torch.linalg.norm(position - last)
+            last = position.clone()
+            impulse += torch.linalg.norm(sim._net_contact_force[env, bodies], dim=1).sum() * dt
+
+            if goal_points:
+                a, b = (p()[env][: scenario.goal_dims] for p in goal_points)
+                distance = float(torch.linalg.norm(a - b))
+                if time_to_goal is None and distance < scenario.tolerance:
+                    time_to_goal = steps * dt
+                    if scenario.stop_at_goal:
+                        break
+        wall_time = time.perf_counter() - t_start
+    finally:
+        # Note: a failing step still leaves a readable recording of the steps before it
+        if recorder:
+            recorder.close()
+
+    return {
+        "scenario": name,
+        "seed": seed,
+        "steps": steps,
+        "success": None if not goal_points else time_to_goal is not None,
+        "time_to_goal": time_to_goal,
+        "final_distance": distance,
+        "path_length": float(path_length),
+        "collision_impulse": float(impulse),
+        "realtime_factor": steps * dt / wall_time,
+        "latency_ms": distribution(latencies, 1e3),
+        "latencies": latencies,
+    }
+
+
+def _run_job(path: str, seed: int, overrides: Optional[List[str]], record: Optional[str], record_top_k: int) -> dict:
+    try:
+        return run_episode(path, seed, overrides, record, record_top_k)
+    except Exception as e:
+        # Note: a failing scenario is reported, the other episodes go on
+        return {
+            "scenario": os.path.splitext(os.path.basename(path))[0],
+            "seed": seed,
+            "error": f"{type(e).__name__}: {e}",
+        }
+
+
+def summarize(episodes: List[dict]) -> dict:
+    """Aggregate episodes by scenario."""
+    summary = {}
+    for name in dict.fromkeys(e["scenario"] for e in episodes):
+        runs = [e for e in episodes if e["scenario"] == name and "error" not in e]
+        s = {
+            "episodes": len(runs),
+            "errors": len([e for e in episodes if e["scenario"] == name and "error" in e]),
+        }
+        if runs:
+            scored = [e for e in runs if e["success"] is not None]
+            times = [e["time_to_goal"] for e in scored if e["success"]]
+            s.update(
+                {
+                    "success_rate": float(np.mean([e["success"] for e in scored])) if scored else None,
+                    "time_to_goal_mean": float(np.mean(times)) if times else None,
+                    "time_to_goal_median": float(np.median(times)) if times else None,
+                    "path_length_mean": float(np.mean([e["path_length"] for e in runs])),
+                    "collision_impulse_mean": float(np.mean([e["collision_impulse"] for e in runs])),
+                    "realtime_factor_mean": float(np.mean([e["realtime_factor"] for e in runs])),
+                    "latency_ms": distribution([t for e in runs for t in e["latencies"]], 1e3),
+                }
+            )
+        summary[name] = s
+    return summary
+
+
+def run_scenarios(
+    paths: List[str],
+    seeds: List[int],
+    workers: int = 1,
+    overrides: Optional[List[str]] = None,
+    record: Optional[str] = None,
+    record_top_k: int = 0,
+) -> dict:
+    """Run an episode per example config and seed in `workers` processes, returns the episodes and their summary."""
+    jobs = [(path, seed, overrides, record, record_top_k) for path in paths for seed in seeds]
+    with sim_process_context().Pool(workers, maxtasksperchild=1) as pool:
+        episodes = pool.starmap(_run_job, jobs, chunksize=1)
+    return {"episodes": episodes, "summary": summarize(episodes)}
@@ -0,0 +1,384 @@
+"""
+Shared-memory transport between a world and a planner on the same host.
+
+The planner server creates two shared-memory regions, one for requests and one
+for responses, and two named pipes that are only used to wake up the other side.
+A region starts with a small header (sequence number, method or status, message
+size) followed by a message of the tensor codec in mppiisaac.utils.transport, so
+tensors are copied once into shared memory and decoded in place.
+
+`serve_planner` serves a planner over zerorpc and, on the same event loop, over
+shared memory. `connect_planner` uses shared memory when the planner runs on
+this host and falls back to zerorpc otherwise.
+"""
+from multiprocessing import resource_tracker, shared_memory
+from mppiisaac.planner.rollout_reduction import decode_rollouts
+from mppiisaac.utils.latency import LatencyRecorder
+from mppiisaac.utils.transport import (
+    bytes_to_torch,
+    decode_tensors,
+    encode_tensors_into,
+    torch_to_bytes,
+)
+from typing import Dict
+from urllib.parse import urlparse
+import errno
+import os
+import socket
+import struct
+import tempfile
+import time
+import torch
+import zerorpc
+
+DEFAULT_CAPACITY = 16 * 1024 * 1024
+
+_HEADER = struct.Struct("<QQQ")
+_DATA_OFFSET = 64
+_METHODS = ["compute_action_tensor", "get_rollouts", "step"]
+_OK, _ERROR = 0, 1
+_owned = set()
+
+
+def shm_name(address: str) -> str:
+    """Name of the shared-memory regions of the planner served at `address`."""
+    return f"mppiisaac_{urlparse(address).port}"
+
+
+def _paths(name: str):
+    base = os.path.join(tempfile.gettempdir(), name)
+    return f"{base}_req.fifo", f"{base}_resp.fifo"
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # Note: an attaching process must not unlink the region when it exits, the server owns it
+    if name not in _owned:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _write_message(shm, seq: int, code: int, tensors) -> int:
+    size = encode_tensors_into(tensors, shm.buf[_DATA_OFFSET:])
+    _HEADER.pack_into(shm.buf, 0, seq, code, size)
+    return size
+
+
+def _read_message(shm):
+    seq, code, size = _HEADER.unpack_from(shm.buf, 0)
+    return seq, code, size, memoryview(shm.buf)[_DATA_OFFSET : _DATA_OFFSET + size]
+
+
+def is_local(address: str) -> bool:
+    host = urlparse(address).hostname
+    try:
+        ip = socket.gethostbyname(host)
+    except socket.gaierror:
+        return False
+    return ip.startswith("127.") or ip in ("0.0.0.0", socket.gethostbyname(socket.gethostname()))
+
+
+class ShmPlannerServer(object):
+    """
+    Serves the per-step calls `compute_action_tensor`, `get_rollouts` and `step`
+    of a planner over shared memory. `run` blocks, `spawn` runs it in a greenlet next
+    to a zerorpc server.
+    """
+
+    def __init__(self, planner, name: str, capacity: int = DEFAULT_CAPACITY):
+        self.planner = planner
+        self.name = name
+        self.capacity = capacity
+        self._last_seq = 0
+        self._resp_fd = None
+
+        self._req = self._create(f"{name}_req")
+        self._resp = self._create(f"{name}_resp")
+
+        self._req_path, self._resp_path = _paths(name)
+        for path in (self._req_path, self._resp_path):
+            if os.path.exists(path):
+                os.unlink(path)
+            os.mkfifo(path)
+
+        # Note: keeping a writer open ourselves means the pipe never reports end-of-file between clients
+        self._req_fd = os.open(self._req_path, os.O_RDONLY | os.O_NONBLOCK)
+        self._req_keepalive = os.open(self._req_path, os.O_WRONLY | os.O_NONBLOCK)
+
+    def _create(self, name: str) -> shared_memory.SharedMemory:
+        # Note: regions left behind by a planner that crashed are replaced
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        _owned.add(name)
+        return shared_memory.SharedMemory(name=name, create=True, size=self.capacity)
+
+    def _handle(self, method: str, tensors):
+        if method == "compute_action_tensor":
+            action = self.planner.compute_action_from_tensors(tensors["dof_state"], tensors["root_state"])
+            return {"action": action}
+        if method == "step":
+            want_rollouts, top_k, downsample = tensors.pop("flags").tolist()
+            return self.planner.step_from_message(tensors, bool(want_rollouts), top_k, downsample)
+        return {"rollouts": self.planner.select_rollouts()}
+
+    def _respond(self, seq: int, status: int, tensors) -> int:
+        size = _write_message(self._resp, seq, status, tensors)
+        if self._resp_fd is None:
+            self._resp_fd = os.open(self._resp_path, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            os.write(self._resp_fd, b"\x01")
+        except BrokenPipeError:
+            # Note: the client went away, the next client opens the pipe again
+            os.close(self._resp_fd)
+            self._resp_fd = None
+        return size
+
+    def poll(self) -> bool:
+        """Handle a pending request, returns False if there was none."""
+        try:
+            os.read(self._req_fd, 4096)
+        except BlockingIOError:
+            return False
+
+        received = time.time()
+        seq, code, size, message = _read_message(self._req)
+        if seq == self._last_seq:
+            return False
+        self._last_seq = seq
+
+        try:
+            if code >= len(_METHODS):
+                raise ValueError(f"Unknown method code {code}")
+            tensors = decode_tensors(message, self.planner.cfg.mppi.device)
+            started = time.time()
+            result = self._handle(_METHODS[code], tensors)
+            finished = time.time()
+            result["stamps"] = torch.tensor([received, started, finished], dtype=torch.float64)
+            status = _OK
+        except Exception as e:
+            result = {"error": torch.tensor(list(str(e).encode()), dtype=torch.uint8)}
+            status = _ERROR
+        reply_size = self._respond(seq, status, result)
+
+        latency = getattr(self.planner, "latency", None)
+        if status == _OK and latency is not None:
+            method = _METHODS[code]
+            latency.record(
+                {
+                    f"{method}/server_decode": started - received,
+                    f"{method}/planning": finished - started,
+                    f"{method}/server_encode": time.time() - finished,
+                    f"{method}/request_bytes": size,
+                    f"{method}/reply_bytes": reply_size,
+                }
+            )
+        return True
+
+    def run(self) -> None:
+        from gevent.socket import wait_read
+
+        while True:
+            wait_read(self._req_fd)
+            while self.poll():
+                pass
+
+    def spawn(self):
+        import gevent
+
+        return gevent.spawn(self.run)
+
+    def close(self) -> None:
+        for fd in (self._req_fd, self._req_keepalive, self._resp_fd):
+            if fd is not None:
+                os.close(fd)
+        for shm in (self._req, self._resp):
+            shm.close()
+            shm.unlink()
+            _owned.discard(shm.name)
+        for path in (self._req_path, self._resp_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+class ShmPlannerClient(object):
+    """
+    Client side of ShmPlannerServer. Besides the byte level calls of the zerorpc
+    client it offers `compute_action_from_tensors` and `get_rollouts_tensor`,
+    which skip serialization altogether. Other calls go to `rpc`, if given.
+    """
+
+    def __init__(self, name: str, rpc=None):
+        self.rpc = rpc
+        self.latency = LatencyRecorder()
+        self._req = _attach(f"{name}_req")
+        self._resp = _attach(f"{name}_resp")
+        # Note: continue the sequence of a previous client, the server skips numbers it has seen
+        self._seq = _HEADER.unpack_from(self._req.buf, 0)[0]
+
+        req_path, resp_path = _paths(name)
+        self._resp_fd = os.open(resp_path, os.O_RDONLY | os.O_NONBLOCK)
+        self._resp_keepalive = os.open(resp_path, os.O_WRONLY | os.O_NONBLOCK)
+        os.set_blocking(self._resp_fd, True)
+        self._req_fd = os.open(req_path, os.O_WRONLY | os.O_NONBLOCK)
+
+    def _call(self, method: str, tensors):
+        self._seq += 1
+        start = time.time()
+        request_size = _write_message(self._req, self._seq, _METHODS.index(method), tensors)
+        sent = time.time()
+        os.write(self._req_fd, b"\x01")
+
+        while True:
+            os.read(self._resp_fd, 4096)
+            seq, status, reply_size, message = _read_message(self._resp)
+            if seq == self._seq:
+                break
+        replied = time.time()
+
+        # Note: the response region is reused by the next call, so the results are copied out
+        result = {k: v.clone() for k, v in decode_tensors(message).items()}
+        if status == _ERROR:
+            raise RuntimeError(f"Planner error: {bytes(result['error'].tolist()).decode()}")
+
+        stamps = result.pop("stamps")
+        self.latency.record_call(
+            method, start, sent, replied, time.time(), stamps.tolist(), request_size, reply_size
+        )
+        return result
+
+    def compute_action_from_tensors(self, dof_state: torch.Tensor, root_state: torch.Tensor) -> torch.Tensor:
+        return self._call("compute_action_tensor", {"dof_state": dof_state, "root_state": root_state})["action"]
+
+    def get_rollouts_tensor(self) -> torch.Tensor:
+        return self._call("get_rollouts", {})["rollouts"]
+
+    def step_from_tensors(
+        self, dof_state: torch.Tensor, root_state: torch.Tensor, want_rollouts=False, top_k=0, downsample=1
+    ) -> Dict[str, torch.Tensor]:
+        return self.step_from_message(
+            {"dof_state": dof_state, "root_state": root_state}, want_rollouts, top_k, downsample
+        )
+
+    def step_from_message(
+        self, message: Dict[str, torch.Tensor], want_rollouts=False, top_k=0, downsample=1
+    ) -> Dict[str, torch.Tensor]:
+        flags = torch.tensor([int(want_rollouts), top_k, downsample])
+        return decode_rollouts(self._call("step", {**message, "flags": flags}))
+
+    def compute_action_tensor(self, dof_state_tensor: bytes, root_state_tensor: bytes) -> bytes:
+        return torch_to_bytes(
+            self.compute_action_from_tensors(bytes_to_torch(dof_state_tensor), bytes_to_torch(root_state_tensor))
+        )
+
+    def get_rollouts(self) -> bytes:
+        return torch_to_bytes(self.get_rollouts_tensor())
+
+    def close(self) -> None:
+        for fd in (self._req_fd, self._resp_fd, self._resp_keepalive):
+            os.close(fd)
+        self._req.close()
+        self._resp.close()
+
+    def __getattr__(self, name):
+        if name == "rpc" or self.rpc is None:
+            raise AttributeError(name)
+        return getattr(self.rpc, name)
+
+
+class RpcPlannerClient(object):
+    """zerorpc client with the tensor level calls of ShmPlannerClient."""
+
+    def __init__(self, address: str, **kwargs):
+        self.rpc = zerorpc.Client(**kwargs)
+        self.rpc.connect(address)
+        self.latency = LatencyRecorder()
+
+    def _call(self, method: str, *tensors):
+        # Note: the byte level calls carry no server stamps, only the client side is split
+        start = time.time()
+        request = [torch_to_bytes(t) for t in tensors]
+        sent = time.time()
+        reply = getattr(self.rpc, method)(*request)
+        replied = time.time()
+        result = bytes_to_torch(reply)
+        self.latency.record_call(
+            method, start, sent, replied, time.time(), None, sum(len(r) for r in request), len(reply)
+        )
+        return result
+
+    def compute_action_from_tensors(self, dof_state: torch.Tensor, root_state: torch.Tensor) -> torch.Tensor:
+        return self._call("compute_action_tensor", dof_state, root_state)
+
+    def get_rollouts_tensor(self) -> torch.Tensor:
+        return self._call("get_rollouts")
+
+    def step_from_tensors(
+        self, dof_state: torch.Tensor, root_state: torch.Tensor, want_rollouts=False, top_k=0, downsample=1
+    ) -> Dict[str, torch.Tensor]:
+        return self.step_from_message(
+            {"dof_state": dof_state, "root_state": root_state}, want_rollouts, top_k, downsample
+        )
+
+    def step_from_message(
+        self, message: Dict[str, torch.Tensor], want_rollouts=False, top_k=0, downsample=1
+    ) -> Dict[str, torch.Tensor]:
+        start = time.time()
+        request = torch_to_bytes(message)
+        sent = time.time()
+        reply = self.rpc.step(request, want_rollouts, top_k, downsample)
+        replied = time.time()
+        result = bytes_to_torch(reply)
+
+        stamps = result.pop("stamps")
+        self.latency.record_call(
+            "step", start, sent, replied, time.time(), stamps.tolist(), len(request), len(reply)
+        )
+        return decode_rollouts(result)
+
+    def __getattr__(self, name):
+        if name == "rpc":
+            raise AttributeError(name)
+        return getattr(self.rpc, name)
+
+
+def bind_address(address: str) -> str:
+    """The address to serve on for clients that connect to address, on all interfaces."""
+    url = urlparse(address)
+    return f"{url.scheme}://0.0.0.0:{url.port}"
+
+
+def serve_planner(planner, address: str = "tcp://0.0.0.0:4242", shm: bool = True, capacity: int = DEFAULT_CAPACITY):
+    """Serve a planner over zerorpc and, for clients on this host, over shared memory. Blocks."""
+    server = zerorpc.Server(planner)
+    server.bind(address)
+
+    shm_server = None
+    if shm:
+        shm_server = ShmPlannerServer(planner, shm_name(address), capacity)
+        shm_server.spawn()
+    try:
+        server.run()
+    finally:
+        if shm_server is not None:
+            shm_server.close()
+
+
+def connect_planner(address: str = "tcp://127.0.0.1:4242", shm: bool = True, **kwargs):
+    """
+    Connect to a planner served by `serve_planner`. Returns a ShmPlannerClient
+    when the planner runs on this host and a RpcPlannerClient otherwise.
+    Keyword arguments are passed on to zerorpc.Client.
+    """
+    rpc = RpcPlannerClient(address, **kwargs)
+    if shm and is_local(address):
+        try:
+            return ShmPlannerClient(shm_name(address), rpc=rpc)
+        except OSError as e:
+            # Note: e.g. a planner started without shared memory, or one that is not running yet
+            if e.errno not in (errno.ENOENT, errno.ENXIO):
+                raise
+    return rpc
@@ -0,0 +1,179 @@
+"""
+Streaming mode between a world and a planner, which decouples their loop rates.
+
+The world publishes timestamped states, the planner plans on the freshest state
+and publishes a timestamped action sequence. Both directions use zmq PUB/SUB with
+CONFLATE, so a subscriber only ever sees the latest message and stale ones are
+dropped instead of queued. The world applies the action of the freshest sequence
+at the time elapsed since the state it was planned from.
+Messages use the tensor codec of mppiisaac.utils.transport. Both ends record
+timings and payload sizes as the rpc transports do, see mppiisaac.utils.latency.
+"""
+from mppiisaac.utils.latency import LatencyRecorder
+from mppiisaac.utils.transport import decode_tensors, encode_tensors
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import time
+import torch
+import zmq
+
+
+def _addresses(address: str):
+    # Note: states go to the given port, action sequences come from the next one
+    url = urlparse(address)
+    return f"{url.scheme}://{url.hostname}:{url.port}", f"{url.scheme}://{url.hostname}:{url.port + 1}"
+
+
+def _socket(context, kind, address: str, bind: bool):
+    socket = context.socket(kind)
+    socket.setsockopt(zmq.CONFLATE, 1)
+    if kind == zmq.SUB:
+        socket.setsockopt(zmq.SUBSCRIBE, b"")
+    if bind:
+        socket.bind(address)
+    else:
+        socket.connect(address)
+    return socket
+
+
+class StreamPlannerServer(object):
+    """Planner side: plans on the latest state and publishes the action sequence."""
+
+    def __init__(self, planner, address: str = "tcp://0.0.0.0:4243"):
+        self.planner = planner
+        state_address, action_address = _addresses(address)
+        self._context = zmq.Context.instance()
+        self._states = _socket(self._context, zmq.SUB, state_address, bind=True)
+        self._actions = _socket(self._context, zmq.PUB, action_address, bind=True)
+
+    def step(self, timeout: Optional[int] = None) -> bool:
+        """Plan on the latest state, returns False if none arrived within timeout ms."""
+        if not self._states.poll(timeout):
+            return False
+        frame = self._states.recv(copy=False)
+        received = time.time()
+        state = decode_tensors(frame.buffer)
+        started = time.time()
+
+        action = self.planner.compute_action_from_tensors(state["dof_state"], state["root_state"])
+        # Note: a copy, the planner warm starts its next command from the nominal sequence
+        sequence = self.planner.nominal_sequence().clone()
+        sequence[0] = action.reshape(-1)
+        finished = time.time()
+
+        reply = encode_tensors(
+            {
+                "stamp": state["stamp"],
+                "planned": torch.tensor([finished], dtype=torch.float64),
+                "stamps": torch.tensor([received, started, finished], dtype=torch.float64),
+                "dt": torch.tensor([self.planner.cfg.isaacgym.dt], dtype=torch.float64),
+                "actions": sequence,
+            }
+        )
+        self._actions.send(reply, copy=False)
+
+        latency = getattr(self.planner, "latency", None)
+        if latency is not None:
+            latency.record(
+                {
+                    "stream/server_decode": started - received,
+                    "stream/planning": finished - started,
+                    "stream/server_encode": time.time() - finished,
+                    "stream/request_bytes": len(frame.buffer),
+                    "stream/reply_bytes": len(reply),
+                }
+            )
+        return True
+
+    def run(self):
+        while True:
+            self.step()
+
+    def close(self):
+        self._states.close()
+        self._actions.close()
+
+
+class StreamPlannerClient(object):
+    """
+    World side: `publish_state` never blocks on the planner, `action` returns the
+    action of the freshest sequence for the current time, or None before the
+    first sequence arrived. `latency` holds the round trips of the states that
+    got planned on, the other states are dropped by the planner.
+    """
+
+    def __init__(self, address: str = "tcp://127.0.0.1:4243", pending: int = 100):
+        state_address, action_address = _addresses(address)
+        self._context = zmq.Context.instance()
+        self._states = _socket(self._context, zmq.PUB, state_address, bind=False)
+        self._actions = _socket(self._context, zmq.SUB, action_address, bind=False)
+        self.sequence: Optional[Dict[str, torch.Tensor]] = None
+        self.latency = LatencyRecorder()
+        # Note: start, sent and size of the last published states by stamp, to match the plans
+        self._pending = OrderedDict()
+        self._max_pending = pending
+
+    def publish_state(self, dof_state: torch.Tensor, root_state: torch.Tensor, stamp: Optional[float] = None):
+        start = time.time()
+        stamp = start if stamp is None else stamp
+        request = encode_tensors(
+            {
+                "stamp": torch.tensor([stamp], dtype=torch.float64),
+                "dof_state": dof_state,
+                "root_state": root_state,
+            }
+        )
+        sent = time.time()
+        self._states.send(request, copy=False)
+
+        self._pending[stamp] = (start, sent, len(request))
+        while len(self._pending) > self._max_pending:
+            self._pending.popitem(last=False)
+
+    def receive(self) -> bool:
+        """Take the latest action sequence if a new one arrived, without blocking."""
+        try:
+            message = self._actions.recv(flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+        replied = time.time()
+        self.sequence = decode_tensors(message)
+
+        published = self._pending.pop(float(self.sequence["stamp"][0]), None)
+        if published is not None:
+            start, sent, request_bytes = published
+            self.latency.record_call(
+                "stream", start, sent, replied, time.time(),
+                self.sequence["stamps"].tolist(), request_bytes, len(message),
+            )
+        return True
+
+    def plan_delay(self) -> Optional[float]:
+        """Time between publishing the state and the planner publishing its plan, in seconds."""
+        if self.sequence is None:
+            return None
+        return float(self.sequence["planned"][0] - self.sequence["stamp"][0])
+
+    def action(self, now: Optional[float] = None) -> Optional[torch.Tensor]:
+        self.receive()
+        if self.sequence is None:
+            return None
+        now = time.time() if now is None else now
+        elapsed = now - float(self.sequence["stamp"][0])
+        actions = self.sequence["actions"]
+        idx = min(max(int(elapsed / float(self.sequence["dt"][0])), 0), actions.size(0) - 1)
+        return actions[idx]
+
+    def close(self):
+        self._states.close()
+        self._actions.close()
+
+
+def serve_planner_stream(planner, address: str = "tcp://0.0.0.0:4243"):
+    """Serve a planner in streaming mode. Blocks."""
+    server = StreamPlannerServer(planner, address)
+    try:
+        server.run()
+    finally:
+        server.close()
@@ -1,14 +1,176 @@
+"""
+Binary codec for the tensors exchanged between the world and the planner.
+
+A message is a fixed header followed by one header entry per named tensor and
+the raw, contiguous tensor buffers:
+
+    header:  magic (4s) | version (B) | count (H)
+    entry:   name length (H) | name | dtype (B) | ndim (B) | shape (ndim x Q)
+             | device length (B) | device | nbytes (Q) | offset (Q)
+    buffers: aligned to BUFFER_ALIGNMENT bytes from the start of the message
+
+Decoding creates the cpu tensors with `torch.frombuffer` on the message itself,
+no pickle is involved, so messages from untrusted peers are safe to decode.
+"""
+from typing import Dict, Optional, Union
+import struct
+import warnings
 import torch
-import io
+
+MAGIC = b"MPIT"
+VERSION = 1
+BUFFER_ALIGNMENT = 64
+
+_HEADER = struct.Struct("<4sBH")
+_DTYPES = [
+    torch.float32,
+    torch.float64,
+    torch.float16,
+    torch.bfloat16,
+    torch.int64,
+    torch.int32,
+    torch.int16,
+    torch.int8,
+    torch.uint8,
+    torch.bool,
+]
+_DTYPE_CODES = {dtype: i for i, dtype in enumerate(_DTYPES)}
+_ITEMSIZES = [torch.empty((), dtype=dtype).element_size() for dtype in _DTYPES]
+
+
+def _aligned(n: int) -> int:
+    return (n + BUFFER_ALIGNMENT - 1) // BUFFER_ALIGNMENT * BUFFER_ALIGNMENT
+
+
+def _layout(tensors: Dict[str, torch.Tensor]):
+    """Packed header, buffer offsets and total size of the message for `tensors`."""
+    entries = []
+    for name, t in tensors.items():
+        if t.dtype not in _DTYPE_CODES:
+            raise ValueError(f"Unsupported dtype {t.dtype} for tensor {name}")
+        fmt = f"<H{len(name.encode())}sBB{t.dim()}QB{len(str(t.device))}sQQ"
+        entries.append((fmt, name.encode(), t))
+
+    # Note: the header size is needed for the offsets, so it is computed before packing
+    header_size = _HEADER.size + sum(struct.calcsize(fmt) for fmt, _, _ in entries)
+
+    parts = [_HEADER.pack(MAGIC, VERSION, len(entries))]
+    offset = header_size
+    offsets = []
+    for fmt, name, t in entries:
+        nbytes = t.numel() * t.element_size()
+        if nbytes > 0:
+            offset = _aligned(offset)
+        device = str(t.device).encode()
+        parts.append(
+            struct.pack(
+                fmt, len(name), name, _DTYPE_CODES[t.dtype], t.dim(), *t.shape, len(device), device, nbytes, offset,
+            )
+        )
+        offsets.append(offset)
+        offset += nbytes
+    return b"".join(parts), offsets, offset
+
+
+def _raw(t: torch.Tensor) -> torch.Tensor:
+    return t.detach().contiguous().reshape(-1).view(torch.uint8)
+
+
+def encode_tensors(tensors: Dict[str, torch.Tensor]) -> bytes:
+    """Encode named tensors into a single message."""
+    header, offsets, _ = _layout(tensors)
+    parts = [header]
+    end = len(header)
+    for t, start in zip(tensors.values(), offsets):
+        buf = _raw(t).cpu().numpy()
+        parts.append(bytes(start - end))
+        parts.append(buf)
+        end = start + buf.nbytes
+    return b"".join(parts)
+
+
+def encode_tensors_into(tensors: Dict[str, torch.Tensor], buffer) -> int:
+    """
+    Encode named tensors directly into a writable buffer, e.g. shared memory,
+    with a single copy per tensor. Returns the size of the message.
+    """
+    header, offsets, size = _layout(tensors)
+    if size > len(buffer):
+        raise ValueError(f"Message of {size} bytes does not fit in a buffer of {len(buffer)} bytes")
+
+    buffer[: len(header)] = header
+    for t, offset in zip(tensors.values(), offsets):
+        raw = _raw(t)
+        if raw.numel() > 0:
+            torch.frombuffer(buffer, dtype=torch.uint8, count=raw.numel(), offset=offset).copy_(raw)
+    return size
+
+
+def _target_device(hint: str, device: Optional[str]) -> torch.device:
+    if device is not None:
+        return torch.device(device)
+    hint = torch.device(hint)
+    if hint.type == "cuda" and (
+        not torch.cuda.is_available() or (hint.index or 0) >= torch.cuda.device_count()
+    ):
+        return torch.device("cpu")
+    return hint
+
+
+def decode_tensors(b: Union[bytes, bytearray, memoryview], device: Optional[str] = None) -> Dict[str, torch.Tensor]:
+    """
+    Decode a message into named tensors, placed on `device` or, if None, on the
+    device they were encoded from when it exists here.
+    Note: cpu tensors share memory with the message, clone them before writing to them.
+    """
+    buf = memoryview(b)
+    magic, version, count = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a tensor message")
+    if version != VERSION:
+        raise ValueError(f"Unsupported tensor message version {version}")
+
+    tensors = {}
+    pos = _HEADER.size
+    for _ in range(count):
+        (name_len,) = struct.unpack_from("<H", buf, pos)
+        name, code, ndim = struct.unpack_from(f"<{name_len}sBB", buf, pos + 2)
+        pos += 2 + name_len + 2
+        shape = struct.unpack_from(f"<{ndim}Q", buf, pos)
+        pos += 8 * ndim
+        (device_len,) = struct.unpack_from("<B", buf, pos)
+        hint, nbytes, offset = struct.unpack_from(f"<{device_len}sQQ", buf, pos + 1)
+        pos += 1 + device_len + 16
+
+        if code >= len(_DTYPES):
+            raise ValueError(f"Unknown dtype code {code}")
+        dtype = _DTYPES[code]
+        if offset + nbytes > len(buf):
+            raise ValueError("Truncated tensor message")
+
+        if nbytes == 0:
+            t = torch.empty(shape, dtype=dtype)
+        else:
+            with warnings.catch_warnings():
+                # Note: bytes are read-only, which torch warns about; the tensor is never written in place
+                warnings.simplefilter("ignore", UserWarning)
+                t = torch.frombuffer(
+                    buf, dtype=dtype, count=nbytes // _ITEMSIZES[code], offset=offset
+                ).view(shape)
+
+        target = _target_device(hint.decode(), device)
+        tensors[name.decode()] = t if target.type == "cpu" else t.to(target)
+    return tensors
 
 
-def torch_to_bytes(t: torch.Tensor) -> bytes:
-    buff = io.BytesIO()
-    torch.save(t, buff)
-    buff.seek(0)
-    return buff.read()
+def torch_to_bytes(t: Union[torch.Tensor, Dict[str, torch.Tensor]]) -> bytes:
+    if isinstance(t, dict):
+        return encode_tensors(t)
+    return encode_tensors({"": t})
 
 
-def bytes_to_torch(b: bytes) -> torch.Tensor:
-    buff = io.BytesIO(b)
-    return torch.load(buff)
+def bytes_to_torch(b: bytes, device: Optional[str] = None) -> Union[torch.Tensor, Dict[str, torch.Tensor]]:
+    tensors = decode_tensors(b, device)
+    if list(tensors.keys()) == [""]:
+        return tensors[""]
+    return tensors
@@ -0,0 +1,259 @@
+"""
+Parallel Optuna tuning over planner workers.
+
+A study is run against a world, made by `make_world(cfg, num_envs, viewer)`,
+which provides the world `sim`, `n_steps`, `suggest(trial)` returning the
+config of a trial, `configure(planner, config)` and `episode_cost(sim)`, see
+mppiisaac.utils.lockstep_eval.LockstepEvaluator.
+
+`run_parallel_study` runs K trials at a time. It launches K planner servers, or
+connects to running ones, and starts one world process per planner, since
+isaacgym hosts a single simulator per process. `run_lockstep_study` instead
+evaluates a batch of K trials as the envs of one world in this process.
+
+Studies persist in sqlite, by default in `tuning_<key>.db` with `<key>` the
+hash of the config, so a crashed or repeated run resumes the study. Every trial
+gets the seed `seed + trial.number`, set in the world process and on its
+planner, and an optional wall-clock timeout per batch after which the trials
+that have not finished are marked as failed. With `report_every` the
+accumulated cost is reported to Optuna and trials the pruner gives up on are
+stopped early. Finished results are cached by config hash, params and seed.
+The sampler of worker w is seeded with `seed + w`, so a repeated run of a study
+asks for the same trials and takes their results from the cache; with several
+workers the trials are numbered in the order they are asked, which varies, and
+fewer of them are found.
+"""
+from mppiisaac.planner.isaacgym_wrapper import sim_process_context
+from mppiisaac.utils.config_store import config_hash
+from mppiisaac.utils.lockstep_eval import LockstepEvaluator
+from mppiisaac.utils.planner_pool import PlannerPool
+from mppiisaac.utils.shm_transport import RpcPlannerClient
+from dataclasses import dataclass
+from omegaconf import OmegaConf
+from typing import Callable, List, Optional
+import gevent
+import hashlib
+import json
+import numpy as np
+import optuna
+import sqlite3
+import torch
+
+# Note: options that change how a study is run, but not its results
+_RUN_OPTIONS = ["tuning", "planner_pool", "planner_address", "render", "checkpoint", "checkpoint_interval"]
+
+
+@dataclass
+class TuningConfig:
+    workers: int = 1
+    trials: int = 20
+    headless: bool = True
+    seed: int = 0
+    # Note: in seconds, 0 disables the timeout
+    trial_timeout: float = 0.0
+    # Note: empty for sqlite:///tuning_<key>.db and the key as study name
+    storage: str = ""
+    study_name: str = ""
+    direction: str = "minimize"
+    base_port: int = 4242
+    lockstep: bool = False
+    # Note: steps between intermediate reports for pruning, 0 disables pruning
+    report_every: int = 0
+    # Note: empty disables the cache of results
+    cache: str = "tuning_cache.db"
+
+
+class TrialTimeout(Exception):
+    pass
+
+
+def tuning_config(cfg) -> TuningConfig:
+    """The `tuning` node of an example config, with defaults for missing fields."""
+    return OmegaConf.to_object(OmegaConf.merge(OmegaConf.structured(TuningConfig), cfg.get("tuning", {})))
+
+
+def study_key(cfg) -> str:
+    """Hash of the config without the options that only change how a study is run."""
+    container = OmegaConf.to_container(cfg, resolve=True)
+    for option in _RUN_OPTIONS:
+        container.pop(option, None)
+    return config_hash(container)
+
+
+def seed_everything(seed: int):
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+
+
+class ResultCache(object):
+    """Objective values of finished trials by config hash, params and seed, in sqlite."""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value REAL)")
+        self._db.commit()
+
+    @staticmethod
+    def key(study_key: str, params: dict, seed: int) -> str:
+        return hashlib.sha1(json.dumps([study_key, params, seed], sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[float]:
+        row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, key: str, value: float):
+        self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?)", (key, value))
+        self._db.commit()
+
+
+def _planner_pool(planner_command: Optional[List[str]], addresses: Optional[List[str]], tuning: TuningConfig):
+    if addresses:
+        pool = PlannerPool(addresses)
+        pool.wait_ready()
+        return pool
+    if planner_command is not None:
+        return PlannerPool.launch(planner_command, tuning.workers, base_port=tuning.base_port)
+    raise ValueError("Give either a planner command or the addresses of running planners")
+
+
+def _open_study(tuning: TuningConfig, key: str, worker: int = 0) -> optuna.Study:
+    return optuna.create_study(
+        study_name=tuning.study_name or key,
+        storage=tuning.storage or f"sqlite:///tuning_{key}.db",
+        direction=tuning.direction,
+        # Note: a seed per worker, workers with the same seed would ask for the same params
+        sampler=optuna.samplers.TPESampler(seed=tuning.seed + worker),
+        pruner=optuna.pruners.MedianPruner() if tuning.report_every > 0 else optuna.pruners.NopPruner(),
+        load_if_exists=True,
+    )
+
+
+def _num_trials(study: optuna.Study) -> int:
+    # Note: enqueued trials are waiting to be asked, they do not count yet
+    states = [s for s in optuna.trial.TrialState if s != optuna.trial.TrialState.WAITING]
+    return len(study.get_trials(deepcopy=False, states=states))
+
+
+def _run_batch(study, trials, world, evaluator, tuning: TuningConfig, key: str, cache: Optional[ResultCache]):
+    """Evaluate a batch of asked trials, with one planner per trial, and tell the results."""
+    items, runs = [], []
+    seed_everything(tuning.seed + trials[0].number)
+    for trial in trials:
+        seed = tuning.seed + trial.number
+        trial.set_user_attr("seed", seed)
+        config = world.suggest(trial)
+        cached = None if cache is None else cache.get(ResultCache.key(key, trial.params, seed))
+        if cached is not None:
+            trial.set_user_attr("cached", True)
+            study.tell(trial, cached)
+        else:
+            items.append((seed, config))
+            runs.append(trial)
+    if not runs:
+        return
+
+    def should_stop(index, step, cost):
+        runs[index].report(cost, step)
+        return runs[index].should_prune()
+
+    told = set()
+
+    def tell(index, cost):
+        told.add(index)
+        trial, (seed, _) = runs[index], items[index]
+        if cost is None:
+            study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+            return
+        study.tell(trial, cost)
+        if cache is not None:
+            cache.put(ResultCache.key(key, trial.params, seed), cost)
+
+    try:
+        # Note: the timeout fires while waiting for the planners, which every step does
+        timeout = None
+        if tuning.trial_timeout > 0:
+            timeout = TrialTimeout(f"Trials {[t.number for t in runs]} took longer than {tuning.trial_timeout}s")
+        with gevent.Timeout(tuning.trial_timeout or None, timeout):
+            evaluator.evaluate(items, should_stop, tuning.report_every, tell)
+    except TrialTimeout:
+        # Note: trials that finished or were pruned before the timeout keep their results
+        for index, trial in enumerate(runs):
+            if index not in told:
+                trial.set_user_attr("timeout", tuning.trial_timeout)
+                study.tell(trial, state=optuna.trial.TrialState.FAIL)
+
+
+def _run_batches(study, world, planners: list, tuning: TuningConfig, key: str):
+    cache = ResultCache(tuning.cache) if tuning.cache else None
+
+    def configure(planner, item):
+        seed, config = item
+        planner.seed(seed)
+        world.configure(planner, config)
+
+    evaluator = LockstepEvaluator(world.sim, planners, world.episode_cost, world.n_steps, configure)
+    # Note: workers stop once the study has `trials` trials, so a resumed study only runs the rest
+    while _num_trials(study) < tuning.trials:
+        size = min(len(planners), tuning.trials - _num_trials(study))
+        _run_batch(study, [study.ask() for _ in range(size)], world, evaluator, tuning, key, cache)
+
+
+def _run_worker(make_world: Callable, cfg, address: str, tuning: TuningConfig, key: str, worker: int):
+    study = _open_study(tuning, key, worker)
+    world = make_world(cfg, 1, not tuning.headless)
+    _run_batches(study, world, [RpcPlannerClient(address)], tuning, key)
+
+
+def run_parallel_study(
+    make_world: Callable,
+    cfg,
+    planner_command: Optional[List[str]] = None,
+    addresses: Optional[List[str]] = None,
+    tuning: Optional[TuningConfig] = None,
+) -> optuna.Study:
+    """
+    Run a study with one world process per planner. The planners are launched
+    with planner_command, see PlannerPool.launch, unless addresses of running
+    ones are given.
+    """
+    tuning = tuning or tuning_config(cfg)
+    key = study_key(cfg)
+    study = _open_study(tuning, key)
+    pool = _planner_pool(planner_command, addresses, tuning)
+
+    context = sim_process_context()
+    workers = [
+        context.Process(target=_run_worker, args=(make_world, cfg, w.address, tuning, key, i))
+        for i, w in enumerate(pool.workers)
+    ]
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        pool.close()
+    return study
+
+
+def run_lockstep_study(
+    make_world: Callable,
+    cfg,
+    planner_command: Optional[List[str]] = None,
+    addresses: Optional[List[str]] = None,
+    tuning: Optional[TuningConfig] = None,
+) -> optuna.Study:
+    """Run a study in batches of one trial per planner, evaluated in lockstep in this process."""
+    tuning = tuning or tuning_config(cfg)
+    key = study_key(cfg)
+    study = _open_study(tuning, key)
+    pool = _planner_pool(planner_command, addresses, tuning)
+    try:
+        world = make_world(cfg, len(pool.workers), not tuning.headless)
+        _run_batches(study, world, [w.client for w in pool.workers], tuning, key)
+    finally:
+        pool.close()
+    return study